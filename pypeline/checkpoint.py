@@ -0,0 +1,340 @@
+import os
+import pickle
+import hashlib
+import tempfile
+import threading
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from pypeline.lazyimport import FuncRef
+from pypeline.context import (MISSING, CachedResult, NodeHook, ParamTargetNodeStateWrapper, dirty_closure,
+                              upstream_closure)
+
+__all__ = ["Checkpointer", "CheckpointStore", "fingerprint"]
+
+
+def _func_token(func, seen=None):
+    """
+    Identify a node function by its qualified name and byte code, so that checkpoints get
+    invalidated when the function is edited. Bound instances and closure cells are part of the
+    token, as they determine the result just like parameters do.
+    """
+    if seen is None:
+        seen = set()
+    seen.add(id(func))
+
+    if isinstance(func, FuncRef):
+        func = func.resolve()
+
+    owner = getattr(func, "__self__", None)
+    func = getattr(func, "__func__", func)
+    code = getattr(func, "__code__", None)
+    token = "%s.%s" % (getattr(func, "__module__", None), getattr(func, "__name__", type(func).__name__))
+
+    if code is not None:
+        token += _code_token(code)
+
+    if owner is not None:
+        token += hashlib.sha1(_value_token(owner)).hexdigest()
+
+    for cell in getattr(func, "__closure__", None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError:
+            continue
+
+        if id(value) in seen:
+            continue
+        elif hasattr(value, "__code__") or hasattr(value, "__func__"):
+            token += _func_token(value, seen)
+        else:
+            token += hashlib.sha1(_value_token(value)).hexdigest()
+
+    return token
+
+
+def _code_token(code):
+    """
+    Serialize byte code, including nested code objects of inner functions, lambdas and generator
+    expressions.
+    """
+    consts = tuple(_code_token(const) if hasattr(const, "co_code") else const for const in code.co_consts)
+    return repr((code.co_code, consts, code.co_names))
+
+
+def _value_token(value):
+    """
+    Serialize parameter values for fingerprinting. Unpicklable values fall back to their repr.
+    """
+    try:
+        return pickle.dumps(value, 2)
+    except Exception:
+        return repr(value).encode("utf-8")
+
+
+def fingerprint(state, memo=None):
+    """
+    Compute the input fingerprint of a node: a hash of its path, function, parameters and the
+    fingerprints of its upstream nodes. The fingerprint doesn't require evaluating any node.
+
+    :param state: Node state object.
+    :param memo: Dictionary of already computed fingerprints, keyed by node state id.
+    :return: Hex digest.
+    """
+    if memo is None:
+        memo = {}
+
+    try:
+        return memo[id(state)]
+    except KeyError:
+        pass
+
+    for node in upstream_closure(state, lambda node: id(node) not in memo):
+        digest = hashlib.sha1()
+        digest.update(repr(node.path).encode("utf-8"))
+        digest.update(_func_token(node.func).encode("utf-8"))
+        digest.update(_value_token((node._args, sorted(node._kwargs.items()))))
+
+        for upstream in node.upstream:
+            if isinstance(upstream, ParamTargetNodeStateWrapper):
+                digest.update(repr(upstream._param_name).encode("utf-8"))
+                upstream = upstream._state
+
+            digest.update(memo[id(upstream)].encode("utf-8"))
+
+        memo[id(node)] = digest.hexdigest()
+
+    return memo[id(state)]
+
+
+class CheckpointStore(object):
+    def __init__(self, directory):
+        """
+        Directory of checkpointed node results, one file per node path. Each file holds a header
+        with the node path and input fingerprint, followed by the pickled result, so checkpoints can
+        be validated without loading the result.
+
+        :param directory: Directory to store checkpoints in. Created if missing.
+        """
+        self.directory = directory
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def contains(self, path, fp):
+        """
+        :return: Whether a checkpoint for the node path with the given fingerprint exists.
+        """
+        try:
+            with open(self._filename(path, fp), "rb") as stream:
+                return pickle.load(stream) == (path, fp)
+        except Exception:
+            return False
+
+    def load(self, path, fp):
+        """
+        Load a checkpointed result.
+
+        :param path: Node path.
+        :param fp: Expected fingerprint.
+        :return: The result or `MISSING` if there is no valid checkpoint.
+        """
+        try:
+            with open(self._filename(path, fp), "rb") as stream:
+                if pickle.load(stream) != (path, fp):
+                    return MISSING
+                return pickle.load(stream)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return MISSING
+
+    def save(self, path, fp, value):
+        """
+        Atomically write a checkpoint, replacing any previous one for the node path.
+
+        :param path: Node path.
+        :param fp: Input fingerprint.
+        :param value: Node result.
+        """
+        handle, temp_name = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(handle, "wb") as stream:
+                pickle.dump((path, fp), stream, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(value, stream, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_name, self._filename(path, fp))
+        except Exception:
+            os.unlink(temp_name)
+            raise
+
+    def _filename(self, path, fp):
+        # One checkpoint per node path, the fingerprint is checked against the header
+        return os.path.join(self.directory, hashlib.sha1(repr(path).encode("utf-8")).hexdigest() + ".ckpt")
+
+
+def _save_checkpoint(value, directory, path, fp):
+    """
+    Write a checkpoint into a store directory, e.g. from the process holding the result.
+    """
+    CheckpointStore(directory).save(path, fp, value)
+
+
+class _Checkpointed(CachedResult):
+    def __init__(self, store, state, fp):
+        """
+        Node result restored from a checkpoint, loaded on first access. The node is evaluated if the
+        checkpoint disappeared in the meantime, e.g. evicted from a shared cache.
+        """
+        self._store = store
+        self._state = state
+        self._fp = fp
+        self._value = MISSING
+
+    def resolve(self):
+        if self._value is MISSING:
+            self._value = self._store.load(self._state.path, self._fp)
+            if self._value is MISSING:
+                value = self._state._compute()
+                self._state._store(value)
+                return value
+
+        return self._value
+
+    def release(self):
+        self._value = MISSING
+
+
+class _Deferred(CachedResult):
+    def __init__(self, state):
+        """
+        Result of a node upstream of a restored node that has no checkpoint of its own. The node is
+        evaluated on first access.
+        """
+        self._state = state
+
+    def resolve(self):
+        value = self._state._compute()
+        self._state._store(value)
+        return value
+
+
+class Checkpointer(NodeHook):
+    def __init__(self, context, directory, nodes=None):
+        """
+        Checkpoints every completed node result of a context to a local store, along with the
+        input fingerprint of the node. A new context built from the same graph and parameters
+        resumes from the store: nodes with a valid checkpoint are restored instead of evaluated,
+        and upstream nodes are only loaded (or evaluated, if they have no checkpoint) when read.
+
+        Checkpoints are written by a background thread. Call `flush` to wait for pending writes
+        and `close` to detach from the context. Results held by scheduler workers are written by
+        the workers themselves, which have finished once the scheduler is closed.
+
+        :param context: Context to checkpoint.
+        :param directory: Checkpoint directory.
+        :param nodes: Node states to checkpoint. Defaults to every node.
+        """
+        self.store = self._open_store(directory)
+        self.errors = []
+        self._context = context
+        self._pending = {}
+        self._restored = set()
+        self._queue = Queue()
+        self._writer = threading.Thread(target=self._write_loop)
+        self._writer.daemon = True
+        self._writer.start()
+
+        context.add_hook(self, nodes)
+
+    def _open_store(self, directory):
+        """
+        :return: Store to keep the checkpoints in.
+        """
+        return CheckpointStore(directory)
+
+    def fingerprint(self, state):
+        """
+        :return: Input fingerprint of the node.
+        """
+        return fingerprint(state)
+
+    def lookup(self, state):
+        # Fingerprints are computed afresh for every evaluation, as parameter changes of nodes without
+        # this hook go unnoticed.
+        memo = {}
+        fp = fingerprint(state, memo)
+        self._pending[id(state)] = fp
+
+        value = self.store.load(state.path, fp)
+        if value is MISSING:
+            return MISSING
+
+        # Restoring a node leaves its upstream nodes unevaluated. Mark them clean so that parameter
+        # changes still propagate downstream: nodes with a valid checkpoint are loaded from it on
+        # demand, the rest are evaluated on demand.
+        for node in dirty_closure(state)[:-1]:
+            node_fp = fingerprint(node, memo)
+
+            if self.store.contains(node.path, node_fp):
+                node._cache = _Checkpointed(self.store, node, node_fp)
+            else:
+                node._cache = _Deferred(node)
+            node._dirty = False
+
+        self._restored.add(id(state))
+
+        return value
+
+    def cached(self, state):
+        # The fingerprint taken by the lookup preceding the evaluation is still current
+        fp = self._pending.pop(id(state), None)
+
+        if id(state) in self._restored:
+            self._restored.discard(id(state))
+        else:
+            path = state.path
+            fp = fp or self.fingerprint(state)
+            value = state._cache
+
+            # Results held elsewhere, e.g. by scheduler workers, are written where they are held
+            if isinstance(value, CachedResult) and value.submit(_save_checkpoint, (self.store.directory, path, fp),
+                                                                lambda exc: self.errors.append((path, exc))):
+                return
+
+            self._queue.put((path, fp, value))
+
+    def flush(self):
+        """
+        Wait until all pending checkpoints are written.
+        """
+        self._queue.join()
+
+    def close(self):
+        """
+        Write pending checkpoints and detach from the context.
+        """
+        self._context.remove_hook(self)
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is None:
+                    return
+
+                try:
+                    path, fp, value = item
+                    if isinstance(value, CachedResult):
+                        value = value.resolve()
+
+                    self.store.save(path, fp, value)
+                except Exception as exc:
+                    self.errors.append((item[0], exc))
+            finally:
+                self._queue.task_done()
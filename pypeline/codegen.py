@@ -0,0 +1,113 @@
+from pypeline.context import CachedResult, NodeState, ParamTargetNodeStateWrapper, _params, upstream_closure
+
+__all__ = ["CompiledNode", "generate"]
+
+
+def generate(node):
+    """
+    Generate the source of a function evaluating a node along with its upstream closure, in
+    evaluation order. Basic nodes are called directly with their upstream results, parameters and
+    parameter targeted inputs bound in place, and their results are stored without going through
+    the node state methods. Anything else (partitioned nodes, outputs, lazy inputs, merged nodes,
+    nodes with hooks) is evaluated by its node state.
+
+    :param node: Node state object.
+    :return: Tuple of the source and the namespace the source is to be executed in.
+    """
+    closure = upstream_closure(node)
+    index = dict((id(state), position) for position, state in enumerate(closure))
+    namespace = {"CachedResult": CachedResult, "_params": _params}
+    target = len(closure) - 1
+    lines = [
+        "def evaluate():",
+        # Thread-safe contexts need the locking of the node states
+        "    if n%d._sync is not None:" % target,
+        "        return n%d._eval_cached()" % target,
+        "    if not n%d._dirty:" % target,
+        "        v = n%d._cache" % target,
+        "        return v.resolve() if isinstance(v, CachedResult) else v",
+    ]
+
+    for position, state in enumerate(closure):
+        name = "n%d" % position
+        value = "v%d" % position
+        namespace[name] = state
+
+        lines.append("    if %s._dirty:" % name)
+
+        if type(state) is not NodeState or state._lazy or state._cutoff or state.outputs:
+            lines.append("        %s = %s._eval_cached()" % (value, name))
+        else:
+            namespace["f%d" % position] = state.func
+            positional = []
+            keywords = []
+
+            for upstream in state.upstream:
+                if isinstance(upstream, ParamTargetNodeStateWrapper):
+                    keywords.append("%s=v%d" % (upstream._param_name, index[id(upstream._state)]))
+                else:
+                    positional.append("v%d" % index[id(upstream)])
+
+            kwargs = "dict(%s._kwargs, %s)" % (name, ", ".join(keywords)) if keywords else "%s._kwargs" % name
+            call = "f%d(%s*%s._args, **%s)" % (position, "".join(arg + ", " for arg in positional), name, kwargs)
+            # Hooks, merged nodes and upstream results spreading into several arguments need the
+            # generic evaluation
+            guards = ["%s._hooks" % name, "%s._alias is not None" % name]
+            guards.extend("%s.__class__ is _params" % arg for arg in positional)
+
+            lines.append("        if %s:" % " or ".join(guards))
+            lines.append("            %s = %s._eval_cached()" % (value, name))
+            lines.append("        else:")
+            lines.append("            %s = %s" % (value, call))
+            # Versions only matter for thread-safe contexts, which don't get here
+            lines.append("            %s._cache = %s" % (name, value))
+            lines.append("            %s._dirty = False" % name)
+            lines.append("            %s._revision += 1" % name)
+
+        lines.append("    else:")
+        lines.append("        %s = %s._cache" % (value, name))
+        lines.append("        if isinstance(%s, CachedResult):" % value)
+        lines.append("            %s = %s.resolve()" % (value, value))
+
+    lines.append("    return v%d" % target)
+
+    return "\n".join(lines) + "\n", namespace
+
+
+class CompiledNode(object):
+    def __init__(self, context, node):
+        """
+        Evaluates a node through a function generated for the current wiring of the context (see
+        `generate`), avoiding most of the per node overhead of the generic evaluation. Results are
+        cached in the node states just the same, so compiled and generic evaluation can be mixed.
+        The function is generated again whenever the structure of the context changes, e.g. by
+        `Context.rebase`.
+
+        :param context: Context of the node.
+        :param node: Node state object.
+        """
+        self._context = context
+        self._path = node.path
+        self._generation = None
+        self._evaluate = None
+        self.source = None
+
+    def __call__(self):
+        """
+        :return: Evaluation result.
+        """
+        if self._generation != self._context._generation:
+            self._compile()
+
+        return self._evaluate()
+
+    def _compile(self):
+        """
+        Generate and compile the evaluation function.
+        """
+        self.source, namespace = generate(self._context._nodes[self._path])
+        code = compile(self.source, "<pypeline %s>" % ".".join(self._path), "exec")
+        exec(code, namespace)
+
+        self._evaluate = namespace["evaluate"]
+        self._generation = self._context._generation
@@ -8,7 +8,7 @@ class NodeDef(object):
     """
     Node definition. Contains all the data relating to a node.
     """
-    def __init__(self, owner, func, prefix, name, args=None, kwargs=None):
+    def __init__(self, owner, func, prefix, name, args=None, kwargs=None, options=None):
         self.owner = owner
         self.func = func
         self.name = name
@@ -16,6 +16,7 @@ class NodeDef(object):
         self.path = prefix + (name,)
         self.args = args or ()
         self.kwargs = kwargs or {}
+        self.options = options or {}
 
     def rebase(self, owner, prefix):
         """
@@ -25,17 +26,18 @@ class NodeDef(object):
         :param prefix: Prefix to rebase to.
         :return: Rebased node definition.
         """
-        return NodeDef(owner, self.func, prefix, self.name, self.args, self.kwargs)
+        return NodeDef(owner, self.func, prefix, self.name, self.args, self.kwargs, self.options)
 
     def update(self, other):
         """
-        Updates this node definition with the function and parameters of another.
+        Updates this node definition with the function, parameters and options of another.
 
         :param other: Other node definition to take data from.
         """
         self.func = other.func
         self.args = other.args
         self.kwargs = other.kwargs
+        self.options = other.options
 
     def __getattr__(self, key):
         return EdgeDef(self, key)
\ No newline at end of file
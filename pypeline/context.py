@@ -1,11 +1,18 @@
 import inspect
+import functools
+import threading
 
 from collections import namedtuple
 from pypeline.common import NodeDef
+from pypeline.lazyimport import FuncRef
+from pypeline.partition import default_pool, run_stages
 
 
 _params = namedtuple("_params", "args, kwargs")
 
+# Returned by `NodeHook.lookup` when the hook has no result for the node.
+MISSING = object()
+
 
 def group(**kwargs):
     """
@@ -28,6 +35,204 @@ def params(*args, **kwargs):
     return _params(args, kwargs)
 
 
+def upstream_states(node):
+    """
+    Collect the node states directly feeding into `node`, unwrapping parameter targeted edges.
+
+    :param node: Node state object.
+    :return: List of upstream node state objects.
+    """
+    return [getattr(upstream, "_state", upstream) for upstream in node.upstream]
+
+
+def upstream_closure(node, include=None):
+    """
+    Collect the upstream closure of `node` in evaluation order, i.e. every node appears after all of
+    its upstream nodes.
+
+    :param node: Node state object.
+    :param include: Predicate selecting the nodes to collect. Nodes failing it are skipped along with
+                    everything upstream of them.
+    :return: List of node state objects, ending with `node` itself if it is included.
+    """
+    order = []
+    visited = set()
+    stack = [(node, False)]
+
+    while stack:
+        state, expanded = stack.pop()
+
+        if expanded:
+            order.append(state)
+        elif id(state) not in visited and (include is None or include(state)):
+            visited.add(id(state))
+            stack.append((state, True))
+            stack.extend((upstream, False) for upstream in reversed(upstream_states(state)))
+
+    return order
+
+
+def dirty_closure(node):
+    """
+    Collect the dirty part of the upstream closure of `node` in evaluation order. Clean nodes and
+    everything upstream of them are skipped.
+
+    :param node: Node state object.
+    :return: List of dirty node state objects, ending with `node` itself if it is dirty.
+    """
+    return upstream_closure(node, lambda state: state._dirty)
+
+
+class CachedResult(object):
+    """
+    Placeholder for a node result that is held outside of the node state, e.g. by a worker process.
+    Node states resolve the placeholder whenever their cached value is read and release it when
+    they are invalidated.
+    """
+    def resolve(self):
+        """
+        :return: The actual result.
+        """
+        raise NotImplementedError("resolve")
+
+    def release(self):
+        """
+        Free any resources held by the result.
+        """
+        pass
+
+    def submit(self, func, args, errback):
+        """
+        Run `func(result, *args)` wherever the result is held, without waiting for it to finish and
+        without moving the result.
+
+        :param func: Picklable function.
+        :param args: Additional arguments.
+        :param errback: Called with the exception if `func` fails.
+        :return: Whether the call was submitted. Placeholders that don't support this return
+                 `False`, leaving it to the caller to resolve the result.
+        """
+        return False
+
+
+class NodeHook(object):
+    """
+    Base class for context instrumentation. Hooks are attached to node states with `Context.add_hook`
+    and get notified as the nodes are evaluated, cached, changed and invalidated. Only cached
+    evaluation (the `val` property) goes through the hooks.
+    """
+    def lookup(self, state):
+        """
+        Called before a dirty node is evaluated. Returning anything but `MISSING` supplies the result
+        without evaluating the node or its upstream nodes.
+
+        :param state: Node state object.
+        :return: Node result or `MISSING`.
+        """
+        return MISSING
+
+    def call(self, state, func, args, kwargs):
+        """
+        Wraps the call of the node function, after all upstream results are available.
+
+        :param state: Node state object.
+        :param func: The node function, or the next hook in line.
+        :param args: Positional arguments.
+        :param kwargs: Keyword arguments.
+        :return: Node result.
+        """
+        return func(*args, **kwargs)
+
+    def cached(self, state):
+        """
+        Called after a result has been stored in the node cache.
+
+        :param state: Node state object.
+        """
+        pass
+
+    def changed(self, state):
+        """
+        Called when the node parameters change, right before the node is invalidated.
+
+        :param state: Node state object.
+        """
+        pass
+
+    def invalidated(self, state):
+        """
+        Called when a clean node gets invalidated.
+
+        :param state: Node state object.
+        """
+        pass
+
+    def accessed(self, state):
+        """
+        Called when the result of the node is requested through the `val` property, before it is
+        evaluated or read from the cache.
+
+        :param state: Node state object.
+        """
+        pass
+
+    def close(self):
+        """
+        Called when the context is closed, after every node has been invalidated.
+        """
+        pass
+
+
+def _chain_hook(hook, state, func):
+    """
+    Wrap `func` in the call hook of `hook`.
+    """
+    return lambda *args, **kwargs: hook.call(state, func, args, kwargs)
+
+
+class _NodeSync(object):
+    def __init__(self, mutex):
+        """
+        Synchronization state of a node in a thread-safe context.
+
+        :param mutex: Context-wide reentrant lock serializing changes of node state.
+        """
+        self.mutex = mutex
+        self.lock = threading.Lock()
+        self.stale = False
+
+    def read(self, state):
+        """
+        Read the cached result of a node, computing it if it is dirty. Clean nodes are read without
+        locking: the read is retried under the node lock if the node state version changed meanwhile.
+        Only one thread computes a dirty node, the others wait for its result. Results computed while
+        the node got invalidated are discarded and computed again.
+
+        :param state: Node state object.
+        :return: Cached result.
+        """
+        version = state._version
+        cache = state._cache
+
+        if not state._dirty and version == state._version and not version & 1:
+            return cache
+
+        with self.lock:
+            while True:
+                with self.mutex:
+                    if not state._dirty:
+                        return state._cache
+                    self.stale = False
+
+                value = state._compute()
+
+                with self.mutex:
+                    if not self.stale:
+                        state._store(value)
+                        # Results dropped in favour of the outputs are handed to the reader once
+                        return value if isinstance(state._cache, _DroppedResult) else state._cache
+
+
 class NodeArgSpec(object):
     def __init__(self, args, varargs, keywords):
         """
@@ -47,20 +252,40 @@ class NodeArgSpec(object):
 
 
 class NodeStateBase(object):
-    def __init__(self, name, func):
+    def __init__(self, name, func, path=None, options=None):
         """
         Base class for node state objects. Provides basic functionality for attaching upstream and
         downstream nodes, evaluating and invalidating the node and all dependent nodes.
 
         :param name: Name of the node.
         :param func: Function object containin node logic.
+        :param path: Fully qualified path of the node. Defaults to the name.
+        :param options: Node options, see `pypeline.graph.node`.
         """
         self.name = name
+        self.path = path or (name,)
         self.func = func
         self.upstream = []
         self.downstream = []
         self._cache = None
         self._dirty = True
+        self._hooks = []
+        self._sync = None
+        self._alias = None
+        self._aliases = []
+        # Nodes that forced the result of this node through a lazy input
+        self._lazy_downstream = []
+        # Odd while the cache is being changed, see `_NodeSync.read`
+        self._version = 0
+        # Bumped whenever a changed result is stored
+        self._revision = 0
+        # Result kept across invalidations by nodes downstream of outputs, with the upstream revisions
+        self._memo = None
+        self._cutoff = False
+        self._reused = False
+        # Output node states by name, for nodes with named outputs
+        self.outputs = {}
+        self.options = options or {}
 
     def set(self, *args, **kwargs):
         """
@@ -77,6 +302,9 @@ class NodeStateBase(object):
         """
         :return: Evaluate and/or return the cached results.
         """
+        for hook in self._hooks:
+            hook.accessed(self)
+
         return self._eval_cached()
 
     def __call__(self, *args, **kwargs):
@@ -109,13 +337,117 @@ class NodeStateBase(object):
         """
         If this node is NOT dirty, invalidate it and all downstream nodes.
         """
+        if self._sync is None:
+            self._invalidate_unlocked()
+            return
+
+        with self._sync.mutex:
+            # A result in flight was computed from outdated inputs
+            if self._dirty:
+                self._sync.stale = True
+            self._invalidate_unlocked()
+
+    def _invalidate_unlocked(self):
+        """
+        Invalidate the node, holding the context mutex in thread-safe contexts.
+        """
         if not self._dirty:
+            self._version += 1
             self._dirty = True
-            self._cache = None
+            self._release()
+            self._version += 1
+
+            for hook in self._hooks:
+                hook.invalidated(self)
 
             for node in self.downstream:
                 node._invalidate()
 
+            for node in self._aliases:
+                node._invalidate()
+
+            lazy_downstream, self._lazy_downstream = self._lazy_downstream, []
+            for node in lazy_downstream:
+                node._invalidate()
+
+    def _changed(self):
+        """
+        Notify the hooks about changed parameters, then invalidate this node and all dependent nodes.
+        """
+        if self._sync is None:
+            self._changed_unlocked()
+            return
+
+        with self._sync.mutex:
+            self._changed_unlocked()
+
+    def _changed_unlocked(self):
+        """
+        Notify the hooks and invalidate the node, holding the context mutex in thread-safe contexts.
+        """
+        for hook in self._hooks:
+            hook.changed(self)
+
+        self._memo = None
+        self._invalidate()
+
+    def _store(self, value):
+        """
+        Store the result in the node cache and mark the node clean.
+
+        :param value: Evaluation result.
+        """
+        if self._sync is None:
+            self._store_unlocked(value)
+            return
+
+        with self._sync.mutex:
+            self._store_unlocked(value)
+
+    def _store_unlocked(self, value):
+        """
+        Store the result, holding the context mutex in thread-safe contexts.
+        """
+        if self.outputs:
+            value = self._split(value)
+
+        self._version += 1
+        self._cache = value
+        self._dirty = False
+        if not self._reused:
+            self._revision += 1
+        self._reused = False
+        self._version += 1
+
+        for hook in self._hooks:
+            hook.cached(self)
+
+    def _split(self, value):
+        """
+        Hand the outputs of a result to the output nodes with consumers. The result itself is dropped
+        unless other nodes consume it as a whole, so outputs without consumers don't take up memory.
+
+        :param value: Evaluation result.
+        :return: Result or placeholder to cache.
+        """
+        for output in self.outputs.values():
+            if output._dirty and output.downstream:
+                output._store(_pick(value, output.name, output._index))
+
+        if all(isinstance(node, OutputNodeState) and node._parent is self for node in self.downstream):
+            return _DroppedResult(self)
+
+        return value
+
+    def _release(self):
+        """
+        Drop the cached result, releasing any resources held by placeholder results.
+        """
+        if isinstance(self._cache, CachedResult):
+            self._cache.release()
+
+        self._cache = None
+
     def _set_params(self, args, kwargs):
         """
         Set the node parameters and invalidate this node and the dependent nodes.
@@ -145,7 +477,7 @@ class NodeStateBase(object):
 
 
 class NodeState(NodeStateBase):
-    def __init__(self, name, func, args, kwargs):
+    def __init__(self, name, func, args, kwargs, path=None, options=None):
         """
         Maintains node evaluation state for basic node types.
 
@@ -153,29 +485,49 @@ class NodeState(NodeStateBase):
         :param func: A function, method or callable class instance.
         :param args: Positional arguments that will be passed to the function for evaluation.
         :param kwargs: Keyword arguments that will be passed to the function for evaluation.
+        :param path: Fully qualified path of the node.
+        :param options: Node options.
         """
-        super(NodeState, self).__init__(name, func)
+        super(NodeState, self).__init__(name, func, path, options)
 
-        # If the func object is not a method or a function, assume it is a callable class
-        if inspect.isclass(type(func)) and not inspect.ismethod(func) and not inspect.isfunction(func):
-            self.func = func.__call__
+        if isinstance(func, FuncRef):
+            # Taken from the manifest if possible, so the function doesn't get imported just yet
+            self._args_spec = NodeArgSpec(*func.argspec())
+        else:
+            # If the func object is not a method or a function, assume it is a callable class
+            if inspect.isclass(type(func)) and not inspect.ismethod(func) and not inspect.isfunction(func):
+                self.func = func.__call__
 
-        args_spec = inspect.getargspec(self.func)
-        args_spec_args = args_spec.args
+            args_spec = inspect.getargspec(self.func)
+            args_spec_args = args_spec.args
 
-        # Exclude `self` for class methods
-        if inspect.ismethod(self.func):
-            args_spec_args = args_spec_args[1:]
+            # Exclude `self` for class methods
+            if inspect.ismethod(self.func):
+                args_spec_args = args_spec_args[1:]
 
-        self._args_spec = NodeArgSpec(args_spec_args, args_spec.varargs, args_spec.keywords)
+            self._args_spec = NodeArgSpec(args_spec_args, args_spec.varargs, args_spec.keywords)
 
         self._args = args
         self._kwargs = kwargs
+        # Indices of the upstream edges passed as thunks
+        self._lazy = frozenset()
+
+    def append(self, delta, concat=None):
+        """
+        Append rows to the cached result of the node and update the nodes downstream of it
+        incrementally. See `pypeline.incremental.append`.
+
+        :param delta: Appended rows.
+        :param concat: Function concatenating the previous result and the rows.
+        """
+        from pypeline.incremental import append
+
+        append(self, delta, concat)
 
     def update(self, **kwargs):
         self._set_kwargs(kwargs, replace=False)
 
-        self._invalidate()
+        self._changed()
 
     def _set_params(self, args, kwargs):
         """
@@ -187,7 +539,7 @@ class NodeState(NodeStateBase):
         self._set_args(args)
         self._set_kwargs(kwargs)
 
-        self._invalidate()
+        self._changed()
 
     def _set_args(self, args):
         """
@@ -223,23 +575,137 @@ class NodeState(NodeStateBase):
         :param kwargs: Keyword arguments.
         :return: Evaluation result.
         """
+        combined_args, combined_kwargs = self._bind(self._inputs(), args, kwargs)
+
+        return self._call(*combined_args, **combined_kwargs)
+
+    def _compute(self):
+        """
+        Evaluate the node with its own parameters, going through the hooks.
+
+        :return: Evaluation result.
+        """
+        # Nodes merged with an identical node share its result for as long as they stay identical. The
+        # upstream nodes are merged as well, reading them keeps them clean along with this node.
+        if self._alias is not None and _matches_alias(self):
+            value = self._alias._eval_cached()
+            for upstream_node in self.upstream:
+                upstream_node._eval_cached()
+            return value
+
+        if self._cutoff:
+            return self._compute_cutoff()
+
+        if not self._hooks:
+            return self._eval(self._args, self._kwargs.copy())
+
+        value = self._lookup()
+        if value is not MISSING:
+            return value
+
+        args, kwargs = self._bind(self._inputs(), self._args, self._kwargs.copy())
+
+        return self._call_hooked(args, kwargs)
+
+    def _compute_cutoff(self):
+        """
+        Evaluate a node downstream of node outputs, reusing the previous result if none of the upstream
+        nodes stored a changed result since. Reused results keep their revision.
+
+        :return: Evaluation result.
+        """
+        value = self._lookup() if self._hooks else MISSING
+        if value is not MISSING:
+            return value
+
+        incoming = self._inputs()
+        revisions = tuple((id(node), node._revision) for node in upstream_states(self))
+
+        self._reused = self._memo is not None and self._memo[0] == revisions
+        if self._reused:
+            return self._memo[1]
+
+        args, kwargs = self._bind(incoming, self._args, self._kwargs.copy())
+        value = self._call_hooked(args, kwargs) if self._hooks else self._call(*args, **kwargs)
+        self._memo = (revisions, value)
+
+        return value
+
+    def _inputs(self):
+        """
+        Collect the upstream results in the order of the upstream edges. Lazy inputs are passed as
+        `Thunk` objects.
+
+        :return: List of upstream results.
+        """
+        if not self._lazy:
+            return [upstream_node._eval_cached() for upstream_node in self.upstream]
+
+        incoming = []
+
+        for index, upstream_node in enumerate(self.upstream):
+            if index not in self._lazy:
+                incoming.append(upstream_node._eval_cached())
+            elif isinstance(upstream_node, ParamTargetNodeStateWrapper):
+                incoming.append(_params((), {upstream_node._param_name: Thunk(self, upstream_node._state)}))
+            else:
+                incoming.append(Thunk(self, upstream_node))
+
+        return incoming
+
+    def _call_hooked(self, args, kwargs):
+        """
+        Call the node function with the final arguments, through the call hooks.
+        """
+        func = self._call
+        for hook in reversed(self._hooks):
+            func = _chain_hook(hook, self, func)
+
+        return func(*args, **kwargs)
+
+    def _lookup(self):
+        """
+        Ask the hooks for a result without evaluating the node.
+
+        :return: Result supplied by the first hook that has one, `MISSING` otherwise.
+        """
+        for hook in self._hooks:
+            value = hook.lookup(self)
+            if value is not MISSING:
+                return value
+
+        return MISSING
+
+    def _call(self, *args, **kwargs):
+        """
+        Call the node function with the final arguments.
+        """
+        return self.func(*args, **kwargs)
+
+    def _bind(self, incoming, args, kwargs):
+        """
+        Combine the upstream results with the supplied arguments into the final function arguments.
+
+        :param incoming: Upstream results, in the order of the upstream edges.
+        :param args: Positional arguments.
+        :param kwargs: Keyword arguments. The dictionary will be updated in place.
+        :return: Tuple of the combined positional and keyword arguments.
+        """
         combined_args = []
         combined_kwargs = kwargs
 
-        for upstream_node in self.upstream:
-            incoming = upstream_node._eval_cached()
-
+        for value in incoming:
             # If the output is a `_params` object then use its contents as function arguments
             # to the current node function.
-            if isinstance(incoming, _params):
-                combined_args.extend(incoming.args)
-                combined_kwargs.update(incoming.kwargs)
+            if isinstance(value, _params):
+                combined_args.extend(value.args)
+                combined_kwargs.update(value.kwargs)
             else:
-                combined_args.append(incoming)
+                combined_args.append(value)
 
         combined_args.extend(args)
 
-        return self.func(*combined_args, **combined_kwargs)
+        return combined_args, combined_kwargs
 
     def _eval_cached(self):
         """
@@ -247,13 +713,296 @@ class NodeState(NodeStateBase):
 
         :return: Evaluation result.
         """
+        cache = self._cached()
+
+        if isinstance(cache, CachedResult):
+            return cache.resolve()
+
+        return cache
+
+    def _cached(self):
+        """
+        Evaluate the node if no cached result is available.
+
+        :return: Cached result, which may be a placeholder.
+        """
+        if self._sync is not None:
+            return self._sync.read(self)
+
         if self._dirty:
-            self._cache = self._eval(self._args, self._kwargs.copy())
-            self._dirty = False
+            value = self._compute()
+            self._store(value)
+
+            # Results dropped in favour of the outputs are handed to the reader once
+            if isinstance(self._cache, _DroppedResult):
+                return value
 
         return self._cache
 
 
+class PartitionedNodeState(NodeState):
+    def __init__(self, name, func, args, kwargs, path=None, options=None, partition=None, combine=None, pool=None):
+        """
+        Node state for data-parallel nodes. The first positional input is split into chunks, the node
+        function is mapped over the chunks on a pool and the results are combined.
+
+        Chains of partitioned nodes, each consuming only the output of the previous one, are fused:
+        every chunk runs through the whole chain in one task and the intermediate results are kept
+        per chunk. They are only combined if the intermediate node itself is read.
+
+        :param name: Name of the node.
+        :param func: Node function, applied to each chunk.
+        :param args: Positional arguments.
+        :param kwargs: Keyword arguments.
+        :param path: Fully qualified path of the node.
+        :param options: Node options.
+        :param partition: Function splitting the input into a list of chunks.
+        :param combine: Function merging the list of chunk results. Defaults to returning the list.
+        :param pool: Pool to map the chunks on. Defaults to `pypeline.partition.default_pool()`.
+        """
+        super(PartitionedNodeState, self).__init__(name, func, args, kwargs, path, options)
+
+        self._partition = partition
+        self._combine = combine or list
+        self._pool = pool
+        self._parts = None
+
+    def _invalidate(self):
+        """
+        Invalidate the node, including results held per chunk only.
+        """
+        parts, self._parts = self._parts, None
+
+        if self._dirty and parts is not None:
+            for node in self.downstream:
+                node._invalidate()
+        else:
+            super(PartitionedNodeState, self)._invalidate()
+
+    def _store(self, value):
+        # The combined result supersedes the chunks
+        self._parts = None
+        super(PartitionedNodeState, self)._store(value)
+
+    def _compute(self):
+        if self._hooks:
+            return super(PartitionedNodeState, self)._compute()
+
+        return self._combine(self._eval_parts())
+
+    def _call(self, *args, **kwargs):
+        if not args:
+            raise ValueError("Partitioned node %s has no input to split" % ".".join(self.path))
+
+        stages = [(self.func, args[1:], kwargs)]
+        return self._combine([results[0] for results in self._map(stages, self._partition(args[0]))])
+
+    def _eval_parts(self):
+        """
+        Evaluate the node chunk by chunk, fusing it with dirty partitioned upstream nodes.
+
+        :return: List of chunk results.
+        """
+        if self._parts is not None:
+            return self._parts
+
+        chain = [self]
+        while True:
+            source = chain[-1]._fusable_source()
+            if source is None or not source._dirty or source._parts is not None or source._hooks:
+                break
+            chain.append(source)
+
+        chain.reverse()
+        head = chain[0]
+        source = head._fusable_source()
+
+        if source is not None and source._parts is not None:
+            chunks = source._parts
+            stages = [(head.func, head._args, head._kwargs.copy())]
+        else:
+            args, kwargs = head._bind(head._inputs(), head._args, head._kwargs.copy())
+            if not args:
+                raise ValueError("Partitioned node %s has no input to split" % ".".join(head.path))
+
+            chunks = head._partition(args[0])
+            stages = [(head.func, args[1:], kwargs)]
+
+        stages.extend((node.func, node._args, node._kwargs.copy()) for node in chain[1:])
+
+        results = self._map(stages, chunks)
+        for index, node in enumerate(chain):
+            node._parts = [chunk_results[index] for chunk_results in results]
+
+        return self._parts
+
+    def _fusable_source(self):
+        """
+        :return: The upstream node if it is a partitioned node feeding this node alone, `None` otherwise.
+        """
+        if len(self.upstream) != 1:
+            return None
+
+        source = self.upstream[0]
+        if type(source) is PartitionedNodeState and len(source.downstream) == 1 and source._pool is self._pool:
+            return source
+
+        return None
+
+    def _map(self, stages, chunks):
+        """
+        Run the chunks through the stages on the pool.
+        """
+        return (self._pool or default_pool()).map(functools.partial(run_stages, stages), chunks)
+
+
+class OutputNodeState(NodeState):
+    def __init__(self, parent, name, index):
+        """
+        Node state of a named output of a node. Outputs are cached on their own: the node hands them
+        over when it stores its result. An output that is equal to its previous value after the node
+        was evaluated again keeps its revision, and consumers of unchanged outputs reuse their previous
+        results instead of calling their functions (unless their own parameters changed).
+
+        Outputs take no parameters and don't go through the `lookup` and `call` hooks.
+
+        :param parent: Node state of the node declaring the output.
+        :param name: Output name.
+        :param index: Position of the output in the tuple returned by the node function. Node
+                      functions may return a dictionary keyed by output name instead.
+        """
+        super(OutputNodeState, self).__init__(name, _pick, (name, index), {}, parent.path + (name,))
+
+        self._parent = parent
+        self._index = index
+        self._previous = MISSING
+
+    def _set_params(self, args, kwargs):
+        raise ValueError("Output %s takes no parameters" % ".".join(self.path))
+
+    def _compute(self):
+        cache = self._parent._cached()
+
+        if isinstance(cache, _DroppedResult):
+            # Handed over when the parent stored its result
+            if not self._dirty:
+                return self._cache
+            cache = cache.resolve()
+        elif isinstance(cache, CachedResult):
+            cache = cache.resolve()
+
+        return _pick(cache, self.name, self._index)
+
+    def _store_unlocked(self, value):
+        previous = self._previous if self._dirty else self._cache
+        self._previous = MISSING
+        revision = self._revision
+
+        super(OutputNodeState, self)._store_unlocked(value)
+
+        if previous is not MISSING and _unchanged(previous, value):
+            self._revision = revision
+
+    def _release(self):
+        # Kept to tell whether the output changed once it is evaluated again
+        self._previous = MISSING if isinstance(self._cache, CachedResult) else self._cache
+        super(OutputNodeState, self)._release()
+
+
+class _DroppedResult(CachedResult):
+    def __init__(self, state):
+        """
+        Placeholder for the result of a node with outputs, dropped once the outputs were handed to
+        their consumers. Reading the result evaluates the node again, without caching it.
+
+        :param state: Node state object.
+        """
+        self._state = state
+
+    def resolve(self):
+        return self._state._compute()
+
+
+def _pick(value, name, index):
+    """
+    Node function of outputs, selecting the output from the result of the node declaring it.
+    """
+    if isinstance(value, dict):
+        return value[name]
+
+    return value[index]
+
+
+def _unchanged(value, other):
+    """
+    Compare results, element-wise for arrays and data frames. Anything that can't be compared is
+    considered changed.
+    """
+    if value is other:
+        return True
+    if type(value) is not type(other):
+        return False
+
+    try:
+        # Pandas objects
+        if callable(getattr(value, "equals", None)):
+            return bool(value.equals(other))
+
+        result = value == other
+        if hasattr(result, "all"):
+            return getattr(value, "shape", None) == getattr(other, "shape", None) and bool(result.all())
+
+        return bool(result)
+    except Exception:
+        return False
+
+
+class Thunk(object):
+    def __init__(self, consumer, state):
+        """
+        Lazy input of a node. Calling the thunk evaluates (or reads the cached result of) the upstream
+        node. The consumer only depends on upstream nodes it forced: it is invalidated along with
+        them, but not by changes of inputs it never used.
+
+        :param consumer: Node state receiving the input.
+        :param state: Upstream node state.
+        """
+        self._consumer = consumer
+        self._state = state
+
+    def __call__(self):
+        value = self._state._eval_cached()
+
+        if all(node is not self._consumer for node in self._state._lazy_downstream):
+            self._state._lazy_downstream.append(self._consumer)
+
+        return value
+
+
+def _wire_lazy(state):
+    """
+    Detach the upstream edges of a node declared lazy from invalidation. Parameter targeted edges
+    are matched by parameter name, positional edges by position in the function signature.
+    """
+    names = state.options.get("lazy")
+    if not names:
+        return
+
+    lazy = set()
+    for index, upstream in enumerate(state.upstream):
+        if isinstance(upstream, ParamTargetNodeStateWrapper):
+            name = upstream._param_name
+        else:
+            name = state._args_spec.args[index] if index < len(state._args_spec.args) else None
+
+        if name in names:
+            lazy.add(index)
+            source = getattr(upstream, "_state", upstream)
+            source.downstream.remove(state)
+
+    state._lazy = frozenset(lazy)
+
+
 class ParamTargetNodeStateWrapper(object):
     def __init__(self, param_name, state):
         """
@@ -274,6 +1023,98 @@ class ParamTargetNodeStateWrapper(object):
         return _params((), {self._param_name: self._state._eval_cached()})
 
 
+def _node_state(node_def):
+    """
+    Construct the node state object matching the options of a node definition.
+
+    :param node_def: Node definition.
+    :return: Node state object.
+    """
+    options = node_def.options
+    args = (node_def.name, node_def.func, node_def.args, node_def.kwargs.copy(), node_def.path, options)
+
+    if options.get("partition") is not None:
+        state = PartitionedNodeState(*args, partition=options["partition"], combine=options.get("combine"),
+                                     pool=options.get("pool"))
+    else:
+        state = NodeState(*args)
+
+    for index, name in enumerate(options.get("outputs", ())):
+        state.outputs[name] = OutputNodeState(state, name, index)
+
+    return state
+
+
+def _definition(node_def):
+    """
+    Snapshot the parts of a node definition that determine its node state.
+
+    :return: Tuple of the function, default positional and keyword arguments and options.
+    """
+    return node_def.func, node_def.args, dict(node_def.kwargs), dict(node_def.options)
+
+
+def _node_defs(graph):
+    """
+    Collect the node definitions of a graph and its sub-graphs.
+
+    :return: Dictionary mapping node paths to node definitions.
+    """
+    definitions = {}
+
+    for value in graph._items.values():
+        if isinstance(value, NodeDef):
+            definitions[value.path] = value
+        else:
+            definitions.update(_node_defs(value))
+
+    return definitions
+
+
+def _equal(value, other):
+    """
+    Compare parameters, treating values without a truth value for equality (e.g. arrays) as different
+    unless they are the same object.
+    """
+    if value is other:
+        return True
+
+    try:
+        return bool(value == other)
+    except Exception:
+        return False
+
+
+def _same_definition(state, other):
+    """
+    :return: Whether two node states have the same function, parameters and kinds of upstream edges.
+    """
+    return (_equal(state.func, other.func) and _equal(state._args, other._args) and
+            _equal(state._kwargs, other._kwargs) and _equal(state.options, other.options) and
+            [getattr(edge, "_param_name", None) for edge in state.upstream] ==
+            [getattr(edge, "_param_name", None) for edge in other.upstream])
+
+
+def _matches_alias(state):
+    """
+    :return: Whether a merged node still computes the same result as the node it was merged with,
+             i.e. neither of them nor anything upstream of them diverged through parameter changes.
+    """
+    alias = state._alias
+    if not _same_definition(state, alias):
+        return False
+
+    for upstream, alias_upstream in zip(upstream_states(state), upstream_states(alias)):
+        if upstream is alias_upstream:
+            continue
+        if (upstream._alias or upstream) is not (alias_upstream._alias or alias_upstream):
+            return False
+        if any(node._alias is not None and not _matches_alias(node) for node in (upstream, alias_upstream)):
+            return False
+
+    return True
+
+
 class NodeGroup(object):
     def __init__(self):
         """
@@ -328,7 +1169,7 @@ class NodeGroup(object):
         for item in self._items.values():
             if isinstance(item, NodeState):
                 item._set_kwargs(global_params, replace=False)
-                item._invalidate()
+                item._changed()
             else:
                 item._set_global_params(global_params)
 
@@ -390,24 +1231,63 @@ class Context(NodeGroup):
         """
         super(Context, self).__init__()
 
+        self._mutex = None
+        self._reactor = None
+        self._global_params = {}
+        # Bumped whenever the structure changes, see `compile_node`
+        self._generation = 0
+        self._reachability = None
+        self._build(graph_blueprint, {})
+        self._set_params(kwargs)
+
+    def _build(self, graph_blueprint, states):
+        """
+        Build the node hierarchy and wiring of the context from a graph blueprint. Existing node
+        groups are reused.
+
+        :param graph_blueprint: Graph serving as the blueprint.
+        :param states: Node states to reuse, keyed by path. Nodes without one get a new node state.
+        """
+        self._generation += 1
         self._nodes = {}
+        self._definitions = {}
+        self._edges = dict((path, list(edges)) for path, edges in graph_blueprint._upstream.items())
 
         downstream = graph_blueprint._downstream
         upstream = graph_blueprint._upstream
 
         def _walk_graph(graph, target_group):
+            for key in set(target_group._items) - set(graph._items):
+                del target_group._items[key]
+
             for key, value in graph._items.items():
                 if isinstance(value, NodeDef):
-                    state = NodeState(key, value.func, value.args, value.kwargs.copy())
+                    state = states.get(value.path) or _node_state(value)
                     target_group._set_item(key, state)
                     self._nodes[value.path] = state
+                    self._definitions[value.path] = _definition(value)
+
+                    for output in state.outputs.values():
+                        self._nodes[output.path] = output
                 else:
-                    new_group = NodeGroup()
-                    target_group._set_item(key, new_group)
+                    new_group = target_group._items.get(key)
+                    if not isinstance(new_group, NodeGroup):
+                        new_group = NodeGroup()
+                        target_group._set_item(key, new_group)
                     _walk_graph(value, new_group)
 
         _walk_graph(graph_blueprint, self)
 
+        for state in self._nodes.values():
+            del state.upstream[:]
+            del state.downstream[:]
+            del state._lazy_downstream[:]
+
+        for state in self._nodes.values():
+            for output in state.outputs.values():
+                state._add_downstream(output)
+                output._add_upstream(state)
+
         def _parse_edges(edges, add_func):
             for source, targets in edges.items():
                 for target in targets:
@@ -418,9 +1298,426 @@ class Context(NodeGroup):
         def _upstream_wire(source, target):
             target_node = self._nodes[target.node]
             # Edges that wire node output to specific parameters need to be wrapped.
-            source._add_upstream(target_node if target.param is None else ParamTargetNodeStateWrapper(target_node,
-                                                                                                      target.param))
+            source._add_upstream(target_node if target.param is None else ParamTargetNodeStateWrapper(target.param,
+                                                                                                      target_node))
 
         _parse_edges(upstream, _upstream_wire)
 
-        self._set_params(kwargs)
+        for state in self._nodes.values():
+            _wire_lazy(state)
+
+        # Nodes downstream of outputs reuse their results if the outputs didn't change
+        for state in self._nodes.values():
+            state._cutoff = False
+
+        stack = [node for state in self._nodes.values() if isinstance(state, OutputNodeState)
+                 for node in state.downstream]
+        while stack:
+            state = stack.pop()
+            if not state._cutoff and not state._lazy:
+                state._cutoff = True
+                stack.extend(state.downstream)
+
+    def rebase(self, graph_blueprint):
+        """
+        Apply changes of the graph blueprint (or a different version of it) to the context, keeping
+        the cached results of everything that isn't affected by them. Nodes missing from the new
+        blueprint are removed and new nodes are added. Nodes with a different function, default
+        parameters or options are replaced, and nodes with different upstream edges are rewired.
+        Only the replaced and rewired nodes and everything downstream of them are invalidated.
+
+        Replaced nodes keep their hooks, as well as their parameters if their defaults didn't change.
+        Otherwise replaced and new nodes get their defaults and the global parameters set on the
+        context. Nodes merged by `share_common_nodes` are split, run the pass again to merge them.
+
+        :param graph_blueprint: New graph blueprint.
+        :return: Dictionary with the sorted paths of the "added", "removed", "replaced" and "rewired"
+                 nodes.
+        """
+        if self._mutex is None:
+            return self._rebase(graph_blueprint)
+
+        with self._mutex:
+            return self._rebase(graph_blueprint)
+
+    def _rebase(self, graph_blueprint):
+        definitions = _node_defs(graph_blueprint)
+        changes = dict(added=[], removed=[], replaced=[], rewired=[])
+        states = {}
+        fresh = []
+
+        for path, state in self._nodes.items():
+            state._alias = None
+            del state._aliases[:]
+
+            # Outputs come and go with the node declaring them
+            if isinstance(state, OutputNodeState):
+                continue
+
+            node_def = definitions.get(path)
+
+            if node_def is None:
+                changes["removed"].append(path)
+                state._invalidate()
+                continue
+
+            old = self._definitions[path]
+            new = _definition(node_def)
+
+            if all(_equal(old_item, new_item) for old_item, new_item in zip(old, new)):
+                states[path] = state
+
+                if self._edges[path] != graph_blueprint._upstream[path]:
+                    changes["rewired"].append(path)
+                    state._invalidate()
+                continue
+
+            changes["replaced"].append(path)
+            state._invalidate()
+
+            replacement = states[path] = _node_state(node_def)
+            replacement._hooks = state._hooks
+
+            if _equal(old[1:3], new[1:3]):
+                replacement._set_args(state._args)
+                replacement._set_kwargs(state._kwargs)
+            else:
+                replacement._set_kwargs(self._global_params, replace=False)
+            fresh.append(replacement)
+
+        for path, node_def in definitions.items():
+            if path not in self._nodes:
+                changes["added"].append(path)
+                state = states[path] = _node_state(node_def)
+                state._set_kwargs(self._global_params, replace=False)
+                fresh.append(state)
+
+        self._build(graph_blueprint, states)
+
+        # Invalidation stops at dirty nodes, so it has to start below the new ones
+        for state in fresh:
+            if self._mutex is not None:
+                state._sync = _NodeSync(self._mutex)
+
+            for node in state.downstream:
+                node._invalidate()
+
+            for output in state.outputs.values():
+                if self._mutex is not None:
+                    output._sync = _NodeSync(self._mutex)
+
+                for node in output.downstream:
+                    node._invalidate()
+
+        return dict((key, sorted(paths)) for key, paths in changes.items())
+
+    def make_thread_safe(self):
+        """
+        Allow threads to share the context. Every node is computed by one thread at a time, the
+        first thread reading a dirty node computes it and concurrent readers wait for its result.
+        Reading clean nodes takes no locks. Parameter changes are applied atomically with respect
+        to each other, and results computed while their inputs change are discarded and computed
+        again instead of being cached.
+
+        Partitioned nodes and the evaluators in other modules (schedulers, prefetching etc.) manage
+        node state on their own and must not be used concurrently with other threads.
+
+        :return: The context itself.
+        """
+        if self._mutex is None:
+            self._mutex = threading.RLock()
+
+            for state in self._nodes.values():
+                state._sync = _NodeSync(self._mutex)
+
+        return self
+
+    def share_common_nodes(self):
+        """
+        Merge structurally identical nodes, e.g. copies of the same loader in sub-graphs merged from
+        different graphs: nodes of the same function, with equal parameters and options, fed by the
+        same (or merged) upstream nodes. Every node keeps its path and parameters, but merged nodes
+        take their result from the first node of their kind instead of computing it again. Nodes
+        diverging through parameter changes, of their own or upstream, are evaluated on their own
+        for as long as they differ.
+
+        Only basic nodes are merged. The pass is meant to run right after the context is constructed.
+
+        :return: Dictionary mapping the paths of the merged nodes to the paths of the nodes they were
+                 merged with.
+        """
+        order = []
+        visited = set()
+
+        for state in sorted(self._nodes.values(), key=lambda node: node.path):
+            closure = upstream_closure(state, lambda node: id(node) not in visited)
+            visited.update(id(node) for node in closure)
+            order.extend(closure)
+
+        kinds = {}
+        merged = {}
+
+        for state in order:
+            if type(state) is not NodeState or state._alias is not None:
+                continue
+
+            key = tuple(id(upstream._alias or upstream) for upstream in upstream_states(state))
+            candidates = kinds.setdefault(key, [])
+
+            for candidate in candidates:
+                if _same_definition(state, candidate):
+                    state._alias = candidate
+                    candidate._aliases.append(state)
+                    merged[state.path] = candidate.path
+                    break
+            else:
+                candidates.append(state)
+
+        return merged
+
+    def _set_params(self, kwargs):
+        # Global parameters apply to nodes added by `rebase` as well
+        self._global_params.update((key, value) for key, value in kwargs.items() if key not in self._items)
+
+        if self._mutex is None:
+            super(Context, self)._set_params(kwargs)
+            return
+
+        with self._mutex:
+            super(Context, self)._set_params(kwargs)
+
+    def add_hook(self, hook, nodes=None):
+        """
+        Attach an instrumentation hook.
+
+        :param hook: `NodeHook` instance.
+        :param nodes: Node states to attach the hook to. Defaults to every node in the context.
+        """
+        for state in (self._nodes.values() if nodes is None else nodes):
+            state._hooks.append(hook)
+
+    def evaluate(self, node, deadline=None):
+        """
+        Evaluate and cache a node, optionally within a time budget. See `pypeline.deadline.evaluate`.
+
+        :param node: Node state object.
+        :param deadline: Time budget in seconds, `None` for no limit.
+        :return: Evaluation result.
+        """
+        if deadline is None:
+            return node._eval_cached()
+
+        from pypeline.deadline import evaluate
+
+        return evaluate(node, deadline)
+
+    def reachability(self):
+        """
+        Get the reachability index of the context nodes, built on first use and again whenever the
+        structure of the context changes. See `pypeline.reachability.ReachabilityIndex`.
+
+        :return: `ReachabilityIndex` instance, keyed by node path.
+        """
+        if self._reachability is None or self._reachability[0] != self._generation:
+            from pypeline.reachability import ReachabilityIndex
+
+            self._reachability = self._generation, ReachabilityIndex.from_context(self)
+
+        return self._reachability[1]
+
+    def ancestors(self, node):
+        """
+        :param node: Node state object.
+        :return: List of the node states upstream of the node, directly or not, sorted by path.
+        """
+        return [self._nodes[path] for path in sorted(self.reachability().ancestors(node.path))]
+
+    def descendants(self, node):
+        """
+        Collect the nodes depending on a node, i.e. the nodes recomputed when the node changes.
+
+        :param node: Node state object.
+        :return: List of the node states downstream of the node, directly or not, sorted by path.
+        """
+        return [self._nodes[path] for path in sorted(self.reachability().descendants(node.path))]
+
+    def reaches(self, source, target):
+        """
+        :param source: Node state object.
+        :param target: Node state object.
+        :return: Whether the target node depends on the source node, directly or not.
+        """
+        return self.reachability().reaches(source.path, target.path)
+
+    def record(self, filename=None):
+        """
+        Start recording the workload of the context for replaying it later. See `pypeline.replay`.
+
+        :param filename: Trace file written when the recorder is closed (e.g. with the context).
+        :return: `Recorder` instance.
+        """
+        from pypeline.replay import Recorder
+
+        return Recorder(self, filename)
+
+    def compile_node(self, node):
+        """
+        Compile the evaluation of a node into a generated function, for graphs where the overhead of
+        the generic evaluation outweighs the node functions. Calling the returned object evaluates
+        and caches the node like the `val` property. See `pypeline.codegen`.
+
+        :param node: Node state object.
+        :return: `CompiledNode` instance.
+        """
+        from pypeline.codegen import CompiledNode
+
+        return CompiledNode(self, node)
+
+    def prefetch(self, *nodes):
+        """
+        Start evaluating the given nodes in the background and return right away. Reading a node
+        afterwards only blocks while its result is still being computed. Setting parameters upstream
+        of a prefetched node discards its prefetched result. See `pypeline.prefetch`.
+
+        :param nodes: Node states to prefetch.
+        :return: List of `PrefetchJob` objects, one per node with something to compute.
+        """
+        from pypeline.prefetch import PrefetchJob
+
+        jobs = [PrefetchJob(node) for node in nodes if node._dirty]
+        for job in jobs:
+            job.start()
+
+        return jobs
+
+    def profile_memory(self, nodes=None, mode=None):
+        """
+        Start recording the memory footprint of the context nodes. See `pypeline.memory`.
+
+        :param nodes: Node states to profile. Defaults to every node.
+        :param mode: Either "tracemalloc" or "rss". Defaults to "tracemalloc" if available.
+        :return: `MemoryProfiler` instance, call its `close` method to stop profiling.
+        """
+        from pypeline.memory import MemoryProfiler
+
+        return MemoryProfiler(self, nodes, mode)
+
+    def subscribe(self, node, callback, errback=None, debounce=0.05):
+        """
+        Push the values of a node to a callback whenever it changes, recomputing it in the background
+        after parameter changes. Makes the context thread-safe. See `pypeline.reactive.Reactor`.
+
+        :param node: Node state object.
+        :param callback: Called with every new value, on a background thread.
+        :param errback: Called with the exception if the node fails.
+        :param debounce: Quiet period in seconds before recomputing, used by the first subscription.
+        :return: `Subscription` instance.
+        """
+        from pypeline.reactive import Reactor
+
+        if self._reactor is None or self._reactor.closed:
+            self._reactor = Reactor(self, debounce)
+
+        return self._reactor.subscribe(node, callback, errback)
+
+    def profile_nodes(self, patterns=None):
+        """
+        Start profiling the function calls of selected nodes with `cProfile`. See
+        `pypeline.profiling.NodeProfiler`.
+
+        :param patterns: Node paths (tuples) or glob patterns matched against dotted node paths.
+                         Defaults to every node.
+        :return: `NodeProfiler` instance.
+        """
+        from pypeline.profiling import NodeProfiler
+
+        return NodeProfiler(self, patterns)
+
+    def record_costs(self, filename=None, nodes=None):
+        """
+        Start recording the runtime of the context nodes, e.g. for scheduling them with
+        `pypeline.parallel.ParallelEvaluator`.
+
+        :param filename: JSON file to load earlier statistics from and save them to.
+        :param nodes: Node states to time. Defaults to every node.
+        :return: `CostModel` instance.
+        """
+        from pypeline.parallel import CostModel
+
+        costs = CostModel(filename=filename)
+        costs.attach(self, nodes)
+
+        return costs
+
+    def parallel_evaluator(self, resources=None, threads=None, costs=None):
+        """
+        Create an evaluator running independent nodes concurrently, within the capacities of the
+        resources the nodes declare. See `pypeline.parallel.ParallelEvaluator`.
+
+        :param resources: Capacity of each resource, e.g. `{"db": 4}`.
+        :param threads: Maximum number of nodes running at a time. Defaults to the number of CPUs.
+        :param costs: Cost model attached to the context, see `record_costs`. Defaults to a new one.
+        :return: `ParallelEvaluator` instance.
+        """
+        from pypeline.parallel import ParallelEvaluator
+
+        return ParallelEvaluator(self, costs, threads, resources=resources)
+
+    def close(self):
+        """
+        Tear down the context: invalidate every node, releasing the resources held by cached results
+        (spill files, shared memory segments, etc.), and close the attached hooks.
+        """
+        hooks = [] if self._reactor is None else [self._reactor]
+        for state in self._nodes.values():
+            hooks.extend(hook for hook in state._hooks if all(hook is not other for other in hooks))
+
+        for state in self._nodes.values():
+            state._invalidate()
+
+        for hook in hooks:
+            hook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def spill(self, limit, directory=None, threshold=1 << 20):
+        """
+        Start spilling cached results to disk once they take up more than `limit` bytes. See
+        `pypeline.spill.SpillManager`.
+
+        :param limit: Maximum size in bytes of the cached results held in memory.
+        :param directory: Scratch directory. Defaults to a new temporary directory.
+        :param threshold: Minimum size in bytes of spilled results.
+        :return: `SpillManager` instance.
+        """
+        from pypeline.spill import SpillManager
+
+        return SpillManager(self, limit, directory, threshold)
+
+    def share_results(self, directory, limit=None, nodes=None):
+        """
+        Share node results with other processes on the same machine through a store directory, so
+        that every result is only computed by one of them. See `pypeline.sharedcache.SharedCache`.
+
+        :param directory: Store directory.
+        :param limit: Maximum size of the stored results in bytes. Unbounded by default.
+        :param nodes: Node states to share. Defaults to every node.
+        :return: `SharedCache` instance.
+        """
+        from pypeline.sharedcache import SharedCache
+
+        return SharedCache(self, directory, limit, nodes)
+
+    def remove_hook(self, hook):
+        """
+        Detach an instrumentation hook from every node it is attached to.
+
+        :param hook: `NodeHook` instance.
+        """
+        for state in self._nodes.values():
+            if hook in state._hooks:
+                state._hooks.remove(hook)
@@ -0,0 +1,109 @@
+import time
+import threading
+
+from pypeline.context import dirty_closure
+
+__all__ = ["DeadlineExceeded", "EvaluationCancelled", "CancellationToken", "cancellation_token", "evaluate"]
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, path, finished, unfinished):
+        """
+        Raised when a node can't be evaluated within its time budget. Results of the finished nodes
+        stay cached, so evaluating the node again resumes where the evaluation stopped.
+
+        :param path: Path of the requested node.
+        :param finished: Paths of the nodes evaluated before the deadline passed.
+        :param unfinished: Paths of the nodes cancelled or not started, in evaluation order.
+        """
+        super(DeadlineExceeded, self).__init__("Deadline exceeded evaluating %s, %d of %d nodes unfinished" %
+                                               (".".join(path), len(unfinished), len(finished) + len(unfinished)))
+        self.path = path
+        self.finished = finished
+        self.unfinished = unfinished
+
+
+class EvaluationCancelled(Exception):
+    """
+    Raised by `CancellationToken.check` once the running node has been cancelled.
+    """
+    pass
+
+
+class CancellationToken(object):
+    def __init__(self):
+        """
+        Cancellation flag of a running node. Node functions poll it to stop early.
+        """
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        """
+        :return: Whether the node has been cancelled.
+        """
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    def check(self):
+        """
+        Raise `EvaluationCancelled` if the node has been cancelled.
+        """
+        if self._event.is_set():
+            raise EvaluationCancelled()
+
+
+_local = threading.local()
+_never = CancellationToken()
+
+
+def cancellation_token():
+    """
+    :return: Cancellation token of the node running on the current thread. Outside of deadline-aware
+             evaluation, the token is never cancelled.
+    """
+    return getattr(_local, "token", _never)
+
+
+def evaluate(node, deadline):
+    """
+    Evaluate a node within a time budget. The dirty upstream closure of the node is evaluated in
+    order, and no further nodes are started once the budget is spent. The node running at the
+    deadline is cancelled through its `cancellation_token`; nodes that don't poll the token run to
+    completion. Results finished in time stay cached either way.
+
+    :param node: Node state object.
+    :param deadline: Time budget in seconds.
+    :return: Evaluation result.
+    :raises DeadlineExceeded: If the node couldn't be evaluated in time.
+    """
+    expires = time.time() + deadline
+    order = dirty_closure(node)
+    finished = []
+
+    for index, state in enumerate(order):
+        remaining = expires - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded(node.path, finished, [pending.path for pending in order[index:]])
+
+        token = CancellationToken()
+        timer = threading.Timer(remaining, token.cancel)
+        timer.daemon = True
+        previous = cancellation_token()
+        _local.token = token
+        timer.start()
+
+        try:
+            value = state._compute()
+        except EvaluationCancelled:
+            raise DeadlineExceeded(node.path, finished, [pending.path for pending in order[index:]])
+        finally:
+            timer.cancel()
+            _local.token = previous
+
+        state._store(value)
+        finished.append(state.path)
+
+    return node._eval_cached()
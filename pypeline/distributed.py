@@ -0,0 +1,533 @@
+import pickle
+import select
+import functools
+import itertools
+import traceback
+import multiprocessing
+
+from multiprocessing.connection import Client, Listener
+from pypeline.context import (MISSING, CachedResult, ParamTargetNodeStateWrapper, _params, dirty_closure,
+                              upstream_states)
+from pypeline.sharedmem import SharedBuffer, share
+
+__all__ = ["Scheduler", "RemoteResult", "WorkerError", "serve"]
+
+
+class WorkerError(Exception):
+    def __init__(self, path, message, remote_traceback):
+        """
+        Raised when a node fails on a worker and the original exception can't be transported back.
+
+        :param path: Path of the failed node.
+        :param message: Description of the original exception.
+        :param remote_traceback: Formatted traceback from the worker.
+        """
+        super(WorkerError, self).__init__("Node %s failed: %s" % (".".join(path), message))
+        self.path = path
+        self.remote_traceback = remote_traceback
+
+
+def serve(context, address, authkey=None):
+    """
+    Serve a single scheduler connection on the given address. Used to run workers outside of the
+    scheduler's process tree, e.g. on another host. The context must be constructed from the same
+    graph as the scheduler's context.
+
+    :param context: Context to take node functions from.
+    :param address: Address to listen on, e.g. `("0.0.0.0", 6000)`.
+    :param authkey: Shared secret for authenticating the scheduler.
+    """
+    listener = Listener(address, authkey=authkey)
+    conn = listener.accept()
+    listener.close()
+
+    _worker_loop(context, conn)
+
+
+def _worker_loop(context, conn, share_threshold=None):
+    """
+    Worker side of the scheduler protocol. Messages are tuples, with the command in the first slot:
+
+        ("run", path, args, kwargs) -> ("done", path, shared) or ("error", path, error)
+        ("get", path) -> ("value", path, value)
+        ("put", path, value)
+        ("drop", path)
+        ("call", path, func, args, token) -> ("failed", token, error) if the call fails
+        ("stop",)
+
+    Results are held in a local store keyed by node path until they are dropped. Large results
+    are moved into shared memory segments, in which case `shared` is the segment handle and the
+    store holds a view of the segment. Values put as segment handles are mapped the same way.
+
+    :param context: Context to take node functions and wiring from.
+    :param conn: Connection to the scheduler.
+    :param share_threshold: Minimum size in bytes of results moved into shared memory. `None`
+                            disables shared memory.
+    """
+    store = {}
+
+    while True:
+        message = conn.recv()
+        command = message[0]
+
+        if command == "run":
+            _, path, args, kwargs = message
+            state = context._nodes[path]
+
+            shared = None
+
+            try:
+                incoming = [_stored_input(upstream, store, index in state._lazy)
+                            for index, upstream in enumerate(state.upstream)]
+                combined_args, combined_kwargs = state._bind(incoming, args, kwargs)
+                value = state._call(*combined_args, **combined_kwargs)
+
+                if share_threshold is not None:
+                    shared = share(value, share_threshold)
+                if shared is not None:
+                    value = shared.attach()
+            except Exception as exc:
+                # Nobody else knows about the segment yet
+                if shared is not None:
+                    shared.unlink()
+                conn.send(("error", path, _portable_error(path, exc)))
+            else:
+                try:
+                    conn.send(("done", path, shared))
+                except Exception:
+                    if shared is not None:
+                        shared.unlink()
+                    raise
+                store[path] = value
+        elif command == "get":
+            conn.send(("value", message[1], store[message[1]]))
+        elif command == "put":
+            value = message[2]
+            store[message[1]] = value.attach() if isinstance(value, SharedBuffer) else value
+        elif command == "drop":
+            store.pop(message[1], None)
+        elif command == "call":
+            _, path, func, args, token = message
+
+            try:
+                func(store[path], *args)
+            except Exception as exc:
+                conn.send(("failed", token, _portable_error(path, exc)))
+        elif command == "stop":
+            conn.close()
+            break
+
+
+def _stored_input(upstream, store, lazy=False):
+    """
+    Look up the result feeding into a node through the given upstream edge from a worker store. Lazy
+    inputs are evaluated by the scheduler anyway, they are passed as thunks returning the result.
+    """
+    value = store[getattr(upstream, "_state", upstream).path]
+    if lazy:
+        value = functools.partial(_identity, value)
+
+    if isinstance(upstream, ParamTargetNodeStateWrapper):
+        return _params((), {upstream._param_name: value})
+
+    return value
+
+
+def _identity(value):
+    return value
+
+
+def _portable_error(path, exc):
+    """
+    Make sure the exception can be pickled, falling back to a `WorkerError` with the formatted
+    traceback.
+    """
+    formatted = traceback.format_exc()
+
+    try:
+        pickle.loads(pickle.dumps(exc, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return WorkerError(path, repr(exc), formatted)
+
+    exc.remote_traceback = formatted
+    return exc
+
+
+class _Worker(object):
+    def __init__(self, index, conn, process=None):
+        """
+        Scheduler side handle of a worker.
+
+        :param index: Index of the worker.
+        :param conn: Connection to the worker.
+        :param process: Worker process, if started by the scheduler.
+        """
+        self.index = index
+        self.conn = conn
+        self.process = process
+        self.busy = None
+        self.errbacks = {}
+
+    def request(self, message):
+        """
+        Send a message and wait for the reply. Only valid on idle workers.
+        """
+        self.conn.send(message)
+        return self.recv()
+
+    def recv(self):
+        """
+        Receive the next reply, handing failures of submitted calls to their error callbacks.
+        """
+        while True:
+            message = self.conn.recv()
+            if message[0] != "failed":
+                return message
+
+            self.errbacks.pop(message[1])(message[2])
+
+
+class RemoteResult(CachedResult):
+    def __init__(self, scheduler, path, shared=None):
+        """
+        Result held by one or more scheduler workers. The value is fetched on first access, or
+        mapped without copying if it lives in a shared memory segment. The segment is removed when
+        the result is released.
+
+        :param scheduler: Owning scheduler.
+        :param path: Path of the node.
+        :param shared: Shared memory segment handle, if any.
+        """
+        self._scheduler = scheduler
+        self._path = path
+        self.shared = shared
+        self._fetched = False
+        self._value = None
+
+    def resolve(self):
+        if not self._fetched:
+            self._value = self._scheduler._fetch(self._path) if self.shared is None else self.shared.attach()
+            self._fetched = True
+
+        return self._value
+
+    def submit(self, func, args, errback):
+        return self._scheduler._submit(self._path, func, args, errback)
+
+    def release(self):
+        self._scheduler._drop(self._path)
+        self._value = None
+
+        if self.shared is not None:
+            self._scheduler._unlink(self.shared)
+
+
+class Scheduler(object):
+    def __init__(self, context, workers=None, share_threshold=None):
+        """
+        Evaluates context nodes on a pool of worker processes. The dirty upstream closure of the
+        requested node is partitioned across the workers, preferring the worker that already holds
+        most of a node's inputs. Results stay on the worker that produced them and are moved to
+        other workers (or the scheduler) only when needed. Node paths identify nodes across
+        processes.
+
+        Local workers are forked from the current process and inherit the context, so node
+        functions don't need to be picklable. Arguments and results do.
+
+        With `share_threshold` set, local workers place large NumPy array, bytearray and memoryview
+        results in shared memory segments. Other local workers and the scheduler map those segments
+        instead of copying the data through pipes, and downstream nodes receive read-only zero-copy
+        views (memoryviews, or buffers on Python 2, for byte results). Segments are removed when the
+        owning node state is invalidated or the scheduler is closed.
+
+        :param context: Context to evaluate nodes of.
+        :param workers: Number of local worker processes. Defaults to the number of CPUs.
+        :param share_threshold: Minimum size in bytes of results placed in shared memory. `None`
+                                disables shared memory.
+        """
+        self._context = context
+        self._workers = []
+        self._locations = {}
+        self._results = {}
+        self._segments = {}
+        self._tokens = itertools.count()
+
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+
+        for _ in range(workers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker_loop, args=(context, child_conn, share_threshold))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+
+            self._workers.append(_Worker(len(self._workers), parent_conn, process))
+
+    def connect(self, address, authkey=None):
+        """
+        Register a worker served by `serve` on the given address.
+
+        :param address: Worker address.
+        :param authkey: Shared secret for authenticating with the worker.
+        """
+        self._workers.append(_Worker(len(self._workers), Client(address, authkey=authkey)))
+
+    def evaluate(self, node):
+        """
+        Evaluate the node on the workers and cache the result. Intermediate results are left on
+        the workers and fetched lazily if they are read. Node hooks get to supply results before
+        any work is dispatched and are notified of every result stored.
+
+        :param node: Node state object.
+        :return: Evaluation result.
+        """
+        if not self._workers:
+            raise ValueError("No workers registered")
+
+        # Give the hooks (e.g. checkpoints) a chance to supply results, most downstream nodes first as
+        # those make the evaluation of everything upstream of them unnecessary.
+        for state in reversed(dirty_closure(node)):
+            if state._dirty and state._hooks:
+                value = state._lookup()
+                if value is not MISSING:
+                    state._store(value)
+
+        pending = dirty_closure(node)
+        waiting = set(id(state) for state in pending)
+        error = None
+
+        while pending or any(worker.busy is not None for worker in self._workers):
+            if error is None:
+                self._dispatch(pending, waiting)
+
+            state, failure = self._collect()
+            waiting.discard(id(state))
+
+            if failure is not None and error is None:
+                error = failure
+                del pending[:]
+
+        if error is not None:
+            raise error
+
+        return node._eval_cached()
+
+    def close(self):
+        """
+        Fetch results still referenced by the context, remove the shared memory segments and stop
+        the workers. Views of removed segments stay valid.
+        """
+        for result in list(self._results.values()):
+            result.resolve()
+
+        self._results.clear()
+        self._locations.clear()
+        self._unlink_all()
+
+        for worker in self._workers:
+            worker.conn.send(("stop",))
+
+            # Pick up failures of submitted calls
+            try:
+                while True:
+                    worker.recv()
+            except EOFError:
+                pass
+
+            worker.conn.close()
+
+            if worker.process is not None:
+                worker.process.join()
+
+        del self._workers[:]
+
+    def __del__(self):
+        self._unlink_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _dispatch(self, pending, waiting):
+        """
+        Assign ready nodes to idle workers.
+
+        :param pending: Nodes yet to be assigned, in evaluation order.
+        :param waiting: Ids of nodes that are pending or running.
+        """
+        for state in list(pending):
+            idle = [worker for worker in self._workers if worker.busy is None]
+            if not idle:
+                return
+
+            inputs = upstream_states(state)
+            if any(id(upstream) in waiting for upstream in inputs):
+                continue
+
+            worker = self._pick_worker(idle, inputs)
+            if worker is None:
+                continue
+
+            for upstream in inputs:
+                self._transfer(upstream, worker)
+
+            worker.conn.send(("run", state.path, state._args, state._kwargs.copy()))
+            worker.busy = state
+            pending.remove(state)
+
+    def _pick_worker(self, idle, inputs):
+        """
+        Pick the idle worker holding the most inputs. Workers are only eligible if every input
+        they lack can be fetched right away.
+
+        :return: Worker or `None` if no worker is eligible.
+        """
+        best = None
+        best_score = -1
+
+        for worker in idle:
+            score = 0
+            for upstream in inputs:
+                locations = self._where(upstream)
+                if locations is None:
+                    continue
+                if worker.index in locations:
+                    score += 1
+                elif self._shared(upstream.path) is None and all(self._workers[index].busy is not None
+                                                                  for index in locations):
+                    score = -1
+                    break
+
+            if score > best_score:
+                best = worker
+                best_score = score
+
+        return best
+
+    def _transfer(self, state, worker):
+        """
+        Make sure the worker holds the result of the given node.
+        """
+        locations = self._where(state)
+
+        if locations is None:
+            value = state._eval_cached()
+            self._locations[state.path] = (state._cache, set([worker.index]))
+        elif worker.index in locations:
+            return
+        else:
+            shared = self._shared(state.path)
+
+            if shared is not None and worker.process is not None:
+                value = shared
+            elif shared is not None:
+                value = state._eval_cached()
+            else:
+                source = next(self._workers[index] for index in locations if self._workers[index].busy is None)
+                value = source.request(("get", state.path))[2]
+
+            locations.add(worker.index)
+
+        worker.conn.send(("put", state.path, value))
+
+    def _collect(self):
+        """
+        Wait for a busy worker to finish.
+
+        :return: Tuple of the finished node and the exception raised by it, if any.
+        """
+        busy = dict((worker.conn.fileno(), worker) for worker in self._workers if worker.busy is not None)
+        ready, _, _ = select.select(list(busy.keys()), [], [])
+        worker = busy[ready[0]]
+
+        command, path, payload = worker.recv()
+        state = worker.busy
+        worker.busy = None
+
+        if command == "error":
+            return state, payload
+
+        if payload is not None:
+            self._segments[payload.name] = payload
+
+        result = RemoteResult(self, path, payload)
+        self._locations[path] = (result, set([worker.index]))
+        self._results[path] = result
+        state._store(result)
+
+        return state, None
+
+    def _where(self, state):
+        """
+        Find the workers holding the current result of a node. Copies of values uploaded from the
+        scheduler become stale once the node state caches a different value.
+
+        :return: Set of worker indices or `None` if no worker holds the result.
+        """
+        try:
+            value, locations = self._locations[state.path]
+        except KeyError:
+            return None
+
+        if value is not state._cache:
+            self._drop(state.path)
+            return None
+
+        return locations
+
+    def _shared(self, path):
+        """
+        :return: Shared memory segment handle of the result held by the workers, if any.
+        """
+        return getattr(self._locations[path][0], "shared", None)
+
+    def _fetch(self, path):
+        """
+        Fetch the result of a node from the first worker holding it.
+        """
+        index = min(self._locations[path][1])
+        return self._workers[index].request(("get", path))[2]
+
+    def _submit(self, path, func, args, errback):
+        """
+        Run a function on the result of a node on a worker holding it.
+
+        :return: Whether a worker holds the result.
+        """
+        try:
+            worker = self._workers[min(self._locations[path][1])]
+        except (KeyError, ValueError):
+            return False
+
+        token = next(self._tokens)
+        worker.errbacks[token] = errback
+        worker.conn.send(("call", path, func, args, token))
+
+        return True
+
+    def _drop(self, path):
+        """
+        Drop the result of a node from every worker holding it.
+        """
+        self._results.pop(path, None)
+        _, locations = self._locations.pop(path, (None, ()))
+
+        for index in locations:
+            self._workers[index].conn.send(("drop", path))
+
+    def _unlink(self, shared):
+        """
+        Remove a shared memory segment owned by the scheduler.
+        """
+        self._segments.pop(shared.name, None)
+        shared.unlink()
+
+    def _unlink_all(self):
+        """
+        Remove every shared memory segment owned by the scheduler.
+        """
+        for shared in list(getattr(self, "_segments", {}).values()):
+            self._unlink(shared)
@@ -3,22 +3,103 @@ import functools
 from collections import namedtuple
 from pypeline.context import Context
 from pypeline.common import NodeDef, EdgeDef
+from pypeline.lazyimport import FuncRef
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
 
 __all__ = ["node", "pipe", "Graph"]
 
 
-NamedFunc = namedtuple("NamedFunc", "func name")
+class NamedFunc(namedtuple("NamedFunc", "func name")):
+    def __new__(cls, func, name, options=None):
+        """
+        Node function with a custom name and node options. Behaves like a `(func, name)` tuple.
+
+        :param func: Node function.
+        :param name: Node name.
+        :param options: Node options.
+        """
+        self = super(NamedFunc, cls).__new__(cls, func, name)
+        self.options = options or {}
+        return self
 
 
-def node(func, name=None):
+def node(func, name=None, partition=None, combine=None, pool=None, batchable=False, delta=None, lazy=None,
+         outputs=None, resources=None):
     """
     Creates a custom named node.
 
-    :param func: Node function.
+    Partitioned nodes split their first positional input into chunks with `partition`, map the node
+    function over the chunks on a worker pool and merge the results with `combine`. Consecutive
+    partitioned nodes are evaluated chunk by chunk without combining the intermediate results. See
+    `pypeline.partition` for built-in splitters and combiners.
+
+    Batchable nodes are evaluated once for a whole batch of requests by `pypeline.serving.BatchServer`.
+    The node function receives a list of values (one per request) for every positional argument and
+    returns a list of results in the same order. Keyword arguments are shared by the batch.
+
+    Nodes with a delta handler are updated incrementally when rows are appended to a node upstream of
+    them, see `pypeline.incremental`.
+
+    Lazy inputs arrive as thunks, upstream nodes are only evaluated if the node function calls them.
+    Changes upstream of lazy inputs the node didn't call don't invalidate the node. Inputs are matched
+    by the targeted parameter name for parameter targeted edges, by position otherwise. Evaluators
+    working on whole upstream closures (schedulers, parallel evaluation) still evaluate every input.
+
+    Nodes with named outputs return a tuple (or a dictionary keyed by output name). Edges starting at
+    an output, e.g. `g.pipe(g.split.train, g.fit)`, only carry that output. Outputs are cached and
+    invalidated on their own, consumers of outputs that didn't change keep their results. The whole
+    result is only kept if other nodes consume it, see `pypeline.context.OutputNodeState`.
+
+    Resources are amounts of limited resources (connections, memory etc.) the node holds while it
+    runs. `pypeline.parallel.ParallelEvaluator` doesn't run nodes concurrently beyond the capacities
+    of the resources.
+
+    :param func: Node function, or a `"package.module:function"` reference imported when the node is first
+                 evaluated, see `pypeline.lazyimport.FuncRef`.
     :param name: Node name.
+    :param partition: Function splitting the input into a list of chunks.
+    :param combine: Function merging the list of chunk results. Defaults to returning the list.
+    :param pool: Pool to map chunks on (anything with a `map` method). Defaults to a shared thread pool.
+    :param batchable: Whether the node function operates on batches.
+    :param delta: Function updating the previous result of the node from appended input rows.
+    :param lazy: Names of the parameters receiving lazy inputs.
+    :param outputs: Names of the outputs.
+    :param resources: Dictionary mapping resource names to the amounts the node needs.
     :return: Named node.
     """
-    return NamedFunc(func, name)
+    options = {}
+
+    if batchable:
+        if partition is not None:
+            raise ValueError("Partitioned nodes can't be batchable")
+        options["batchable"] = True
+
+    if partition is not None:
+        options.update(partition=partition, combine=combine, pool=pool)
+    elif combine is not None or pool is not None:
+        raise ValueError("Combine and pool options are only valid for partitioned nodes")
+
+    if delta is not None:
+        options["delta"] = delta
+
+    if lazy:
+        options["lazy"] = tuple(lazy)
+
+    if outputs:
+        if len(set(outputs)) != len(outputs):
+            raise ValueError("Duplicate output names")
+        options["outputs"] = tuple(outputs)
+
+    if resources:
+        if any(amount < 0 for amount in resources.values()):
+            raise ValueError("Resource amounts can't be negative")
+        options["resources"] = dict(resources)
+
+    return NamedFunc(func, name, options)
 
 
 def pipe(*args):
@@ -37,6 +118,18 @@ def pipe(*args):
     return graph
 
 
+def _select(selector, **branches):
+    """
+    Node function of `switch` nodes.
+    """
+    try:
+        branch = branches[selector]
+    except KeyError:
+        raise KeyError("Unknown branch %s, expected one of %s" % (selector, ", ".join(sorted(branches))))
+
+    return branch()
+
+
 class BaseGraph(object):
     """
     Represents a sub-graph, a part of another graph. Sub-graphs are not intended to be
@@ -99,26 +192,85 @@ class BaseGraph(object):
 
         return self
 
+    def switch(self, name, selector=None, **branches):
+        """
+        Add a node picking one of several branches. Only the selected branch is evaluated, and changes
+        in the other branches don't invalidate the node. The branch is picked by the `selector`
+        parameter of the node, or by the output of the selector node if there is one:
+
+            g.switch("model", selector=g.choose, a=g.model_a, b=g.model_b)
+
+        :param name: Name of the switch node.
+        :param selector: Node selecting the branch.
+        :param branches: Branch nodes by key.
+        """
+        if not branches:
+            raise ValueError("Provide at least one branch")
+
+        path = self._store_node(node(_select, name, lazy=list(branches)))
+        target = self._items[path[-1]]
+
+        if selector is not None:
+            self._pipe((selector, target.selector))
+
+        for key, branch in branches.items():
+            self._pipe((branch, getattr(target, key)))
+
+        return self
+
+    def reachability(self):
+        """
+        Get the reachability index of the graph, for ancestor and descendant queries by node path.
+        The index is built on first use and kept up to date as nodes are piped together. See
+        `pypeline.reachability.ReachabilityIndex`.
+
+        :return: `ReachabilityIndex` instance.
+        """
+        root = self._root
+
+        if root._reachability is None:
+            from pypeline.reachability import ReachabilityIndex
+
+            root.__dict__["_reachability"] = ReachabilityIndex.from_graph(root)
+
+        return root._reachability
+
     def _pipe(self, nodes):
         """
-        Pipeline the supplied nodes together (in order).
+        Pipeline the supplied nodes together (in order). Edges start at the named output of a node
+        when the source refers to one, e.g. `g.split.train`.
 
         :param nodes: Nodes to pipeline. Nodes not in this graph will be added.
         """
         # Collect all vertices, handling special named parameter targets separately.
         vertices = []
+        sources = []
         for item in nodes:
             if isinstance(item, EdgeDef):
-                vertices.append(EdgeDef(self._store_node(item.node), item.param))
+                path = self._store_node(item.node)
+                vertices.append(EdgeDef(path, item.param))
+
+                if item.param in getattr(item.node, "options", {}).get("outputs", ()):
+                    sources.append(path + (item.param,))
+                    if sources[-1] not in self._downstream:
+                        self._downstream[sources[-1]] = []
+                        if self._root._reachability is not None:
+                            self._root._reachability.add_edge(path, sources[-1])
+                else:
+                    sources.append(path)
             else:
                 vertices.append(EdgeDef(self._store_node(item), None))
+                sources.append(vertices[-1].node)
 
         for i in range(1, len(vertices)):
-            source = vertices[i - 1]
+            source = sources[i - 1]
             target = vertices[i]
 
-            self._downstream[source.node].append(target)
-            self._upstream[target.node].append(EdgeDef(source.node, target.param))
+            self._downstream[source].append(target)
+            self._upstream[target.node].append(EdgeDef(source, target.param))
+
+            if self._root._reachability is not None:
+                self._root._reachability.add_edge(source, target.node)
 
     def _store(self, item, name=None):
         """
@@ -179,7 +331,8 @@ class BaseGraph(object):
 
         def _copy_edges(source_edges, target_edges):
             for source, targets in source_edges.items():
-                target_edge = target_edges[root._prefix + source]
+                # Outputs only have downstream edges
+                target_edge = target_edges.setdefault(root._prefix + source, [])
 
                 # Filter out edge definitions already present.
                 # This needs to be done in two passes because there can be deliberately duplicate edge definitions
@@ -195,14 +348,19 @@ class BaseGraph(object):
         _copy_edges(graph._downstream, self._downstream)
         _copy_edges(graph._upstream, self._upstream)
 
-    def _store_node(self, item, name=None, args=None, kwargs=None):
+        # Built again on the next query
+        self._root.__dict__["_reachability"] = None
+
+    def _store_node(self, item, name=None, args=None, kwargs=None, options=None):
         """
         Extract node data from `item` in a robust manner.
 
-        :param item: Can be a node, function, curried function, lambda or any callable.
+        :param item: Can be a node, function, curried function, lambda, any callable or a
+                     `"package.module:function"` reference, imported on first use (see `pypeline.lazyimport`).
         :param name: Name to use for the node. If `None`, an attempt will be made to deduce it from `item`.
         :param args: Default positional arguments to the node function.
         :param kwargs: Default keyword arguments to the node function.
+        :param options: Node options, see `node`.
         :return:
         """
         if isinstance(item, NodeDef):
@@ -215,13 +373,17 @@ class BaseGraph(object):
         elif isinstance(item, functools.partial):
             if args is not None or kwargs is not None:
                 raise ValueError("Extra arguments and nesting not supported for partial functions.")
-            return self._store_node(item.func, name=name, args=item.args, kwargs=item.keywords)
+            return self._store_node(item.func, name=name, args=item.args, kwargs=item.keywords, options=options)
         elif isinstance(item, NamedFunc):
-            return self._store_node(item.func, item.name)
+            return self._store_node(item.func, item.name, options=item.options)
+        elif isinstance(item, string_types):
+            return self._store_node(FuncRef(item), name=name, args=args, kwargs=kwargs, options=options)
         elif callable(item):
             # Try to extract the node key if it is not known yet
             if name is None:
-                if hasattr(item, "im_func"):
+                if isinstance(item, FuncRef):
+                    name = item.name
+                elif hasattr(item, "im_func"):
                     name = item.im_func.func_name
                 elif hasattr(item, "func_name"):
                     name = item.func_name
@@ -234,7 +396,7 @@ class BaseGraph(object):
             if args is not None:
                 args = tuple(args)
 
-            return self._store_node_def(NodeDef(self._root, item, self._prefix, name, args, kwargs))
+            return self._store_node_def(NodeDef(self._root, item, self._prefix, name, args, kwargs, options))
         else:
             raise ValueError("Unsupported node specification %s" % item)
 
@@ -261,6 +423,9 @@ class BaseGraph(object):
             self._downstream[node_path] = []
             self._upstream[node_path] = []
 
+            if self._root._reachability is not None:
+                self._root._reachability.add_node(node_path)
+
         return node_path
 
     def __getitem__(self, key):
@@ -314,6 +479,7 @@ class Graph(BaseGraph):
         :param named_items: Named nodes and sub-graphs to add to this graph.
         """
         super(Graph, self).__init__((), {}, {}, self)
+        self.__dict__["_reachability"] = None
 
         for item in items:
             self._store(item)
@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+from pypeline.context import CachedResult, _params, upstream_states
+from pypeline.partition import concat_arrays, concat_frames
+
+__all__ = ["Appended", "append", "concat"]
+
+
+class Appended(namedtuple("Appended", "result delta")):
+    """
+    Returned by delta handlers to pass the rows they appended to their result on to the delta
+    handlers downstream of them. Handlers returning a plain result make the nodes downstream of them
+    recompute in full.
+    """
+    pass
+
+
+def concat(previous, delta):
+    """
+    Append rows to a result: lists are extended in place, NumPy arrays, pandas objects, tuples and
+    strings are concatenated into a new object.
+
+    :param previous: Previous result.
+    :param delta: Appended rows.
+    :return: Combined result.
+    """
+    if isinstance(previous, list):
+        previous.extend(delta)
+        return previous
+    if isinstance(previous, (tuple, str, bytes)):
+        return previous + type(previous)(delta)
+    if hasattr(previous, "iloc"):
+        return concat_frames([previous, delta])
+    if hasattr(previous, "dtype"):
+        return concat_arrays([previous, delta])
+
+    raise TypeError("Don't know how to append to %s, supply a concat function" % type(previous).__name__)
+
+
+def append(state, delta, concat_func=None):
+    """
+    Append rows to the result of a node and propagate them downstream. The node result becomes the
+    concatenation of its previous result and the rows. Nodes downstream of it with a delta handler
+    (see `pypeline.graph.node`) fed by a single updated node get updated from the appended rows:
+
+        handler(previous, *args, **kwargs)
+
+    receives the previous result of the node and the same arguments as the node function, except that
+    the appended rows take the place of the updated input. The handler returns the new result, or an
+    `Appended` tuple of the new result and the rows it appended to it, which feeds the handlers
+    further downstream. Every other node downstream is invalidated and recomputed from the full
+    inputs when it is read next.
+
+    Appended rows live in the cached result only, evaluating the node again (e.g. after changing its
+    parameters) drops them. Merged nodes (see `Context.share_common_nodes`) are not supported.
+
+    :param state: Node state object. Dirty nodes are evaluated first.
+    :param delta: Appended rows.
+    :param concat_func: Function concatenating the previous result and the rows. Defaults to `concat`.
+    """
+    if state._sync is None:
+        _append(state, delta, concat_func or concat)
+        return
+
+    with state._sync.mutex:
+        _append(state, delta, concat_func or concat)
+
+
+def _append(state, delta, concat_func):
+    if state._alias is not None or state._aliases:
+        raise ValueError("Can't append to merged node %s" % ".".join(state.path))
+
+    _replace(state, concat_func(state._eval_cached(), delta))
+
+    deltas = {id(state): delta}
+    touched = set([id(state)])
+
+    for node in _downstream_order(state)[1:]:
+        if node._dirty:
+            continue
+
+        changed = [upstream for upstream in upstream_states(node) if id(upstream) in touched]
+        if not changed:
+            continue
+
+        handler = node.options.get("delta")
+        if handler is None or len(changed) != 1 or id(changed[0]) not in deltas or node._alias is not None \
+                or node._aliases:
+            node._invalidate()
+            continue
+
+        source = changed[0]
+        incoming = [_params((), {upstream._param_name: deltas[id(source)]})
+                    if getattr(upstream, "_state", None) is source else
+                    deltas[id(source)] if upstream is source else upstream._eval_cached()
+                    for upstream in node.upstream]
+        args, kwargs = node._bind(incoming, node._args, node._kwargs.copy())
+        result = handler(node._eval_cached(), *args, **kwargs)
+
+        touched.add(id(node))
+        if isinstance(result, Appended):
+            deltas[id(node)] = result.delta
+            result = result.result
+
+        _replace(node, result)
+
+
+def _replace(state, value):
+    """
+    Replace the cached result of a clean node, releasing any placeholder it held.
+    """
+    if isinstance(state._cache, CachedResult):
+        state._release()
+
+    state._store(value)
+
+
+def _downstream_order(state):
+    """
+    Collect the nodes downstream of a node in evaluation order, starting with the node itself.
+    """
+    order = []
+    visited = set()
+    stack = [(state, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+
+        if expanded:
+            order.append(node)
+        elif id(node) not in visited:
+            visited.add(id(node))
+            stack.append((node, True))
+            stack.extend((downstream, False) for downstream in node.downstream)
+
+    order.reverse()
+    return order
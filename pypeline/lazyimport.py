@@ -0,0 +1,192 @@
+import os
+import json
+import inspect
+import tempfile
+import warnings
+import importlib
+import threading
+
+__all__ = ["ArgSpecManifest", "FuncRef", "use_manifest"]
+
+_default_manifest = None
+
+
+def use_manifest(filename):
+    """
+    Set the manifest used by function references created without one, e.g. by `node` and `Graph`
+    for `"package.module:function"` strings.
+
+    :param filename: Manifest file. Created on first use if missing.
+    :return: `ArgSpecManifest` instance.
+    """
+    global _default_manifest
+    _default_manifest = ArgSpecManifest(filename)
+
+    return _default_manifest
+
+
+def argspec(func):
+    """
+    Get the arguments a node function takes, the way node states see them: callable class instances
+    are inspected through `__call__` and the instance (or class) argument of methods is left out.
+
+    :param func: Function, method or callable class instance.
+    :return: Tuple of the argument names, the name of the varargs container and the name of the
+             keyword arguments container.
+    """
+    if inspect.isclass(type(func)) and not inspect.ismethod(func) and not inspect.isfunction(func):
+        func = func.__call__
+
+    spec = inspect.getargspec(func)
+    args = spec.args[1:] if inspect.ismethod(func) else spec.args
+
+    return list(args), spec.varargs, spec.keywords
+
+
+class ArgSpecManifest(object):
+    def __init__(self, filename):
+        """
+        JSON file caching the argument specs of lazily imported node functions, so that contexts can
+        be built without importing the modules defining them. Specs missing from the manifest are
+        taken from the imported function and added to the file right away.
+
+        :param filename: Manifest file. Created on first use if missing.
+        """
+        self.filename = filename
+        self.specs = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(filename):
+            self.specs = self._read()
+
+    def get(self, target):
+        """
+        :param target: Function reference, e.g. `"package.module:function"`.
+        :return: Tuple of the argument names, varargs and keywords container names, or `None` if the
+                 function is not in the manifest.
+        """
+        spec = self.specs.get(target)
+        return None if spec is None else (list(spec[0]), spec[1], spec[2])
+
+    def record(self, target, spec):
+        """
+        Add or replace the spec of a function and write the manifest. Entries written by other
+        processes in the meantime are kept.
+
+        :param target: Function reference.
+        :param spec: Tuple of the argument names, varargs and keywords container names.
+        """
+        with self._lock:
+            specs = self._read() if os.path.exists(self.filename) else {}
+            specs.update(self.specs)
+            specs[target] = list(spec)
+            self.specs = specs
+
+            directory = os.path.dirname(os.path.abspath(self.filename))
+            handle, temp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+
+            try:
+                with os.fdopen(handle, "w") as target_file:
+                    json.dump(specs, target_file, indent=1, sort_keys=True)
+                os.rename(temp_name, self.filename)
+            except Exception:
+                os.unlink(temp_name)
+                raise
+
+    def _read(self):
+        with open(self.filename) as source:
+            return json.load(source)
+
+
+class FuncRef(object):
+    def __init__(self, target, manifest=None):
+        """
+        Reference to a node function by import path, e.g. `"package.module:function"` or
+        `"package.module:Class.method"`. The module is imported when the function is first called
+        or its argument spec is needed and not in the manifest. References to the same target are
+        equal.
+
+        :param target: Import path of the module and the attribute path of the function, separated
+                       by a colon.
+        :param manifest: `ArgSpecManifest` to take the argument spec from. Defaults to the one set
+                         with `use_manifest`, if any.
+        """
+        module, separator, attribute = target.partition(":")
+        if not separator or not module or not attribute:
+            raise ValueError("Expected a 'package.module:function' reference, got '%s'" % target)
+
+        self.target = target
+        self.module = module
+        self.attribute = attribute
+        self.name = attribute.split(".")[-1]
+        self._manifest = manifest
+        self._func = None
+
+    def resolve(self):
+        """
+        Import the function.
+
+        :return: Function object.
+        """
+        if self._func is None:
+            func = importlib.import_module(self.module)
+            for name in self.attribute.split("."):
+                func = getattr(func, name)
+
+            manifest = self._manifest or _default_manifest
+            if manifest is not None:
+                cached = manifest.get(self.target)
+                spec = argspec(func)
+
+                if cached is not None and cached != spec:
+                    warnings.warn("Stale argument spec of %s in %s, parameters may have been routed with the old "
+                                  "spec" % (self.target, manifest.filename))
+                if cached != spec:
+                    manifest.record(self.target, spec)
+
+            self._func = func
+
+        return self._func
+
+    def argspec(self):
+        """
+        Get the argument spec from the manifest, or from the imported function if it is not in the
+        manifest (adding it).
+
+        :return: Tuple of the argument names, varargs and keywords container names. See `argspec`.
+        """
+        manifest = self._manifest or _default_manifest
+
+        if manifest is not None:
+            spec = manifest.get(self.target)
+            if spec is not None:
+                return spec
+
+        # Resolving adds the spec to the manifest
+        return argspec(self.resolve())
+
+    @property
+    def imported(self):
+        """
+        :return: Whether the function has been imported.
+        """
+        return self._func is not None
+
+    def __call__(self, *args, **kwargs):
+        return (self._func or self.resolve())(*args, **kwargs)
+
+    def __eq__(self, other):
+        return isinstance(other, FuncRef) and other.target == self.target
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.target)
+
+    def __getstate__(self):
+        # Imported again on the other end
+        return dict(self.__dict__, _func=None)
+
+    def __repr__(self):
+        return "FuncRef(%r)" % self.target
@@ -0,0 +1,227 @@
+import numbers
+import os
+import sys
+import time
+import threading
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from pypeline.context import CachedResult, NodeHook
+
+__all__ = ["MemoryProfiler", "NodeMemory", "result_size"]
+
+
+def result_size(value, seen=None):
+    """
+    Estimate the memory retained by a node result: buffer sizes for NumPy arrays and pandas objects,
+    the recursive size of containers and the shallow size of anything else. Objects shared between
+    containers are counted once.
+
+    :param value: Node result.
+    :param seen: Ids of the objects already counted.
+    :return: Size in bytes.
+    """
+    if seen is None:
+        seen = set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    memory_usage = getattr(value, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            usage = memory_usage(deep=True)
+            return int(getattr(usage, "sum", lambda: usage)())
+        except Exception:
+            pass
+
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, numbers.Integral) and getattr(value, "base", None) is None:
+        return nbytes
+
+    size = sys.getsizeof(value, 0)
+
+    if isinstance(value, dict):
+        size += sum(result_size(key, seen) + result_size(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(result_size(item, seen) for item in value)
+
+    return size
+
+
+def _rss():
+    """
+    :return: Resident set size of the process in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class _RssSampler(object):
+    def __init__(self, interval):
+        """
+        Samples the resident set size on a background thread to find its peak.
+        """
+        self.base = self.peak = _rss()
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        :return: Peak growth in bytes over the resident set size at the start.
+        """
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss())
+        return self.peak - self.base
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            self.peak = max(self.peak, _rss())
+
+
+class NodeMemory(object):
+    def __init__(self, path):
+        """
+        Memory statistics of a node.
+
+        :param path: Node path.
+        """
+        self.path = path
+        self.calls = 0
+        self.peak = 0
+        self.retained = 0
+
+    def __repr__(self):
+        return "NodeMemory(%s, peak=%d, retained=%d)" % (".".join(self.path), self.peak, self.retained)
+
+
+class MemoryProfiler(NodeHook):
+    def __init__(self, context, nodes=None, mode=None, interval=0.001):
+        """
+        Records the memory footprint of context nodes: the peak allocation during each call of the
+        node function and the retained size of the cached result, along with the total size of
+        the cached results in the context over time.
+
+        Peak allocations are traced with `tracemalloc` where available. Otherwise the resident set
+        size is sampled every `interval` seconds while node functions run, which also counts memory
+        allocated outside of Python (e.g. by NumPy) but may miss very short allocation spikes.
+
+        :param context: Context to profile.
+        :param nodes: Node states to profile. Defaults to every node.
+        :param mode: Either "tracemalloc" or "rss". Defaults to "tracemalloc" if available.
+        :param interval: Sampling interval in seconds, for the "rss" mode.
+        """
+        if mode is None:
+            mode = "rss" if tracemalloc is None else "tracemalloc"
+        if mode == "tracemalloc" and tracemalloc is None:
+            raise ValueError("tracemalloc is not available")
+        if mode not in ("tracemalloc", "rss"):
+            raise ValueError("Unknown profiling mode %s" % mode)
+
+        self.mode = mode
+        self.stats = {}
+        self.residency = 0
+        self.peak_residency = 0
+        self.timeline = []
+        self._context = context
+        self._interval = interval
+        self._sizes = {}
+        self._started = False
+
+        if mode == "tracemalloc" and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+        context.add_hook(self, nodes)
+
+    def call(self, state, func, args, kwargs):
+        if self.mode == "tracemalloc":
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                self._record_call(state, peak)
+
+        sampler = _RssSampler(self._interval)
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._record_call(state, sampler.stop())
+
+    def cached(self, state):
+        # Results held elsewhere (e.g. by scheduler workers) don't take up memory here
+        size = 0 if isinstance(state._cache, CachedResult) else result_size(state._cache)
+        self._node(state).retained = size
+        self._resize(state, size)
+
+    def invalidated(self, state):
+        self._resize(state, 0)
+
+    def report(self, key="peak", limit=None):
+        """
+        :param key: Attribute of `NodeMemory` to sort by, largest first.
+        :param limit: Maximum number of nodes to report.
+        :return: List of `NodeMemory` objects.
+        """
+        rows = sorted(self.stats.values(), key=lambda stats: getattr(stats, key), reverse=True)
+        return rows if limit is None else rows[:limit]
+
+    def format_report(self, key="peak", limit=None):
+        """
+        :return: The report as a text table.
+        """
+        lines = ["%-40s %8s %14s %14s" % ("node", "calls", "peak", "retained")]
+        for stats in self.report(key, limit):
+            lines.append("%-40s %8d %14d %14d" % (".".join(stats.path), stats.calls, stats.peak, stats.retained))
+        lines.append("peak residency: %d" % self.peak_residency)
+
+        return "\n".join(lines)
+
+    def close(self):
+        """
+        Detach from the context.
+        """
+        self._context.remove_hook(self)
+
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def _node(self, state):
+        try:
+            return self.stats[state.path]
+        except KeyError:
+            stats = self.stats[state.path] = NodeMemory(state.path)
+            return stats
+
+    def _record_call(self, state, peak):
+        stats = self._node(state)
+        stats.calls += 1
+        stats.peak = max(stats.peak, peak)
+
+    def _resize(self, state, size):
+        """
+        Track the size of the cached result of a node in the context residency.
+        """
+        self.residency += size - self._sizes.pop(state.path, 0)
+        if size:
+            self._sizes[state.path] = size
+
+        self.peak_residency = max(self.peak_residency, self.residency)
+        self.timeline.append((time.time(), self.residency))
@@ -0,0 +1,434 @@
+import os
+import json
+import time
+import heapq
+import itertools
+import threading
+import multiprocessing
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from pypeline.context import MISSING, NodeHook, NodeState, dirty_closure, upstream_states
+
+__all__ = ["CostModel", "NodeCost", "ParallelEvaluator"]
+
+
+class NodeCost(object):
+    def __init__(self, runs=0, mean=0.0, last=0.0, peak=0.0):
+        """
+        Runtime statistics of a node.
+
+        :param runs: Number of recorded calls.
+        :param mean: Mean duration of a call in seconds.
+        :param last: Duration of the latest call in seconds.
+        :param peak: Longest call in seconds.
+        """
+        self.runs = runs
+        self.mean = mean
+        self.last = last
+        self.peak = peak
+
+    def add(self, duration):
+        """
+        Record the duration of a call.
+        """
+        self.runs += 1
+        self.mean += (duration - self.mean) / self.runs
+        self.last = duration
+        self.peak = max(self.peak, duration)
+
+    def __repr__(self):
+        return "NodeCost(runs=%d, mean=%f)" % (self.runs, self.mean)
+
+
+class CostModel(NodeHook):
+    def __init__(self, context=None, filename=None):
+        """
+        Keeps per node runtime statistics, keyed by node path, so that they survive across contexts
+        and (when persisted) across runs. The model times every call of the nodes it is attached to.
+
+        :param context: Context to attach to, if any. See `attach`.
+        :param filename: JSON file to load the statistics from, if it exists. `save` writes back to it.
+        """
+        self.costs = {}
+        self.filename = filename
+        self._lock = threading.Lock()
+
+        if filename is not None and os.path.exists(filename):
+            self.load(filename)
+
+        if context is not None:
+            self.attach(context)
+
+    def attach(self, context, nodes=None):
+        """
+        Start timing the nodes of a context.
+
+        :param context: Context.
+        :param nodes: Node states to time. Defaults to every node.
+        """
+        context.add_hook(self, nodes)
+
+    def call(self, state, func, args, kwargs):
+        start = time.time()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record(state.path, time.time() - start)
+
+    def record(self, path, duration):
+        """
+        Record the duration of a node call made outside of the hooks.
+
+        :param path: Node path.
+        :param duration: Duration in seconds.
+        """
+        with self._lock:
+            self.costs.setdefault(path, NodeCost()).add(duration)
+
+    def estimate(self, path, default=None):
+        """
+        :param path: Node path.
+        :param default: Value returned for nodes without history.
+        :return: Mean duration of the node calls in seconds.
+        """
+        cost = self.costs.get(path)
+        return default if cost is None else cost.mean
+
+    def save(self, filename=None):
+        """
+        Write the statistics to a JSON file.
+
+        :param filename: Target file. Defaults to the file the model was created with.
+        """
+        filename = filename or self.filename
+        if filename is None:
+            raise ValueError("No file to save the cost model to")
+
+        with self._lock:
+            entries = [dict(path=list(path), runs=cost.runs, mean=cost.mean, last=cost.last, peak=cost.peak)
+                       for path, cost in sorted(self.costs.items())]
+
+        with open(filename, "w") as target:
+            json.dump(entries, target, indent=1)
+
+    def load(self, filename):
+        """
+        Merge the statistics from a JSON file written by `save`. Loaded entries replace existing ones.
+
+        :param filename: Source file.
+        """
+        with open(filename) as source:
+            entries = json.load(source)
+
+        with self._lock:
+            for entry in entries:
+                path = tuple(str(name) for name in entry.pop("path"))
+                self.costs[path] = NodeCost(**entry)
+
+
+def _init_process(context):
+    global _process_context
+    _process_context = context
+
+
+def _run_in_process(path, args, kwargs):
+    """
+    Call a node function in a pool process.
+
+    :return: Tuple of the result and the duration of the call.
+    """
+    start = time.time()
+    value = _process_context._nodes[path]._call(*args, **kwargs)
+
+    return value, time.time() - start
+
+
+class ParallelEvaluator(object):
+    def __init__(self, context, costs=None, threads=None, processes=0, inline_below=0.001, process_above=0.5,
+                 resources=None):
+        """
+        Evaluates the dirty upstream closure of a node in parallel, scheduling ready nodes by their
+        upward rank: the expected duration of the longest chain of work from the node to the target,
+        as in list scheduling heuristics such as HEFT. Nodes on the critical path start first.
+
+        Expected durations come from the cost model. Nodes without history are assumed to take as
+        long as the average node with history, or one unit when there is no history at all, in which
+        case the rank is the number of nodes on the longest downstream path. Ties go to the node
+        unblocking the most other nodes.
+
+        Each node runs in one of three ways, based on its expected duration:
+
+            inline: Cheaper than `inline_below` seconds, not worth the thread hand-off.
+            process: Dearer than `process_above` seconds, worth pickling the inputs and the result
+                     to get around the GIL. Needs `processes`.
+            thread: Anything else, including nodes without history.
+
+        Nodes declaring resources (see `pypeline.graph.node`) only start while the resources they
+        need are available: the amounts held by running nodes must stay within the `resources`
+        capacities. Ready nodes held back go on waiting in rank order, while other ready nodes start
+        in the meantime. The time nodes spent waiting for each resource is left in `waits`.
+
+        :param context: Context to evaluate nodes of.
+        :param costs: Cost model attached to the context. Defaults to a new one.
+        :param threads: Maximum number of nodes running on threads at a time. Defaults to the number of
+                        CPUs.
+        :param processes: Number of worker processes. Workers are forked right away and inherit the
+                          context, so node functions don't need to be picklable.
+        :param inline_below: Expected duration in seconds under which nodes run inline.
+        :param process_above: Expected duration in seconds over which nodes run on processes.
+        :param resources: Capacity of each resource, e.g. `{"db": 4, "mem_gb": 64}`. Resources
+                          without a capacity are unlimited.
+        """
+        self._context = context
+        self.costs = costs if costs is not None else CostModel(context)
+        self._threads = threads or multiprocessing.cpu_count()
+        self._inline_below = inline_below
+        self._process_above = process_above
+        self._processes = processes
+        self._pool = None
+        self.capacities = dict(resources or {})
+        self.trace = []
+        self.waits = {}
+
+        if processes:
+            self._pool = multiprocessing.Pool(processes, _init_process, (context,))
+
+    def evaluate(self, node):
+        """
+        Evaluate the node and cache the result. The order in which the nodes started and the way they
+        ran is left in `trace` as a list of `(path, mode)` tuples.
+
+        The time each node held back by a resource spent waiting for it is left in `waits`, as a
+        dictionary mapping resource names to lists of `(path, seconds)` tuples.
+
+        :param node: Node state object.
+        :return: Evaluation result.
+        """
+        # Results supplied by hooks can make evaluating the nodes upstream of them unnecessary
+        for state in reversed(dirty_closure(node)):
+            if state._dirty and state._hooks:
+                value = state._lookup()
+                if value is not MISSING:
+                    state._store(value)
+
+        closure = dirty_closure(node)
+
+        for state in closure:
+            for resource, amount in self._needs(state).items():
+                if amount > self.capacities.get(resource, amount):
+                    raise ValueError("Node %s needs %s %s, more than the capacity of %s" %
+                                     (".".join(state.path), amount, resource, self.capacities[resource]))
+
+        ranks = self.ranks(closure)
+        members = set(id(state) for state in closure)
+        blocked = dict((id(state), sum(1 for upstream in set(upstream_states(state)) if id(upstream) in members))
+                       for state in closure)
+        ready = []
+        order = itertools.count()
+        modes = {}
+        done = queue.Queue()
+        running = {"thread": 0, "process": 0}
+        held = dict.fromkeys(self.capacities, 0)
+        ready_since = {}
+        held_back = {}
+        error = None
+        remaining = len(closure)
+
+        def _push(state):
+            rank, dependants = ranks[id(state)]
+            ready_since[id(state)] = time.time()
+            heapq.heappush(ready, (-rank, -dependants, next(order), state))
+
+        for state in closure:
+            if not blocked[id(state)]:
+                _push(state)
+
+        del self.trace[:]
+        self.waits.clear()
+
+        while remaining:
+            deferred = []
+
+            while ready and error is None:
+                entry = heapq.heappop(ready)
+                state = entry[-1]
+                mode = self._mode(state)
+
+                if mode != "inline" and running[mode] >= (self._threads if mode == "thread" else self._processes):
+                    deferred.append(entry)
+                    continue
+
+                needs = self._needs(state)
+                missing = [resource for resource, amount in needs.items()
+                           if resource in held and held[resource] + amount > self.capacities[resource]]
+                if missing:
+                    held_back.setdefault(id(state), set()).update(missing)
+                    deferred.append(entry)
+                    continue
+
+                for resource in held_back.pop(id(state), ()):
+                    self.waits.setdefault(resource, []).append((state.path, time.time() - ready_since[id(state)]))
+
+                for resource, amount in needs.items():
+                    if resource in held:
+                        held[resource] += amount
+
+                self.trace.append((state.path, mode))
+                modes[id(state)] = mode
+
+                if mode == "inline":
+                    try:
+                        done.put((state, state._compute(), None))
+                    except Exception as exc:
+                        done.put((state, None, exc))
+                else:
+                    running[mode] += 1
+                    getattr(self, "_start_" + mode)(state, done)
+
+            for entry in deferred:
+                heapq.heappush(ready, entry)
+
+            if not any(running.values()) and done.empty():
+                # Everything left is blocked by a failed node
+                break
+
+            state, value, failure = done.get()
+            remaining -= 1
+            mode = modes[id(state)]
+            if mode != "inline":
+                running[mode] -= 1
+
+            for resource, amount in self._needs(state).items():
+                if resource in held:
+                    held[resource] -= amount
+
+            if failure is not None:
+                error = error or failure
+                continue
+
+            state._store(value)
+
+            for downstream in state.downstream:
+                key = id(downstream)
+                if key in members:
+                    blocked[key] -= 1
+                    if not blocked[key]:
+                        _push(downstream)
+
+        if error is not None:
+            raise error
+
+        return node._eval_cached()
+
+    def ranks(self, closure):
+        """
+        Compute the upward rank of the nodes in a closure.
+
+        :param closure: List of node states in evaluation order.
+        :return: Dictionary mapping node state ids to tuples of the rank and the number of nodes
+                 downstream of the node within the closure.
+        """
+        known = [self.costs.estimate(state.path) for state in closure]
+        known = [cost for cost in known if cost is not None]
+        default = sum(known) / len(known) if known else 1.0
+
+        members = set(id(state) for state in closure)
+        ranks = {}
+        reachable = {}
+
+        for state in reversed(closure):
+            below = [downstream for downstream in state.downstream if id(downstream) in members]
+            rank = self.costs.estimate(state.path, default) + max([ranks[id(downstream)][0] for downstream in below]
+                                                                  or [0])
+
+            reach = set()
+            for downstream in below:
+                reach.add(id(downstream))
+                reach.update(reachable[id(downstream)])
+
+            reachable[id(state)] = reach
+            ranks[id(state)] = (rank, len(reach))
+
+        return ranks
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def wait_summary(self):
+        """
+        Summarize the time nodes spent waiting for resources during the last evaluation.
+
+        :return: Dictionary mapping resource names to tuples of the number of nodes held back, the
+                 total and the longest wait in seconds.
+        """
+        return dict((resource, (len(waits), sum(wait for _, wait in waits), max(wait for _, wait in waits)))
+                    for resource, waits in self.waits.items())
+
+    def _needs(self, state):
+        """
+        :return: Resources needed by a node, keyed by resource name.
+        """
+        return state.options.get("resources") or {}
+
+    def _mode(self, state):
+        """
+        Pick the way to run a node based on its expected duration.
+        """
+        cost = self.costs.estimate(state.path)
+
+        if cost is None:
+            return "thread"
+        if cost < self._inline_below:
+            return "inline"
+        # Hooks, partitioned nodes and lazy inputs need the state they live in
+        if cost > self._process_above and self._pool is not None and type(state) is NodeState and \
+                not state._lazy and all(hook is self.costs for hook in state._hooks):
+            return "process"
+
+        return "thread"
+
+    def _start_thread(self, state, done):
+        def _run():
+            try:
+                done.put((state, state._compute(), None))
+            except Exception as exc:
+                done.put((state, None, exc))
+
+        thread = threading.Thread(target=_run)
+        thread.daemon = True
+        thread.start()
+
+    def _start_process(self, state, done):
+        args, kwargs = state._bind(state._inputs(), state._args, state._kwargs.copy())
+
+        result = self._pool.apply_async(_run_in_process, (state.path, args, kwargs))
+
+        def _wait():
+            try:
+                value, duration = result.get()
+            except Exception as exc:
+                done.put((state, None, exc))
+            else:
+                self.costs.record(state.path, duration)
+                done.put((state, value, None))
+
+        thread = threading.Thread(target=_wait)
+        thread.daemon = True
+        thread.start()
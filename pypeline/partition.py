@@ -0,0 +1,126 @@
+import os
+import threading
+import multiprocessing
+
+from multiprocessing.pool import ThreadPool
+
+__all__ = ["split_list", "concat_lists", "split_array", "concat_arrays", "split_frame", "concat_frames",
+           "default_pool"]
+
+
+_default_pool = None
+_default_pool_pid = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool():
+    """
+    :return: Thread pool shared by partitioned nodes without a pool of their own. Forked processes
+             (e.g. scheduler workers) get a pool of their own, as pool threads don't survive a fork.
+    """
+    global _default_pool, _default_pool_pid
+
+    with _default_pool_lock:
+        if _default_pool is None or _default_pool_pid != os.getpid():
+            _default_pool = ThreadPool(multiprocessing.cpu_count())
+            _default_pool_pid = os.getpid()
+
+    return _default_pool
+
+
+def run_stages(stages, chunk):
+    """
+    Run a chunk through consecutive partitioned node functions.
+
+    :param stages: List of `(func, args, kwargs)` tuples. Each function receives the output of the
+                   previous one as the first positional argument.
+    :param chunk: Input chunk.
+    :return: List with the output of every stage.
+    """
+    results = []
+
+    for func, args, kwargs in stages:
+        chunk = func(chunk, *args, **kwargs)
+        results.append(chunk)
+
+    return results
+
+
+def _bounds(length, parts):
+    """
+    Split `length` items into at most `parts` contiguous, evenly sized ranges.
+    """
+    parts = max(1, min(parts, length))
+    size, remainder = divmod(length, parts)
+    start = 0
+
+    for index in range(parts):
+        stop = start + size + (1 if index < remainder else 0)
+        yield start, stop
+        start = stop
+
+
+def split_list(parts):
+    """
+    :param parts: Number of chunks.
+    :return: Splitter cutting sequences into contiguous slices.
+    """
+    def _split(values):
+        return [values[start:stop] for start, stop in _bounds(len(values), parts)]
+
+    return _split
+
+
+def concat_lists(chunks):
+    """
+    Concatenate list chunks.
+    """
+    combined = []
+
+    for chunk in chunks:
+        combined.extend(chunk)
+
+    return combined
+
+
+def split_array(parts, axis=0):
+    """
+    :param parts: Number of chunks.
+    :param axis: Axis to split along.
+    :return: Splitter cutting NumPy arrays into views along `axis`.
+    """
+    import numpy
+
+    def _split(array):
+        return numpy.array_split(array, max(1, min(parts, array.shape[axis])), axis=axis)
+
+    return _split
+
+
+def concat_arrays(chunks, axis=0):
+    """
+    Concatenate NumPy array chunks along `axis`.
+    """
+    import numpy
+
+    return numpy.concatenate(chunks, axis=axis)
+
+
+def split_frame(parts):
+    """
+    :param parts: Number of chunks.
+    :return: Splitter cutting pandas DataFrames (or Series) into row slices.
+    """
+    def _split(frame):
+        return [frame.iloc[start:stop] for start, stop in _bounds(len(frame), parts)]
+
+    return _split
+
+
+def concat_frames(chunks):
+    """
+    Concatenate pandas DataFrame (or Series) chunks.
+    """
+    import pandas
+
+    return pandas.concat(chunks)
@@ -0,0 +1,156 @@
+import threading
+
+from pypeline.context import CachedResult, ParamTargetNodeStateWrapper, MISSING, _params, dirty_closure
+
+__all__ = ["PrefetchJob", "PrefetchCancelled", "InFlightResult"]
+
+
+class PrefetchCancelled(Exception):
+    """
+    Raised by in-flight results whose node got invalidated before they were computed.
+    """
+    pass
+
+
+class InFlightResult(CachedResult):
+    def __init__(self, state):
+        """
+        Placeholder of a node result computed in the background. The node counts as clean while its
+        result is in flight, so invalidation reaches the placeholder: releasing it cancels the
+        computation if it hasn't started yet and discards the result otherwise.
+
+        :param state: Node state object.
+        """
+        self._state = state
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._value = None
+        self._error = None
+        self.cancelled = False
+
+    def wait(self):
+        """
+        Wait for the computation to finish.
+
+        :return: The computed result.
+        """
+        self._done.wait()
+
+        if self._error is not None:
+            raise self._error
+
+        return self._value
+
+    def resolve(self):
+        self._done.wait()
+
+        with self._lock:
+            current = self._state._cache is self and not self.cancelled
+
+        # Replace the placeholder, so that the node hooks see the result. A failed node is
+        # invalidated instead, so that reading it again retries the evaluation.
+        if self._error is not None:
+            if current:
+                self._state._invalidate()
+            raise self._error
+
+        if current:
+            self._state._store(self._value)
+
+        return self._value
+
+    def release(self):
+        with self._lock:
+            self.cancelled = True
+
+    def _finish(self, value=None, error=None):
+        with self._lock:
+            self._value = value
+            self._error = error
+        self._done.set()
+
+
+class PrefetchJob(object):
+    def __init__(self, node):
+        """
+        Background evaluation of the dirty upstream closure of a node. Construction marks the
+        closure clean with `InFlightResult` placeholders, so it must happen on the thread owning the
+        context. Results of nodes outside of the closure are read right away, or waited for if they
+        are in flight themselves.
+
+        :param node: Node state object.
+        """
+        self.node = node
+        self._order = []
+        self._sources = {}
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+        order = dirty_closure(node)
+        dirty = set(id(state) for state in order)
+
+        for state in order:
+            for upstream in state.upstream:
+                upstream = getattr(upstream, "_state", upstream)
+                if id(upstream) in dirty or id(upstream) in self._sources:
+                    continue
+
+                cache = upstream._cache
+                self._sources[id(upstream)] = cache if isinstance(cache, InFlightResult) else upstream._eval_cached()
+
+        for state in order:
+            placeholder = InFlightResult(state)
+            self._order.append((state, placeholder, state._args, state._kwargs.copy()))
+            self._sources[id(state)] = placeholder
+
+            state._cache = placeholder
+            state._dirty = False
+
+    def start(self):
+        """
+        Start the background thread.
+        """
+        self._thread.start()
+
+    def join(self, timeout=None):
+        """
+        Wait for the background thread to finish.
+
+        :param timeout: Timeout in seconds.
+        """
+        self._thread.join(timeout)
+
+    @property
+    def done(self):
+        """
+        :return: Whether every node of the job has been computed or cancelled.
+        """
+        return not self._thread.is_alive()
+
+    def _run(self):
+        for state, placeholder, args, kwargs in self._order:
+            if placeholder.cancelled:
+                placeholder._finish(error=PrefetchCancelled("Prefetch of node %s was cancelled" %
+                                                            ".".join(state.path)))
+                continue
+
+            try:
+                value = state._lookup()
+                if value is MISSING:
+                    combined_args, combined_kwargs = state._bind([self._input(upstream) for upstream in state.upstream],
+                                                                 args, kwargs)
+                    value = state._call_hooked(combined_args, combined_kwargs)
+            except Exception as exc:
+                placeholder._finish(error=exc)
+            else:
+                placeholder._finish(value)
+
+    def _input(self, upstream):
+        """
+        Get the result feeding into a node through the given upstream edge.
+        """
+        if isinstance(upstream, ParamTargetNodeStateWrapper):
+            return _params((), {upstream._param_name: self._input(upstream._state)})
+
+        source = self._sources[id(upstream)]
+        return source.wait() if isinstance(source, InFlightResult) else source
@@ -0,0 +1,102 @@
+import os
+import pstats
+import fnmatch
+import cProfile
+
+from pypeline.context import NodeHook
+
+__all__ = ["NodeProfiler", "select_nodes"]
+
+
+def select_nodes(context, patterns):
+    """
+    Select context nodes by path.
+
+    :param context: Context.
+    :param patterns: Node paths (tuples) or glob patterns matched against dotted paths, e.g. "etl.*".
+    :return: List of matching node states.
+    """
+    selected = []
+
+    for path, state in sorted(context._nodes.items()):
+        dotted = ".".join(path)
+        if any(pattern == path if isinstance(pattern, tuple) else fnmatch.fnmatchcase(dotted, pattern)
+               for pattern in patterns):
+            selected.append(state)
+
+    return selected
+
+
+class NodeProfiler(NodeHook):
+    def __init__(self, context, patterns=None):
+        """
+        Profiles the function calls of selected context nodes with `cProfile`, accumulating the
+        statistics of every call per node. Only the node function itself is profiled, not the
+        evaluation of upstream nodes or the hooks attached before this one. Nodes that aren't selected
+        are left alone and pay no overhead.
+
+        :param context: Context to profile.
+        :param patterns: Node paths (tuples) or glob patterns matched against dotted node paths, see
+                         `select_nodes`. Defaults to every node.
+        """
+        self._context = context
+        self._profiles = {}
+
+        context.add_hook(self, None if patterns is None else select_nodes(context, patterns))
+
+    def call(self, state, func, args, kwargs):
+        profile = self._profiles.get(state.path)
+        if profile is None:
+            profile = self._profiles[state.path] = cProfile.Profile()
+
+        return profile.runcall(func, *args, **kwargs)
+
+    @property
+    def paths(self):
+        """
+        :return: Sorted paths of the nodes profiled so far.
+        """
+        return sorted(self._profiles)
+
+    def stats(self, path=None):
+        """
+        :param path: Node path. Defaults to merging the statistics of every profiled node.
+        :return: `pstats.Stats` instance.
+        """
+        profiles = [self._profiles[path]] if path is not None else [self._profiles[key] for key in self.paths]
+        if not profiles:
+            raise ValueError("No node calls profiled")
+
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+
+        return stats
+
+    def dump(self, directory):
+        """
+        Write the statistics of every profiled node to `<dotted path>.pstats` files, and the merged
+        statistics to `merged.pstats`. Load them with `pstats.Stats` or any pstats viewer.
+
+        :param directory: Target directory. Created if missing.
+        :return: Dictionary mapping node paths (and "merged") to file names.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        files = {}
+        for path in self.paths:
+            files[path] = os.path.join(directory, ".".join(path) + ".pstats")
+            self.stats(path).dump_stats(files[path])
+
+        if files:
+            files["merged"] = os.path.join(directory, "merged.pstats")
+            self.stats().dump_stats(files["merged"])
+
+        return files
+
+    def close(self):
+        """
+        Detach from the context. Collected statistics stay available.
+        """
+        self._context.remove_hook(self)
@@ -0,0 +1,264 @@
+from pypeline.context import upstream_states
+
+__all__ = ["ReachabilityIndex"]
+
+# Largest graph (in nodes) getting a full transitive closure, which takes up to n^2 / 4 bytes
+BITSET_LIMIT = 10000
+
+
+class ReachabilityIndex(object):
+    def __init__(self, nodes=(), edges=(), bitset_limit=BITSET_LIMIT):
+        """
+        Answers ancestor, descendant and reachability queries over a directed acyclic graph of
+        hashable keys (e.g. node paths).
+
+        Graphs of up to `bitset_limit` nodes get a transitive closure in both directions, with the
+        ancestors and descendants of each node kept as bitsets (integers): reachability checks take
+        constant time and adding an edge only updates the nodes it connects. Larger graphs get
+        interval labels instead (as in GRAIL): every node is labelled with its post-order rank and
+        the lowest rank below it, which rules out most unreachable pairs right away and prunes the
+        search for the others. Labels are recomputed on the next query after edges are added.
+
+        :param nodes: Node keys.
+        :param edges: Tuples of source and target keys.
+        :param bitset_limit: Maximum number of nodes for bitset closures.
+        """
+        self.bitset_limit = bitset_limit
+        self._keys = []
+        self._ids = {}
+        self._upstream = []
+        self._downstream = []
+        self._ancestors = []
+        self._descendants = []
+        self._labels = None
+
+        edges = list(edges)
+        for key in nodes:
+            self._add_key(key)
+        for source, target in edges:
+            self._add_key(source)
+            self._add_key(target)
+            self._upstream[self._ids[target]].append(self._ids[source])
+            self._downstream[self._ids[source]].append(self._ids[target])
+
+        self.mode = "bitset" if len(self._keys) <= bitset_limit else "interval"
+
+        if self.mode == "bitset":
+            self._close()
+
+    @classmethod
+    def from_context(cls, context, bitset_limit=BITSET_LIMIT):
+        """
+        Index the node states of a context by path, following the upstream edges of the nodes
+        (lazy inputs included).
+
+        :param context: Context.
+        :param bitset_limit: Maximum number of nodes for bitset closures.
+        :return: `ReachabilityIndex` instance.
+        """
+        states = list(context._nodes.values())
+        edges = [(upstream.path, state.path) for state in states for upstream in upstream_states(state)]
+
+        return cls([state.path for state in states], edges, bitset_limit)
+
+    @classmethod
+    def from_graph(cls, graph, bitset_limit=BITSET_LIMIT):
+        """
+        Index the nodes of a graph blueprint by path.
+
+        :param graph: Root graph.
+        :param bitset_limit: Maximum number of nodes for bitset closures.
+        :return: `ReachabilityIndex` instance.
+        """
+        edges = [(source, target.node) for source, targets in graph._downstream.items() for target in targets]
+        # Named outputs only have downstream edges, they hang off the node declaring them
+        edges.extend((path[:-1], path) for path in graph._downstream if path not in graph._upstream)
+
+        return cls(graph._downstream, edges, bitset_limit)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def add_node(self, key):
+        """
+        Add a node without edges. Existing nodes are left alone.
+
+        :param key: Node key.
+        """
+        if key in self._ids:
+            return
+
+        self._add_key(key)
+
+        if self.mode == "bitset":
+            self._ancestors.append(0)
+            self._descendants.append(0)
+        else:
+            self._labels = None
+
+    def add_edge(self, source, target):
+        """
+        Add an edge, adding missing nodes along with it.
+
+        :param source: Source node key.
+        :param target: Target node key.
+        """
+        self.add_node(source)
+        self.add_node(target)
+        source_id = self._ids[source]
+        target_id = self._ids[target]
+
+        self._upstream[target_id].append(source_id)
+        self._downstream[source_id].append(target_id)
+
+        if self.mode != "bitset":
+            self._labels = None
+            return
+
+        # Everything up to the source now reaches everything down from the target
+        above = self._ancestors[source_id] | 1 << source_id
+        below = self._descendants[target_id] | 1 << target_id
+
+        for node_id in _bits(below):
+            self._ancestors[node_id] |= above
+        for node_id in _bits(above):
+            self._descendants[node_id] |= below
+
+    def reaches(self, source, target):
+        """
+        :return: Whether there is a path from the source to the target node. Nodes reach themselves.
+        """
+        source_id = self._ids[source]
+        target_id = self._ids[target]
+
+        if source_id == target_id:
+            return True
+
+        if self.mode == "bitset":
+            return bool(self._descendants[source_id] >> target_id & 1)
+
+        low, rank = self._label()
+        if not low[source_id] <= rank[target_id] < rank[source_id]:
+            return False
+
+        stack = [source_id]
+        visited = set(stack)
+
+        while stack:
+            for node_id in self._downstream[stack.pop()]:
+                if node_id == target_id:
+                    return True
+                if node_id not in visited and low[node_id] <= rank[target_id] < rank[node_id]:
+                    visited.add(node_id)
+                    stack.append(node_id)
+
+        return False
+
+    def ancestors(self, key):
+        """
+        :return: Set of the keys of the nodes reaching the node, excluding the node itself.
+        """
+        return self._collect(key, self._ancestors, self._upstream)
+
+    def descendants(self, key):
+        """
+        :return: Set of the keys of the nodes reachable from the node, excluding the node itself.
+        """
+        return self._collect(key, self._descendants, self._downstream)
+
+    def _add_key(self, key):
+        if key not in self._ids:
+            self._ids[key] = len(self._keys)
+            self._keys.append(key)
+            self._upstream.append([])
+            self._downstream.append([])
+
+    def _collect(self, key, closure, edges):
+        node_id = self._ids[key]
+
+        if self.mode == "bitset":
+            return set(self._keys[other] for other in _bits(closure[node_id]))
+
+        found = set()
+        stack = [node_id]
+        while stack:
+            for other in edges[stack.pop()]:
+                if other not in found:
+                    found.add(other)
+                    stack.append(other)
+
+        return set(self._keys[other] for other in found)
+
+    def _close(self):
+        """
+        Compute the transitive closure in both directions.
+        """
+        order = self._order()
+        self._ancestors = [0] * len(self._keys)
+        self._descendants = [0] * len(self._keys)
+
+        for node_id in order:
+            bits = 0
+            for upstream in self._upstream[node_id]:
+                bits |= self._ancestors[upstream] | 1 << upstream
+            self._ancestors[node_id] = bits
+
+        for node_id in reversed(order):
+            bits = 0
+            for downstream in self._downstream[node_id]:
+                bits |= self._descendants[downstream] | 1 << downstream
+            self._descendants[node_id] = bits
+
+    def _label(self):
+        """
+        :return: Lists of the lowest post-order rank below each node and the rank of the node.
+        """
+        if self._labels is not None:
+            return self._labels
+
+        # Reverse topological order is a valid post-order of the graph
+        order = self._order()
+        rank = [0] * len(self._keys)
+        low = [0] * len(self._keys)
+
+        for position, node_id in enumerate(reversed(order)):
+            rank[node_id] = position
+            low[node_id] = min([position] + [low[downstream] for downstream in self._downstream[node_id]])
+
+        self._labels = low, rank
+        return self._labels
+
+    def _order(self):
+        """
+        :return: Node ids in topological order.
+        """
+        blocked = [len(set(upstream)) for upstream in self._upstream]
+        ready = [node_id for node_id, count in enumerate(blocked) if not count]
+        order = []
+
+        while ready:
+            node_id = ready.pop()
+            order.append(node_id)
+
+            for downstream in set(self._downstream[node_id]):
+                blocked[downstream] -= 1
+                if not blocked[downstream]:
+                    ready.append(downstream)
+
+        if len(order) != len(self._keys):
+            raise ValueError("The graph has a cycle")
+
+        return order
+
+
+def _bits(bits):
+    """
+    Iterate over the positions of the set bits.
+    """
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
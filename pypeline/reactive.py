@@ -0,0 +1,178 @@
+import time
+import threading
+
+from pypeline.context import NodeHook
+
+__all__ = ["Reactor", "Subscription"]
+
+
+class Subscription(object):
+    def __init__(self, reactor, state, callback, errback):
+        """
+        Subscription of a callback to the values of a node.
+
+        :param reactor: Owning reactor.
+        :param state: Node state object.
+        :param callback: Called with every new value.
+        :param errback: Called with the exception if the node fails.
+        """
+        self.state = state
+        self.callback = callback
+        self.errback = errback
+        self._reactor = reactor
+
+    def cancel(self):
+        """
+        Stop pushing values to the callback.
+        """
+        self._reactor._cancel(self)
+
+
+class Reactor(NodeHook):
+    def __init__(self, context, debounce=0.05):
+        """
+        Pushes new values of subscribed nodes to their callbacks. Invalidating a subscribed node
+        schedules its recomputation on a background thread once no further invalidations arrived for
+        `debounce` seconds, so bursts of parameter changes result in a single recomputation and a
+        single value pushed per node. Only the subscribed nodes (and whatever they need) are
+        recomputed.
+
+        The context is made thread-safe (see `Context.make_thread_safe`), as the background thread
+        evaluates nodes while other threads change parameters.
+
+        :param context: Context to watch.
+        :param debounce: Quiet period in seconds before recomputing.
+        """
+        context.make_thread_safe()
+
+        self.debounce = debounce
+        self.closed = False
+        self.errors = []
+        self._context = context
+        self._subscriptions = {}
+        self._pending = {}
+        self._deadline = 0
+        self._busy = False
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def subscribe(self, state, callback, errback=None):
+        """
+        Subscribe to the values of a node. The current value is pushed right away, or as soon as it is
+        computed.
+
+        :param state: Node state object.
+        :param callback: Called with every new value, on the background thread.
+        :param errback: Called with the exception if the node fails. Errors are ignored otherwise.
+        :return: `Subscription` instance.
+        """
+        subscription = Subscription(self, state, callback, errback)
+
+        with self._condition:
+            if self.closed:
+                raise RuntimeError("Reactor is closed")
+
+            if id(state) not in self._subscriptions:
+                self._subscriptions[id(state)] = []
+                self._context.add_hook(self, [state])
+
+            self._subscriptions[id(state)].append(subscription)
+            self._pending.setdefault(id(state), state)
+            self._condition.notify()
+
+        return subscription
+
+    def invalidated(self, state):
+        with self._condition:
+            if id(state) in self._subscriptions:
+                self._pending[id(state)] = state
+                self._deadline = time.time() + self.debounce
+                self._condition.notify()
+
+    def wait(self, timeout=None):
+        """
+        Wait until every scheduled recomputation has been pushed to the callbacks.
+
+        :param timeout: Timeout in seconds.
+        :return: Whether the reactor is idle.
+        """
+        end = None if timeout is None else time.time() + timeout
+
+        with self._condition:
+            while (self._pending or self._busy) and not self.closed:
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+        return True
+
+    def close(self):
+        """
+        Stop the background thread and detach from the context.
+        """
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+        self._worker.join()
+        self._context.remove_hook(self)
+
+    def _cancel(self, subscription):
+        with self._condition:
+            subscriptions = self._subscriptions.get(id(subscription.state), [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+
+            if not subscriptions and id(subscription.state) in self._subscriptions:
+                del self._subscriptions[id(subscription.state)]
+                self._pending.pop(id(subscription.state), None)
+                subscription.state._hooks.remove(self)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.closed:
+                    delay = self._deadline - time.time()
+                    if self._pending and delay <= 0:
+                        break
+                    self._condition.wait(delay if self._pending else None)
+
+                if self.closed:
+                    return
+
+                batch = list(self._pending.values())
+                self._pending.clear()
+                self._busy = True
+
+            for state in batch:
+                self._push(state)
+
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+    def _push(self, state):
+        """
+        Recompute a node and push the value to its subscribers.
+        """
+        try:
+            value = state._eval_cached()
+            error = None
+        except Exception as exc:
+            error = exc
+
+        with self._condition:
+            subscriptions = list(self._subscriptions.get(id(state), []))
+
+        for subscription in subscriptions:
+            try:
+                if error is None:
+                    subscription.callback(value)
+                elif subscription.errback is not None:
+                    subscription.errback(error)
+            except Exception as exc:
+                # Misbehaving callbacks mustn't stop the reactor
+                self.errors.append((state.path, exc))
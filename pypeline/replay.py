@@ -0,0 +1,277 @@
+import sys
+import json
+import time
+import argparse
+import threading
+
+from pypeline.common import EdgeDef
+from pypeline.context import NodeHook, OutputNodeState
+from pypeline.graph import Graph, node
+from pypeline.memory import result_size
+
+__all__ = ["Recorder", "Replay", "load_trace"]
+
+TRACE_VERSION = 1
+
+
+class Recorder(NodeHook):
+    def __init__(self, context, filename=None):
+        """
+        Records the workload of a context: the node paths and wiring, and in order, the parameter
+        changes of the nodes (`set` events), the results requested through the `val` property
+        (`read` events) and the node function calls with their duration and result size (`call`
+        events). Parameter values and results themselves are not recorded.
+
+        :param context: Context to record.
+        :param filename: Trace file written by `close`.
+        """
+        self.filename = filename
+        self.events = []
+        self.nodes = [_node_entry(state) for state in sorted(context._nodes.values(), key=lambda state: state.path)]
+        self._context = context
+        self._start = time.time()
+        self._lock = threading.Lock()
+
+        context.add_hook(self)
+
+    def call(self, state, func, args, kwargs):
+        start = time.time()
+        value = func(*args, **kwargs)
+        duration = time.time() - start
+
+        self._add("call", state, duration=duration, size=result_size(value))
+
+        return value
+
+    def changed(self, state):
+        self._add("set", state)
+
+    def accessed(self, state):
+        self._add("read", state)
+
+    def trace(self):
+        """
+        :return: The trace recorded so far, as a JSON serializable dictionary.
+        """
+        with self._lock:
+            events = list(self.events)
+
+        return dict(version=TRACE_VERSION, nodes=self.nodes, events=events)
+
+    def save(self, filename=None):
+        """
+        Write the trace to a JSON file.
+
+        :param filename: Target file. Defaults to the file the recorder was created with.
+        """
+        filename = filename or self.filename
+        if filename is None:
+            raise ValueError("No file to save the trace to")
+
+        with open(filename, "w") as target:
+            json.dump(self.trace(), target)
+
+    def close(self):
+        """
+        Stop recording and write the trace file, if there is one.
+        """
+        self._context.remove_hook(self)
+
+        if self.filename is not None:
+            self.save()
+
+    def _add(self, kind, state, **fields):
+        fields.update(type=kind, path=list(state.path), time=time.time() - self._start)
+
+        with self._lock:
+            self.events.append(fields)
+
+
+def _node_entry(state):
+    """
+    Describe a node and its upstream edges for the trace.
+    """
+    entry = dict(path=list(state.path),
+                 upstream=[[list(getattr(upstream, "_state", upstream).path), getattr(upstream, "_param_name", None)]
+                           for upstream in state.upstream])
+
+    if isinstance(state, OutputNodeState):
+        entry["output"] = True
+
+    return entry
+
+
+def load_trace(filename):
+    """
+    Load a trace written by `Recorder`.
+
+    :param filename: Trace file.
+    :return: Trace dictionary.
+    """
+    with open(filename) as source:
+        trace = json.load(source)
+
+    if trace.get("version") != TRACE_VERSION:
+        raise ValueError("Unsupported trace version %s" % trace.get("version"))
+
+    return trace
+
+
+class _Stub(object):
+    def __init__(self, replay, duration, size):
+        """
+        Node function standing in for a recorded one: sleeps for the mean recorded duration and
+        returns a buffer of the mean recorded result size.
+        """
+        self._replay = replay
+        self.duration = duration
+        self.size = size
+
+    def __call__(self, *args, **kwargs):
+        self._replay.calls += 1
+
+        if self.duration > 0:
+            time.sleep(self.duration)
+
+        return bytearray(self.size)
+
+
+class Replay(object):
+    def __init__(self, trace, scale=1.0):
+        """
+        Rebuilds the graph of a recorded workload with stub node functions matching the recorded
+        costs, and replays the recorded parameter changes and reads against it. Named outputs are
+        replayed as nodes of their own, named `<node>.<output>`, fed by the node declaring them.
+
+        :param trace: Trace dictionary or trace file name.
+        :param scale: Factor applied to the recorded durations, e.g. 0 to measure the overhead of
+                      the graph machinery alone.
+        """
+        if not isinstance(trace, dict):
+            trace = load_trace(trace)
+
+        self.trace = trace
+        self.scale = scale
+        self.calls = 0
+        self._outputs = set(tuple(entry["path"]) for entry in trace["nodes"] if entry.get("output"))
+        self.graph = self._build()
+
+    def context(self):
+        """
+        :return: New context of the replayed graph.
+        """
+        return self.graph()
+
+    def run(self, context=None):
+        """
+        Replay the recorded events in order, as fast as possible.
+
+        :param context: Context to replay against. Defaults to a new one.
+        :return: Dictionary with the total "duration" in seconds, the number of "reads", the number
+                 of node function "calls" and the duration of every read ("latencies").
+        """
+        context = context or self.context()
+        latencies = []
+        calls = self.calls
+        start = time.time()
+
+        for event in self.trace["events"]:
+            state = context._nodes[self._path(event["path"])]
+
+            if event["type"] == "set":
+                state._changed()
+            elif event["type"] == "read":
+                begin = time.time()
+                state.val
+                latencies.append(time.time() - begin)
+
+        return dict(duration=time.time() - start, reads=len(latencies), calls=self.calls - calls,
+                    latencies=latencies)
+
+    def costs(self):
+        """
+        :return: Dictionary mapping the replayed node paths to tuples of the mean recorded duration
+                 in seconds and the mean result size in bytes.
+        """
+        totals = {}
+
+        for event in self.trace["events"]:
+            if event["type"] == "call":
+                total = totals.setdefault(self._path(event["path"]), [0, 0.0, 0])
+                total[0] += 1
+                total[1] += event["duration"]
+                total[2] += event["size"]
+
+        return dict((path, (duration / count, size // count)) for path, (count, duration, size) in totals.items())
+
+    def _path(self, path):
+        """
+        Map a recorded node path to the replayed one.
+        """
+        path = tuple(path)
+
+        if path in self._outputs:
+            return path[:-2] + ("%s.%s" % path[-2:],)
+
+        return path
+
+    def _build(self):
+        """
+        Build the graph of stub nodes.
+        """
+        costs = self.costs()
+        graph = Graph()
+
+        for entry in self.trace["nodes"]:
+            path = self._path(entry["path"])
+            duration, size = costs.get(path, (0.0, 0))
+            target = graph
+
+            for name in path[:-1]:
+                if name not in target._items:
+                    target[name] = Graph()
+                target = target[name]
+
+            target[path[-1]] = node(_Stub(self, duration * self.scale, size), path[-1])
+
+        for entry in self.trace["nodes"]:
+            target = _find(graph, self._path(entry["path"]))
+
+            for source, param in entry["upstream"]:
+                graph._pipe((_find(graph, self._path(source)), EdgeDef(target, param) if param else target))
+
+        return graph
+
+
+def _find(graph, path):
+    """
+    :return: Node definition at the path.
+    """
+    for name in path:
+        graph = graph[name]
+
+    return graph
+
+
+def main(argv=None):
+    """
+    Replay a trace file and print the timings.
+    """
+    parser = argparse.ArgumentParser(description="Replay a recorded pypeline workload.")
+    parser.add_argument("trace", help="Trace file written by pypeline.replay.Recorder")
+    parser.add_argument("--scale", type=float, default=1.0, help="Factor applied to the recorded durations")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of replays, each on a new context")
+    args = parser.parse_args(argv)
+
+    replay = Replay(args.trace, args.scale)
+
+    for _ in range(args.repeat):
+        stats = replay.run()
+        latencies = sorted(stats["latencies"]) or [0.0]
+        sys.stdout.write("duration %.6fs reads %d calls %d read p50 %.6fs max %.6fs\n" %
+                         (stats["duration"], stats["reads"], stats["calls"], latencies[len(latencies) // 2],
+                          latencies[-1]))
+
+
+if __name__ == "__main__":
+    main()
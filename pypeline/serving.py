@@ -0,0 +1,250 @@
+import time
+import threading
+
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+from pypeline.context import upstream_closure
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+__all__ = ["BatchServer", "BatchStats"]
+
+
+def _same_kwargs(first, second):
+    """
+    Compare keyword arguments, treating values without a plain boolean equality (e.g. NumPy
+    arrays) as equal only if they are the same object.
+    """
+    if set(first) != set(second):
+        return False
+
+    for key, value in first.items():
+        other = second[key]
+        if value is other:
+            continue
+
+        try:
+            if not bool(value == other):
+                return False
+        except Exception:
+            return False
+
+    return True
+
+
+class BatchStats(object):
+    def __init__(self, max_batch_size):
+        """
+        Batching metrics of a `BatchServer`.
+
+        :param max_batch_size: Batch capacity used for computing fill ratios.
+        """
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.calls = 0
+        self.node_calls = {}
+
+    @property
+    def fill_ratio(self):
+        """
+        :return: Average number of calls per batch relative to the maximum batch size.
+        """
+        if self.batches == 0:
+            return 0.0
+
+        return float(self.calls) / (self.batches * self.max_batch_size)
+
+    def _record_call(self, path, rows):
+        calls, total = self.node_calls.get(path, (0, 0))
+        self.node_calls[path] = (calls + 1, total + rows)
+
+
+class _Call(object):
+    def __init__(self, state, args, kwargs):
+        self.state = state
+        self.args = args
+        self.kwargs = kwargs
+        self.value = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchServer(object):
+    def __init__(self, graph, max_batch_size=64, max_wait=0.005):
+        """
+        Serves concurrent evaluation requests against a graph by collecting the calls of batchable
+        nodes into micro-batches. Every request gets its own context, evaluated on the calling
+        thread. When a request reaches a node marked `batchable`, the call is handed to the server
+        thread instead: calls arriving within `max_wait` seconds of the first one in a batch (up to
+        `max_batch_size` calls) are made once for the whole batch and the results are scattered
+        back to the request contexts.
+
+        Building the request contexts and evaluating the other nodes is left to the calling threads,
+        so only the batched calls are serialized on the server thread.
+
+        :param graph: Graph to construct request contexts from.
+        :param max_batch_size: Maximum number of calls in a batch.
+        :param max_wait: Maximum time in seconds to wait for a batch to fill up.
+        """
+        self.stats = BatchStats(max_batch_size)
+        self._graph = graph
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._serve)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def evaluate(self, node, **kwargs):
+        """
+        Evaluate a node for a single request.
+
+        :param node: Node path, either a tuple or a dotted string.
+        :param kwargs: Context parameters of the request, see `Graph.__call__`.
+        :return: Evaluation result.
+        """
+        path = tuple(node.split(".")) if isinstance(node, string_types) else tuple(node)
+        if path not in self._graph._upstream:
+            raise KeyError("Unknown node %s" % ".".join(path))
+        if self._closed:
+            raise RuntimeError("Batch server is closed")
+
+        context = self._graph(**kwargs)
+
+        for state in upstream_closure(context._nodes[path]):
+            if state._dirty and state.options.get("batchable"):
+                args, call_kwargs = state._bind(state._inputs(), state._args, state._kwargs.copy())
+                state._store(self._submit(state, args, call_kwargs))
+
+        return context._nodes[path]._eval_cached()
+
+    def close(self):
+        """
+        Finish the queued calls and stop the server. Requests made afterwards are rejected.
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            self._queue.put(None)
+
+        self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _submit(self, state, args, kwargs):
+        """
+        Queue a batchable node call and wait for the result.
+        """
+        call = _Call(state, args, kwargs)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Batch server is closed")
+            self._queue.put(call)
+
+        call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+
+        return call.value
+
+    def _serve(self):
+        stopping = False
+
+        while not stopping:
+            call = self._queue.get()
+            if call is None:
+                break
+
+            batch = [call]
+            deadline = time.time() + self._max_wait
+
+            while len(batch) < self._max_batch_size:
+                try:
+                    call = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except Empty:
+                    break
+
+                if call is None:
+                    stopping = True
+                    break
+
+                batch.append(call)
+
+            self.stats.batches += 1
+            self.stats.calls += len(batch)
+
+            groups = {}
+            for call in batch:
+                groups.setdefault(call.state.path, []).append(call)
+
+            for path, calls in groups.items():
+                try:
+                    self._process(path, calls)
+                except Exception as exc:
+                    for call in calls:
+                        if call.error is None:
+                            call.error = exc
+                finally:
+                    for call in calls:
+                        call.done.set()
+
+        # Nothing gets queued after the stop marker, but never leave a caller waiting
+        while True:
+            try:
+                call = self._queue.get_nowait()
+            except Empty:
+                return
+
+            if call is not None:
+                call.error = RuntimeError("Batch server is closed")
+                call.done.set()
+
+    def _process(self, path, calls):
+        """
+        Call a batchable node once for every group of calls sharing keyword arguments.
+
+        :param path: Node path.
+        :param calls: Calls of the node.
+        """
+        groups = []
+
+        for call in calls:
+            for group_kwargs, members in groups:
+                if len(members[0].args) == len(call.args) and _same_kwargs(group_kwargs, call.kwargs):
+                    members.append(call)
+                    break
+            else:
+                groups.append((call.kwargs, [call]))
+
+        for kwargs, members in groups:
+            try:
+                results = members[0].state._call(*[list(column) for column in zip(*[call.args for call in members])],
+                                                 **kwargs)
+                if len(results) != len(members):
+                    raise ValueError("Batchable node %s returned %d results for %d requests" %
+                                     (".".join(path), len(results), len(members)))
+            except Exception as exc:
+                for call in members:
+                    call.error = exc
+                continue
+
+            self.stats._record_call(path, len(members))
+
+            for call, value in zip(members, results):
+                call.value = value
@@ -0,0 +1,219 @@
+import os
+import fcntl
+import hashlib
+import contextlib
+
+from pypeline.checkpoint import Checkpointer, CheckpointStore
+from pypeline.context import MISSING
+
+__all__ = ["SharedCache", "SharedCacheStore"]
+
+
+class SharedCacheStore(CheckpointStore):
+    def __init__(self, directory, limit=None):
+        """
+        Checkpoint store shared by processes on the same machine. Results are kept per node path and
+        input fingerprint, so processes working with different parameters don't overwrite each
+        other's results. Each entry has a lock file, held by the process computing the result.
+
+        Once the entries exceed `limit` bytes, the least recently used ones are evicted.
+
+        :param directory: Directory to store the results in. Created if missing.
+        :param limit: Maximum size of the stored results in bytes. Unbounded by default.
+        """
+        super(SharedCacheStore, self).__init__(directory)
+
+        self.limit = limit
+
+    def load(self, path, fp):
+        value = super(SharedCacheStore, self).load(path, fp)
+
+        if value is not MISSING:
+            # The modification time orders entries for eviction
+            try:
+                os.utime(self._filename(path, fp), None)
+            except OSError:
+                pass
+
+        return value
+
+    def save(self, path, fp, value):
+        super(SharedCacheStore, self).save(path, fp, value)
+
+        if self.limit is not None:
+            self.evict(keep=self._filename(path, fp))
+
+    @contextlib.contextmanager
+    def lock(self, path, fp):
+        """
+        Hold the lock of an entry, waiting for other processes holding it.
+
+        :param path: Node path.
+        :param fp: Input fingerprint.
+        """
+        with self._locked(self._filename(path, fp)[:-len(".ckpt")] + ".lock", fcntl.LOCK_EX) as acquired:
+            yield acquired
+
+    def wait(self, path, fp):
+        """
+        Wait until no process holds the lock of an entry.
+
+        :param path: Node path.
+        :param fp: Input fingerprint.
+        :return: Whether another process held the lock, i.e. was computing the result.
+        """
+        name = self._filename(path, fp)[:-len(".ckpt")] + ".lock"
+
+        with self._locked(name, fcntl.LOCK_EX | fcntl.LOCK_NB) as acquired:
+            if acquired:
+                return False
+
+        with self._locked(name, fcntl.LOCK_EX):
+            return True
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the stored results fit into the limit.
+
+        :param keep: Entry file never to evict, e.g. the one just written.
+        :return: Number of evicted entries.
+        """
+        if self.limit is None:
+            return 0
+
+        with self._locked(os.path.join(self.directory, "evict.lock"), fcntl.LOCK_EX):
+            entries = []
+            total = 0
+
+            for name in os.listdir(self.directory):
+                if not name.endswith(".ckpt"):
+                    continue
+
+                filename = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(filename)
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, filename, stat.st_size))
+                total += stat.st_size
+
+            evicted = 0
+            for _, filename, size in sorted(entries):
+                if total <= self.limit:
+                    break
+                if filename == keep:
+                    continue
+
+                try:
+                    os.unlink(filename)
+                except OSError:
+                    continue
+
+                total -= size
+                evicted += 1
+
+        return evicted
+
+    def size(self):
+        """
+        :return: Total size of the stored results in bytes.
+        """
+        total = 0
+
+        for name in os.listdir(self.directory):
+            if name.endswith(".ckpt"):
+                try:
+                    total += os.path.getsize(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+        return total
+
+    @contextlib.contextmanager
+    def _locked(self, name, flags):
+        """
+        Hold an exclusive lock on a lock file.
+
+        :return: Whether the lock was acquired, which only fails for non-blocking locks.
+        """
+        handle = os.open(name, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            try:
+                fcntl.flock(handle, flags)
+            except (IOError, OSError):
+                if not flags & fcntl.LOCK_NB:
+                    raise
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+        finally:
+            os.close(handle)
+
+    def _filename(self, path, fp):
+        key = hashlib.sha1(repr((path, fp)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".ckpt")
+
+
+class SharedCache(Checkpointer):
+    def __init__(self, context, directory, limit=None, nodes=None):
+        """
+        Shares node results between processes on the same machine, e.g. workers of a pool building
+        contexts from the same graph and parameters. Results are stored per node path and input
+        fingerprint (see `pypeline.checkpoint.fingerprint`), a node is only computed by one process at
+        a time: processes needing the same result while it is being computed wait for it and load it
+        from the store instead of computing it again. Nodes found in the store are restored like
+        checkpoints, without evaluating the nodes upstream of them.
+
+        Results are written by the computing process before other processes get to read them, and
+        the least recently used results are evicted once the store exceeds `limit` bytes.
+
+        :param context: Context to share the results of.
+        :param directory: Store directory, on a file system supporting `flock`.
+        :param limit: Maximum size of the stored results in bytes. Unbounded by default.
+        :param nodes: Node states to share. Defaults to every node.
+        """
+        self.limit = limit
+        self._saved = set()
+
+        super(SharedCache, self).__init__(context, directory, nodes)
+
+    def _open_store(self, directory):
+        return SharedCacheStore(directory, self.limit)
+
+    def lookup(self, state):
+        value = super(SharedCache, self).lookup(state)
+
+        # Another process computing the node is about to store the result
+        if value is MISSING and self.store.wait(state.path, self._pending[id(state)]):
+            value = super(SharedCache, self).lookup(state)
+
+        return value
+
+    def call(self, state, func, args, kwargs):
+        fp = self._pending.get(id(state)) or self.fingerprint(state)
+
+        with self.store.lock(state.path, fp):
+            value = self.store.load(state.path, fp)
+
+            if value is MISSING:
+                value = func(*args, **kwargs)
+                self.store.save(state.path, fp, value)
+
+        self._saved.add(id(state))
+
+        return value
+
+    def cached(self, state):
+        if id(state) in self._saved:
+            # Written while holding the lock already
+            self._saved.discard(id(state))
+            self._pending.pop(id(state), None)
+            return
+
+        super(SharedCache, self).cached(state)
@@ -0,0 +1,124 @@
+import os
+import mmap
+import uuid
+import tempfile
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ["SharedBuffer", "share"]
+
+
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def share(value, threshold):
+    """
+    Copy a large NumPy array, bytearray or memoryview result into a shared memory segment. Strings
+    are never shared, as `bytes` is `str` on Python 2 and would come back as a read-only buffer.
+    Neither are array subclasses (e.g. masked arrays), which can't be rebuilt from the raw data.
+
+    :param value: Value to share.
+    :param threshold: Minimum size in bytes worth sharing.
+    :return: Handle of the segment, or `None` if the value is not shareable or too small.
+    """
+    if numpy is not None and type(value) is numpy.ndarray:
+        if value.dtype.hasobject or value.nbytes < max(threshold, 1):
+            return None
+
+        handle = SharedBuffer.create(value.nbytes, "ndarray", value.dtype, value.shape)
+        data = None
+    elif isinstance(value, (bytearray, memoryview)):
+        data = value.tobytes() if isinstance(value, memoryview) else bytes(value)
+        if len(data) < max(threshold, 1):
+            return None
+
+        handle = SharedBuffer.create(len(data), "bytes")
+    else:
+        return None
+
+    try:
+        if data is None:
+            target = numpy.ndarray(value.shape, value.dtype, buffer=handle._map)
+            target[...] = value
+        else:
+            handle._map[:] = data
+    except Exception:
+        handle.unlink()
+        raise
+    finally:
+        handle._map.close()
+        handle._map = None
+
+    return handle
+
+
+class SharedBuffer(object):
+    def __init__(self, name, size, kind, dtype=None, shape=None):
+        """
+        Picklable handle of a shared memory segment holding a node result. The segment is a file in
+        `/dev/shm`, so every process on the host can map it.
+
+        :param name: File name of the segment.
+        :param size: Size in bytes.
+        :param kind: Either "ndarray" or "bytes".
+        :param dtype: Array dtype, for arrays.
+        :param shape: Array shape, for arrays.
+        """
+        self.name = name
+        self.size = size
+        self.kind = kind
+        self.dtype = dtype
+        self.shape = shape
+        self._map = None
+
+    @classmethod
+    def create(cls, size, kind, dtype=None, shape=None):
+        """
+        Create a new writable segment of the given size.
+        """
+        handle = cls("pypeline-%s" % uuid.uuid4().hex, size, kind, dtype, shape)
+
+        with open(handle.filename, "w+b") as segment:
+            segment.truncate(size)
+            handle._map = mmap.mmap(segment.fileno(), size)
+
+        return handle
+
+    @property
+    def filename(self):
+        return os.path.join(_SHM_DIR, self.name)
+
+    def attach(self):
+        """
+        Map the segment read-only and return a zero-copy view of its contents. Mappings stay valid
+        after the segment is unlinked.
+
+        :return: NumPy array for arrays, memoryview (buffer on Python 2) for bytes.
+        """
+        with open(self.filename, "rb") as segment:
+            shared = mmap.mmap(segment.fileno(), self.size, access=mmap.ACCESS_READ)
+
+        if self.kind == "ndarray":
+            return numpy.frombuffer(shared, self.dtype).reshape(self.shape)
+
+        try:
+            return memoryview(shared)
+        except TypeError:
+            return buffer(shared)
+
+    def unlink(self):
+        """
+        Remove the segment. Memory is freed once every process has dropped its views.
+        """
+        try:
+            os.unlink(self.filename)
+        except OSError:
+            pass
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_map"] = None
+        return state
@@ -0,0 +1,164 @@
+import os
+import pickle
+import shutil
+import tempfile
+import itertools
+
+from collections import OrderedDict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pypeline.context import CachedResult, NodeHook
+from pypeline.memory import result_size
+
+__all__ = ["SpillManager", "SpilledResult"]
+
+
+class SpilledResult(CachedResult):
+    def __init__(self, filename, kind):
+        """
+        Node result spilled to a file. NumPy arrays are mapped read-only on first access, without
+        reading the file. Other results are read back on every access, so they only take up memory
+        while the reader holds on to them. The file is removed when the result is released.
+
+        :param filename: Spill file.
+        :param kind: Either "npy", "bytes" or "pickle".
+        """
+        self.filename = filename
+        self.kind = kind
+        self._mapped = None
+
+    def resolve(self):
+        if self.kind == "npy":
+            if self._mapped is None:
+                self._mapped = numpy.load(self.filename, mmap_mode="r")
+            return self._mapped
+
+        with open(self.filename, "rb") as stream:
+            return stream.read() if self.kind == "bytes" else pickle.load(stream)
+
+    def release(self):
+        # Mappings stay valid after the file is removed
+        self._mapped = None
+
+        try:
+            os.unlink(self.filename)
+        except OSError:
+            pass
+
+
+class SpillManager(NodeHook):
+    def __init__(self, context, limit, directory=None, threshold=1 << 20, nodes=None):
+        """
+        Bounds the memory taken up by the cached results of a context. Whenever the cached results
+        exceed `limit` bytes, the least recently computed ones are written to a scratch directory and
+        replaced with `SpilledResult` placeholders, which map them back on the next read. Spill files
+        are removed when their node is invalidated, and the scratch directory when the manager is
+        closed.
+
+        NumPy arrays (except object arrays) are spilled as `.npy` files and read back as memory-mapped
+        read-only arrays. Bytes are spilled as they are, anything else is pickled.
+
+        :param context: Context to manage.
+        :param limit: Maximum size in bytes of the cached results held in memory.
+        :param directory: Scratch directory. Defaults to a new temporary directory.
+        :param threshold: Minimum size in bytes of spilled results. Smaller results stay in memory.
+        :param nodes: Node states to manage. Defaults to every node.
+        """
+        self.limit = limit
+        self.threshold = threshold
+        self.resident = 0
+        self._owned = directory is None
+        self.directory = tempfile.mkdtemp(prefix="pypeline-spill-") if directory is None else directory
+        self._context = context
+        self._sizes = OrderedDict()
+        self._states = {}
+        self._failed = set()
+        self._counter = itertools.count()
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        context.add_hook(self, nodes)
+
+    def cached(self, state):
+        self._forget(state)
+
+        if isinstance(state._cache, CachedResult):
+            return
+
+        size = result_size(state._cache)
+        self._sizes[id(state)] = size
+        self._states[id(state)] = state
+        self.resident += size
+
+        for key, size in list(self._sizes.items()):
+            if self.resident <= self.limit:
+                break
+            if size >= self.threshold and key not in self._failed:
+                try:
+                    self.spill(self._states[key])
+                except Exception:
+                    # E.g. unpicklable results, which have to stay in memory
+                    self._failed.add(key)
+
+    def invalidated(self, state):
+        # The spill file itself goes with the released placeholder
+        self._forget(state)
+
+    def spill(self, state):
+        """
+        Spill the cached result of a node right away.
+
+        :param state: Clean node state object holding its result in memory.
+        """
+        value = state._cache
+        name = os.path.join(self.directory, "%s-%d" % (".".join(state.path), next(self._counter)))
+
+        if numpy is not None and type(value) is numpy.ndarray and not value.dtype.hasobject:
+            filename, kind = name + ".npy", "npy"
+        elif isinstance(value, bytes):
+            filename, kind = name + ".bin", "bytes"
+        else:
+            filename, kind = name + ".pkl", "pickle"
+
+        try:
+            with open(filename, "wb") as stream:
+                if kind == "npy":
+                    numpy.save(stream, value)
+                elif kind == "bytes":
+                    stream.write(value)
+                else:
+                    pickle.dump(value, stream, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            os.unlink(filename)
+            raise
+
+        # Swap the placeholder in behind the back of the hooks, the result itself is unchanged
+        state._cache = SpilledResult(filename, kind)
+        self._forget(state)
+
+    def close(self):
+        """
+        Detach from the context and remove the scratch directory if the manager created it. Spilled
+        results must not be read afterwards.
+        """
+        self._context.remove_hook(self)
+        self._sizes.clear()
+        self._states.clear()
+        self._failed.clear()
+        self.resident = 0
+
+        if self._owned:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _forget(self, state):
+        """
+        Stop accounting for the in-memory result of a node.
+        """
+        self.resident -= self._sizes.pop(id(state), 0)
+        self._states.pop(id(state), None)
+        self._failed.discard(id(state))
@@ -0,0 +1,180 @@
+from collections import Counter
+from pytest import raises
+from pypeline.checkpoint import Checkpointer, fingerprint
+from pypeline.context import params
+from pypeline.graph import Graph, node
+
+calls = Counter()
+
+
+def load(n):
+    calls["load"] += 1
+    return list(range(n))
+
+
+def total(values):
+    calls["total"] += 1
+    return sum(values)
+
+
+def scaled(value, factor=1):
+    calls["scaled"] += 1
+    return value * factor
+
+
+def _graph():
+    g = Graph(load, total, scaled)
+    g.pipe(g.load, g.total, g.scaled)
+    return g
+
+
+def test_fingerprint():
+    g = _graph()
+
+    assert fingerprint(g(n=5).scaled) == fingerprint(g(n=5).scaled)
+    assert fingerprint(g(n=5).scaled) != fingerprint(g(n=6).scaled)
+    assert fingerprint(g(n=5).load) == fingerprint(g(n=5, factor=2).load)
+    assert fingerprint(g(n=5).scaled) != fingerprint(g(n=5, scaled=params(factor=2)).scaled)
+
+
+def test_checkpoint_resume(tmpdir):
+    calls.clear()
+    directory = str(tmpdir.join("checkpoints"))
+
+    ctx = _graph()(n=5)
+    checkpointer = Checkpointer(ctx, directory)
+    assert ctx.scaled.val == 10
+    checkpointer.close()
+
+    assert calls == Counter(load=1, total=1, scaled=1)
+    assert checkpointer.errors == []
+
+    resumed = _graph()(n=5)
+    Checkpointer(resumed, directory)
+
+    # Nothing gets recomputed, upstream results are loaded on demand
+    assert resumed.scaled.val == 10
+    assert resumed.load.val == [0, 1, 2, 3, 4]
+    assert calls == Counter(load=1, total=1, scaled=1)
+
+    # Parameter changes still propagate through restored nodes
+    resumed.scaled.set(factor=3)
+    assert resumed.scaled.val == 30
+    resumed.load.set(3)
+    assert resumed.scaled.val == 9
+    assert calls == Counter(load=2, total=2, scaled=3)
+
+
+def test_checkpoint_different_params(tmpdir):
+    calls.clear()
+    directory = str(tmpdir.join("checkpoints"))
+
+    ctx = _graph()(n=5)
+    checkpointer = Checkpointer(ctx, directory)
+    assert ctx.scaled.val == 10
+    checkpointer.flush()
+
+    # Different parameters invalidate the checkpoints, but unaffected nodes are restored
+    resumed = _graph()(n=5, scaled=params(factor=2))
+    Checkpointer(resumed, directory)
+    assert resumed.scaled.val == 20
+    assert calls == Counter(load=1, total=1, scaled=2)
+
+
+class Scale(object):
+    def __init__(self, factor):
+        self.factor = factor
+
+    def apply(self, values):
+        return [value * self.factor for value in values]
+
+
+def test_fingerprint_bound_method():
+    def _fp(func):
+        g = Graph(load, node(func, "scale"))
+        g.pipe(g.load, g.scale)
+        return fingerprint(g(n=5).scale)
+
+    assert _fp(Scale(2).apply) == _fp(Scale(2).apply)
+    assert _fp(Scale(2).apply) != _fp(Scale(3).apply)
+
+
+def test_fingerprint_closure():
+    def _make(factor):
+        def adjusted(values):
+            return [value * factor for value in values]
+        return adjusted
+
+    def _fp(func):
+        g = Graph(load, func)
+        g.pipe(g.load, g.adjusted)
+        return fingerprint(g(n=5).adjusted)
+
+    assert _fp(_make(2)) == _fp(_make(2))
+    assert _fp(_make(2)) != _fp(_make(3))
+
+
+def test_checkpoint_selected_nodes(tmpdir):
+    calls.clear()
+    directory = str(tmpdir.join("checkpoints"))
+
+    ctx = _graph()(n=5)
+    checkpointer = Checkpointer(ctx, directory, nodes=[ctx.scaled])
+    assert ctx.scaled.val == 10
+    checkpointer.close()
+
+    # Upstream nodes without checkpoints are evaluated only when read
+    resumed = _graph()(n=5)
+    Checkpointer(resumed, directory, nodes=[resumed.scaled])
+    assert resumed.scaled.val == 10
+    assert calls == Counter(load=1, total=1, scaled=1)
+
+    assert resumed.total.val == 10
+    assert calls == Counter(load=2, total=2, scaled=1)
+
+    resumed.load.set(3)
+    assert resumed.scaled.val == 3
+    assert calls == Counter(load=3, total=3, scaled=2)
+
+
+def test_fingerprint_nested_code():
+    def _fp(func):
+        g = Graph(load, node(func, "total"))
+        g.pipe(g.load, g.total)
+        return fingerprint(g(n=5).total)
+
+    assert _fp(lambda values: sum(v * 2 for v in values)) == _fp(lambda values: sum(v * 2 for v in values))
+    assert _fp(lambda values: sum(v * 2 for v in values)) != _fp(lambda values: sum(v * 3 for v in values))
+
+
+def checked(values):
+    if calls["fail"]:
+        raise ValueError("failed")
+    return sum(values)
+
+
+def test_checkpoint_parameter_change_after_failure(tmpdir):
+    calls.clear()
+    directory = str(tmpdir.join("checkpoints"))
+
+    def _graph():
+        g = Graph(load, node(checked, "total"), scaled)
+        g.pipe(g.load, g.total, g.scaled)
+        return g
+
+    ctx = _graph()(n=7, factor=10)
+    checkpointer = Checkpointer(ctx, directory, nodes=[ctx.scaled])
+
+    calls["fail"] = 1
+    with raises(ValueError):
+        ctx.scaled.val
+
+    # The parameter change stops at the dirty nodes, but the checkpoint still gets the new fingerprint
+    calls["fail"] = 0
+    ctx.load.set(3)
+    assert ctx.scaled.val == 30
+    checkpointer.close()
+
+    resumed = _graph()(n=7, factor=10)
+    Checkpointer(resumed, directory, nodes=[resumed.scaled])
+    assert resumed.scaled.val == 210
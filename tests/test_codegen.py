@@ -0,0 +1,79 @@
+from pypeline.context import NodeHook, params
+from pypeline.graph import Graph, node
+
+
+def source(x):
+    return x + 1
+
+
+def double(value):
+    return value * 2
+
+
+def combine(value, doubled, offset=0):
+    return value + doubled + offset
+
+
+def spread(value):
+    return params(value, 1)
+
+
+def add(a, b):
+    return a + b
+
+
+def _graph():
+    g = Graph(source, double, combine)
+    g.pipe(g.source, g.double, g.combine.doubled)
+    g.pipe(g.source, g.combine)
+    return g
+
+
+def test_compiled_evaluation():
+    ctx = _graph()(x=1, combine=params(offset=10))
+    compiled = ctx.compile_node(ctx.combine)
+
+    assert compiled() == 2 + 4 + 10
+    assert not any(state._dirty for state in ctx._nodes.values())
+    assert "f2(v0, *n2._args, **dict(n2._kwargs, doubled=v1))" in compiled.source
+
+    # Results are shared with the generic evaluation
+    ctx.double.set()
+    assert ctx.source._dirty is False
+    assert compiled() == 16
+    assert ctx.combine.val == 16
+
+    ctx.combine.set(offset=1)
+    assert compiled() == 7
+    ctx.source.set(x=2)
+    assert compiled() == ctx.combine.val == 10
+
+
+def test_compiled_fallbacks():
+    calls = []
+
+    class Recorder(NodeHook):
+        def cached(self, state):
+            calls.append(state.path)
+
+    g = Graph(source, spread, add)
+    g.pipe(g.source, g.spread, g.add)
+    ctx = g(x=1)
+    ctx.add_hook(Recorder(), [ctx.spread])
+    compiled = ctx.compile_node(ctx.add)
+
+    # Hooked nodes are evaluated by their node state, results spreading into arguments are bound
+    assert compiled() == 3
+    assert calls == [("spread",)]
+
+
+def test_compiled_regenerated_on_rebase():
+    g = _graph()
+    ctx = g(x=1)
+    compiled = ctx.compile_node(ctx.combine)
+    assert compiled() == 6
+
+    g.double = node(lambda value: value * 3, "double")
+    ctx.rebase(g)
+    assert compiled() == 2 + 6
+    assert ctx.make_thread_safe() and compiled() == 8
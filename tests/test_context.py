@@ -1,5 +1,8 @@
+import threading
+
 from functools import partial
-from pypeline.context import params, group
+from pytest import raises
+from pypeline.context import MISSING, NodeHook, params, group
 from pypeline.graph import Graph, node, pipe
 
 
@@ -161,4 +164,335 @@ def test_graph_set_global_params_kwargs():
     g = pipe(node(x_func, "x"), node(y_func, "y"))(fudge=10, x=params(data=10))
 
     assert g.x.val == 20
-    assert g.y.val == 30
\ No newline at end of file
+    assert g.y.val == 30
+
+
+def test_eval_param_target_edge():
+    g = Graph(partial(a, 5), b)
+    g.pipe(g.a, g.b.fudge)
+
+    ctx = g(b=params(1))
+
+    assert ctx.b.val == 26
+
+
+def test_hooks():
+    class _Hook(NodeHook):
+        def __init__(self):
+            self.events = []
+
+        def lookup(self, state):
+            self.events.append(("lookup", state.name))
+            return 100 if state.name == "a" and len(self.events) > 4 else MISSING
+
+        def call(self, state, func, args, kwargs):
+            self.events.append(("call", state.name, tuple(args)))
+            return func(*args, **kwargs)
+
+        def cached(self, state):
+            self.events.append(("cached", state.name, state._cache))
+
+        def changed(self, state):
+            self.events.append(("changed", state.name))
+
+        def invalidated(self, state):
+            self.events.append(("invalidated", state.name))
+
+    g = pipe(partial(a, 5), partial(b, fudge=10))()
+    hook = _Hook()
+    g.add_hook(hook)
+
+    assert g.b.val == 35
+    assert hook.events == [("lookup", "b"), ("lookup", "a"), ("call", "a", (5,)), ("cached", "a", 25),
+                           ("call", "b", (25,)), ("cached", "b", 35)]
+
+    del hook.events[:]
+    g.a.set(6)
+    assert g.b.val == 110
+    assert hook.events == [("changed", "a"), ("invalidated", "a"), ("invalidated", "b"), ("lookup", "b"),
+                           ("lookup", "a"), ("cached", "a", 100), ("call", "b", (100,)), ("cached", "b", 110)]
+
+    g.remove_hook(hook)
+    g.a.set(5)
+    assert g.b.val == 35
+    assert len(hook.events) == 8
+
+
+def _shared_source(calls, entered, gate):
+    def source(n):
+        calls.append(n)
+        entered.set()
+        gate.wait()
+        return n
+
+    g = Graph(source, node(lambda source: source + 1, "left"), node(lambda source: source * 2, "right"))
+    g.fan(g.source, [g.left, g.right])
+    return g
+
+
+def test_thread_safe_single_flight():
+    calls = []
+    entered = threading.Event()
+    gate = threading.Event()
+    ctx = _shared_source(calls, entered, gate)(n=3).make_thread_safe()
+
+    results = {}
+    threads = [threading.Thread(target=lambda name=name: results.update({name: ctx[name].val}))
+               for name in ("left", "right")]
+    for thread in threads:
+        thread.start()
+
+    entered.wait()
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == {"left": 4, "right": 6}
+    assert calls == [3]
+
+    # Clean nodes are read without taking the node lock
+    with ctx.source._sync.lock:
+        assert ctx.left.val == 4
+
+
+def test_thread_safe_set_during_evaluation():
+    calls = []
+    entered = threading.Event()
+    gate = threading.Event()
+    ctx = _shared_source(calls, entered, gate)(n=3).make_thread_safe()
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(ctx.left.val))
+    thread.start()
+
+    # The result computed from the old parameters is discarded
+    entered.wait()
+    ctx.set(n=10)
+    gate.set()
+    thread.join()
+
+    assert results == [11]
+    assert calls == [3, 10]
+    assert ctx.source.val == 10
+
+
+def test_share_common_nodes():
+    calls = []
+
+    def load(n):
+        calls.append(n)
+        return list(range(n))
+
+    def double(values):
+        calls.append("double")
+        return [v * 2 for v in values]
+
+    def total(values):
+        return sum(values)
+
+    g = Graph()
+    g.union(team_a=pipe(load, double), team_b=pipe(load, double, total), team_c=pipe(load, total))
+    ctx = g(n=3)
+
+    assert ctx.share_common_nodes() == {("team_b", "load"): ("team_a", "load"),
+                                        ("team_b", "double"): ("team_a", "double"),
+                                        ("team_c", "load"): ("team_a", "load")}
+
+    assert ctx.team_b.total.val == 6
+    assert ctx.team_a.double.val is ctx.team_b.double.val
+    assert ctx.team_c.total.val == 3
+    assert calls == [3, "double"]
+
+    # Diverging parameters split the merged nodes, along with everything downstream of them
+    del calls[:]
+    ctx.team_b.load.set(4)
+    assert ctx.team_b.total.val == 12
+    assert ctx.team_a.double.val == [0, 2, 4]
+    assert calls == [4, "double"]
+
+    # Changes of the node merged into split it from the nodes merged with it, converging parameters
+    # merge them again
+    del calls[:]
+    ctx.team_a.load.set(4)
+    assert ctx.team_c.total.val == 3
+    assert ctx.team_a.double.val == [0, 2, 4, 6]
+    assert ctx.team_b.total.val == 12
+    assert ctx.team_b.double.val is ctx.team_a.double.val
+    assert calls == [3, 4, "double"]
+
+
+def test_rebase():
+    calls = []
+
+    def load(n):
+        calls.append("load")
+        return list(range(n))
+
+    def double(values):
+        calls.append("double")
+        return [v * 2 for v in values]
+
+    def total(values):
+        calls.append("total")
+        return sum(values)
+
+    def triple(values):
+        return [v * 3 for v in values]
+
+    def count(values):
+        return len(values)
+
+    g = pipe(load, double, total)
+    ctx = g(n=3)
+    assert ctx.total.val == 6
+
+    # Replacing a node keeps everything upstream of it
+    del calls[:]
+    g.double = triple
+    g.pipe(g.load, count)
+
+    assert ctx.rebase(g) == dict(added=[("count",)], removed=[], replaced=[("double",)], rewired=[])
+    assert ctx.count.val == 3
+    assert ctx.total.val == 9
+    assert calls == ["total"]
+
+    # Rewiring and removing nodes
+    del calls[:]
+    rewired = Graph(load, total, count)
+    rewired.pipe(rewired.load, rewired.total)
+    rewired.pipe(rewired.load, rewired.count)
+
+    assert ctx.rebase(rewired) == dict(added=[], removed=[("double",)], replaced=[], rewired=[("total",)])
+    assert ctx.total.val == 3
+    assert ctx.count.val == 3
+    assert not hasattr(ctx, "double")
+    assert calls == ["total"]
+
+    # Parameter changes still propagate, and new nodes pick up the global parameters
+    ctx.set(n=4)
+    assert ctx.total.val == 6
+
+    extended = Graph(load, total, count, double)
+    extended.pipe(extended.load, extended.total)
+    extended.pipe(extended.load, extended.count)
+    extended.pipe(extended.load, extended.double)
+    ctx.rebase(extended)
+    assert ctx.double.val == [0, 2, 4, 6]
+
+
+def test_lazy_inputs():
+    calls = []
+
+    def model_a(x):
+        calls.append("a")
+        return x + 1
+
+    def model_b(x):
+        calls.append("b")
+        return x * 10
+
+    def first(a, b):
+        return a if a is not None else b()
+
+    g = Graph(model_a, model_b, node(first, "first", lazy=["b"]))
+    g.switch("model", a=g.model_a, b=g.model_b)
+    g.pipe(g.model_a, g.first)
+    g.pipe(g.model_b, g.first.b)
+    ctx = g(x=2, model=params(selector="b"))
+
+    assert ctx.model.val == 20
+    assert calls == ["b"]
+
+    # Changes in branches that weren't used don't invalidate the node
+    ctx.model_a.set(x=3)
+    assert not ctx.model._dirty
+    ctx.model_b.set(x=3)
+    assert ctx.model._dirty
+    assert ctx.model.val == 30
+
+    ctx.model.set(selector="a")
+    assert ctx.model.val == 4
+    assert calls == ["b", "b", "a"]
+
+    ctx.model.set(selector="c")
+    with raises(KeyError):
+        ctx.model.val
+
+    # Positional inputs are matched by parameter name, inputs called once stay tracked
+    del calls[:]
+    assert ctx.first.val == 4
+    assert calls == []
+    ctx.model_b.set(x=4)
+    assert not ctx.first._dirty
+
+
+def test_node_outputs():
+    calls = []
+
+    def split(values, cut):
+        calls.append("split")
+        return values[:cut], values[cut:]
+
+    def fit(rows):
+        calls.append("fit")
+        return sum(rows)
+
+    def score(rows, model):
+        calls.append("score")
+        return [row * model for row in rows]
+
+    def rows():
+        return [1, 2, 3, 4]
+
+    g = Graph(rows, node(split, "split", outputs=["train", "test"]), fit, score)
+    g.pipe(g.rows, g.split)
+    g.pipe(g.split.train, g.fit, g.score.model)
+    g.pipe(g.split.test, g.score.rows)
+    ctx = g(cut=2)
+
+    assert ctx.score.val == [9, 12]
+    assert calls == ["split", "fit", "score"]
+    assert ctx.split.outputs["train"].val == [1, 2]
+    assert calls == ["split", "fit", "score"]
+
+    # The whole result only has consumers through the outputs and is not kept
+    del calls[:]
+    assert ctx.split.val == ([1, 2], [3, 4])
+    assert calls == ["split"]
+
+    # Consumers of unchanged outputs keep their results
+    del calls[:]
+    ctx.rows.set()
+    assert ctx.score._dirty
+    assert ctx.score.val == [9, 12]
+    assert calls == ["split"]
+
+    del calls[:]
+    ctx.split.set(cut=2)
+    assert ctx.score.val == [9, 12]
+    assert calls == ["split"]
+
+    del calls[:]
+    ctx.split.set(cut=1)
+    assert ctx.score.val == [2, 3, 4]
+    assert calls == ["split", "fit", "score"]
+
+    with raises(ValueError):
+        ctx.split.outputs["test"].set(1)
+
+
+def test_node_outputs_dict():
+    def stats(values):
+        return dict(low=min(values), high=max(values))
+
+    def spread(low, high):
+        return high - low
+
+    g = Graph(node(stats, "stats", outputs=["low", "high"]), spread)
+    g.pipe(g.stats.low, g.spread.low)
+    g.pipe(g.stats.high, g.spread.high)
+    sub = Graph(inner=g)
+
+    ctx = sub(values=[3, 1, 4])
+    assert ctx.inner.spread.val == 3
+    assert ctx.inner.stats.outputs["high"].path == ("inner", "stats", "high")
@@ -0,0 +1,65 @@
+import time
+
+from pytest import raises
+from pypeline.deadline import DeadlineExceeded, cancellation_token
+from pypeline.graph import node, pipe
+
+
+def _graph(calls, delay):
+    def load(x):
+        calls.append("load")
+        return x
+
+    def slow(value):
+        calls.append("slow")
+        time.sleep(delay)
+        return value + 1
+
+    def total(value):
+        calls.append("total")
+        return value * 2
+
+    return pipe(load, slow, total)
+
+
+def test_deadline():
+    calls = []
+    ctx = _graph(calls, 0.05)(x=1)
+
+    with raises(DeadlineExceeded) as info:
+        ctx.evaluate(ctx.total, deadline=0.01)
+
+    assert info.value.finished == [("load",), ("slow",)]
+    assert info.value.unfinished == [("total",)]
+
+    # Finished results stay cached and the retry resumes
+    assert ctx.evaluate(ctx.total, deadline=1.0) == 4
+    assert calls == ["load", "slow", "total"]
+    assert ctx.evaluate(ctx.total, deadline=0.0) == 4
+
+
+def test_deadline_cancels_running_node():
+    def spin(value):
+        token = cancellation_token()
+        while True:
+            token.check()
+            time.sleep(0.001)
+
+    ctx = pipe(node(lambda x: x, "load"), spin)(x=1)
+    start = time.time()
+
+    with raises(DeadlineExceeded) as info:
+        ctx.evaluate(ctx.spin, deadline=0.05)
+
+    assert time.time() - start < 1.0
+    assert info.value.finished == [("load",)]
+    assert info.value.unfinished == [("spin",)]
+    assert ctx.spin._dirty
+
+
+def test_no_deadline():
+    calls = []
+    ctx = _graph(calls, 0)(x=1)
+
+    assert ctx.evaluate(ctx.total) == 4
+    assert not cancellation_token().cancelled
@@ -0,0 +1,214 @@
+import os
+
+from pytest import importorskip, raises
+from pypeline.context import params
+from pypeline.distributed import Scheduler, RemoteResult
+from pypeline.graph import Graph, node
+
+
+def load(x):
+    return list(range(x))
+
+
+def double(values):
+    return [v * 2 for v in values]
+
+
+def square(values):
+    return [v * v for v in values]
+
+
+def total(doubled, squared):
+    return sum(doubled) + sum(squared)
+
+
+def pid():
+    return os.getpid()
+
+
+def fail(values):
+    raise KeyError("boom")
+
+
+def _diamond():
+    g = Graph(load, double, square, total)
+    g.fan(g.load, [g.double, g.square])
+    g.join([g.double, g.square], g.total)
+    return g
+
+
+def test_evaluate():
+    ctx = _diamond()(load=params(10))
+
+    with Scheduler(ctx, workers=2) as scheduler:
+        assert scheduler.evaluate(ctx.total) == ctx.total() == 90 + 285
+
+        # Intermediate results stay on the workers
+        assert isinstance(ctx.double._cache, RemoteResult)
+        assert ctx.double.val == [v * 2 for v in range(10)]
+
+
+def test_evaluate_in_workers():
+    ctx = Graph(pid)()
+
+    with Scheduler(ctx, workers=1) as scheduler:
+        assert scheduler.evaluate(ctx.pid) != os.getpid()
+
+
+def test_invalidate_drops_remote_results():
+    ctx = _diamond()(load=params(10))
+
+    with Scheduler(ctx, workers=2) as scheduler:
+        scheduler.evaluate(ctx.total)
+        ctx.load.set(4)
+
+        assert ctx.double._dirty
+        assert scheduler._locations == {}
+        assert scheduler.evaluate(ctx.total) == 12 + 14
+
+
+def test_param_target_edges():
+    g = Graph(load, node(lambda scale, values: [scale * v for v in values], "scaled"))
+    g.pipe(g.load, g.scaled.values)
+
+    ctx = g(load=params(3), scaled=params(scale=3))
+
+    with Scheduler(ctx, workers=1) as scheduler:
+        assert scheduler.evaluate(ctx.scaled) == [0, 3, 6]
+
+
+def test_error():
+    g = Graph(load, fail)
+    g.pipe(g.load, g.fail)
+
+    ctx = g(load=params(3))
+
+    with Scheduler(ctx, workers=2) as scheduler:
+        with raises(KeyError):
+            scheduler.evaluate(ctx.fail)
+
+        # Completed nodes remain usable
+        assert ctx.load.val == [0, 1, 2]
+
+
+def test_shared_memory():
+    numpy = importorskip("numpy")
+
+    g = Graph(node(lambda n: numpy.arange(n, dtype="f8"), "source"),
+              node(lambda values: values * 2, "doubled"),
+              node(lambda n: bytearray(b"x" * n), "blob"),
+              node(lambda n: "x" * n, "text"))
+    g.pipe(g.source, g.doubled)
+
+    ctx = g(n=1000)
+
+    with Scheduler(ctx, workers=2, share_threshold=1024) as scheduler:
+        doubled = scheduler.evaluate(ctx.doubled)
+        assert numpy.array_equal(doubled, numpy.arange(1000) * 2)
+
+        source = ctx.source._cache
+        assert source.shared is not None
+        assert os.path.exists(source.shared.filename)
+
+        # Results are read-only views of the shared segment
+        assert not ctx.source.val.flags.writeable
+
+        assert bytes(scheduler.evaluate(ctx.blob)) == b"x" * 1000
+
+        # Strings keep their type
+        assert scheduler.evaluate(ctx.text) == "x" * 1000
+        assert ctx.text._cache.shared is None
+
+        ctx.set(n=10)
+        assert not os.path.exists(source.shared.filename)
+
+        # Small results are sent through the pipe
+        scheduler.evaluate(ctx.source)
+        assert ctx.source._cache.shared is None
+
+        ctx.set(n=2000)
+        scheduler.evaluate(ctx.blob)
+        blob = ctx.blob._cache.shared
+        assert os.path.exists(blob.filename)
+
+    # Closing removes the remaining segments, leaving the mapped results readable
+    assert not os.path.exists(blob.filename)
+    assert bytes(ctx.blob.val) == b"x" * 2000
+
+
+def test_shared_memory_arrays():
+    numpy = importorskip("numpy")
+
+    def _records(n):
+        records = numpy.zeros(n, dtype=[("id", "i4"), ("value", "f8")])
+        records["id"] = numpy.arange(n)
+        return records
+
+    g = Graph(node(_records, "records"),
+              node(lambda n: numpy.ma.masked_less(numpy.arange(n), 10), "masked"))
+
+    ctx = g(n=1000)
+
+    with Scheduler(ctx, workers=1, share_threshold=1024) as scheduler:
+        records = scheduler.evaluate(ctx.records)
+        assert ctx.records._cache.shared is not None
+        assert records.dtype.names == ("id", "value")
+        assert list(records["id"][:3]) == [0, 1, 2]
+
+        # Array subclasses are sent through the pipe
+        masked = scheduler.evaluate(ctx.masked)
+        assert ctx.masked._cache.shared is None
+        assert masked.mask[:10].all() and not masked.mask[10:].any()
+
+
+def test_checkpoint_results(tmpdir):
+    from pypeline.checkpoint import Checkpointer
+
+    directory = str(tmpdir.join("checkpoints"))
+    ctx = _diamond()(load=params(10))
+    checkpointer = Checkpointer(ctx, directory)
+
+    with Scheduler(ctx, workers=2) as scheduler:
+        assert scheduler.evaluate(ctx.total) == 375
+
+        # The workers write the checkpoints of intermediate results
+        assert not ctx.load._cache._fetched
+
+    checkpointer.close()
+    assert checkpointer.errors == []
+    assert len(tmpdir.join("checkpoints").listdir()) == 4
+
+    # Resuming through the scheduler takes the checkpoints and dispatches nothing
+    resumed = _diamond()(load=params(10))
+    Checkpointer(resumed, directory)
+
+    with Scheduler(resumed, workers=1) as scheduler:
+        assert scheduler.evaluate(resumed.total) == 375
+        assert scheduler._locations == {}
+
+
+def test_checkpoint_worker_failure(tmpdir):
+    from pypeline.checkpoint import Checkpointer
+
+    directory = tmpdir.join("checkpoints")
+    ctx = _diamond()(load=params(10))
+    checkpointer = Checkpointer(ctx, str(directory))
+
+    # Break the store for the workers writing the checkpoints
+    directory.remove()
+    directory.write("")
+
+    with Scheduler(ctx, workers=1) as scheduler:
+        assert scheduler.evaluate(ctx.total) == 375
+
+    checkpointer.close()
+    assert sorted(path for path, _ in checkpointer.errors) == [("double",), ("load",), ("square",), ("total",)]
+
+
+def test_lazy_inputs():
+    g = _diamond()
+    g.switch("pick", double=g.double, squared=g.square)
+    ctx = g(load=params(4), pick=params(selector="squared"))
+
+    with Scheduler(ctx, workers=1) as scheduler:
+        assert scheduler.evaluate(ctx.pick) == [0, 1, 4, 9]
@@ -0,0 +1,90 @@
+from pytest import importorskip, raises
+from pypeline.context import params
+from pypeline.graph import Graph, node
+from pypeline.incremental import Appended, concat
+
+
+def trades(rows):
+    return list(rows)
+
+
+def prices(values, scale=1):
+    return [v * scale for v in values]
+
+
+def prices_delta(previous, values, scale=1):
+    added = [v * scale for v in values]
+    return Appended(previous + added, added)
+
+
+def total(values):
+    return sum(values)
+
+
+def total_delta(previous, values):
+    return previous + sum(values)
+
+
+def count(values):
+    return len(values)
+
+
+def report(total, count):
+    return "%d/%d" % (total, count)
+
+
+def _graph(calls):
+    def counted(name, func):
+        def _call(*args, **kwargs):
+            calls.append(name)
+            return func(*args, **kwargs)
+        return _call
+
+    g = Graph(trades, node(counted("prices", prices), "prices", delta=prices_delta),
+              node(counted("total", total), "total", delta=total_delta), node(counted("count", count), "count"),
+              node(counted("report", report), "report"))
+    g.pipe(g.trades, g.prices, g.total)
+    g.pipe(g.prices, g.count)
+    g.pipe(g.total, g.report.total)
+    g.pipe(g.count, g.report.count)
+    return g
+
+
+def test_append():
+    calls = []
+    ctx = _graph(calls)(trades=params([1, 2, 3]), prices=params(scale=10))
+
+    assert ctx.report.val == "60/3"
+    del calls[:]
+
+    ctx.trades.append([4, 5])
+    assert ctx.trades.val == [1, 2, 3, 4, 5]
+    assert ctx.prices.val == [10, 20, 30, 40, 50]
+    assert ctx.total.val == 150
+    assert calls == []
+
+    # Nodes without a delta handler recompute from the full input
+    assert ctx.count._dirty and ctx.report._dirty
+    assert ctx.report.val == "150/5"
+    assert calls == ["count", "report"]
+
+    # Dirty nodes are evaluated before appending, changing parameters drops the appended rows
+    ctx.trades.set([1])
+    ctx.trades.append([2])
+    assert ctx.total.val == 30
+    ctx.prices.set(scale=1)
+    assert ctx.total.val == 3
+
+
+def test_concat():
+    assert concat((1,), [2]) == (1, 2)
+    assert concat("ab", "c") == "abc"
+
+    with raises(TypeError):
+        concat(object(), [1])
+
+    numpy = importorskip("numpy")
+    assert concat(numpy.arange(2), numpy.arange(1)).tolist() == [0, 1, 0]
+
+    pandas = importorskip("pandas")
+    assert concat(pandas.Series([1]), pandas.Series([2])).tolist() == [1, 2]
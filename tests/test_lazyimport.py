@@ -0,0 +1,105 @@
+import sys
+import json
+
+import pytest
+
+from pypeline import lazyimport
+from pypeline.graph import Graph, node
+from pypeline.lazyimport import ArgSpecManifest, FuncRef
+
+SOURCE = """
+def load(n):
+    return list(range(n))
+
+
+def total(rows, scale=1):
+    return sum(rows) * scale
+
+
+class Model(object):
+    def fit(self, rows, *args, **kwargs):
+        return len(rows)
+"""
+
+
+@pytest.fixture
+def module(tmpdir, monkeypatch):
+    """
+    Module defining node functions, not imported yet.
+    """
+    name = "lazy_nodes_%s" % tmpdir.basename.replace("-", "_")
+    tmpdir.join(name + ".py").write(SOURCE)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.setattr(lazyimport, "_default_manifest", None)
+
+    yield name
+
+    sys.modules.pop(name, None)
+
+
+def test_func_ref(module):
+    ref = FuncRef(module + ":Model.fit")
+
+    assert ref.name == "fit"
+    assert ref == FuncRef(module + ":Model.fit")
+    assert ref != FuncRef(module + ":load")
+    assert not ref.imported
+
+    assert FuncRef(module + ":total").argspec() == (["rows", "scale"], None, None)
+    assert module in sys.modules
+
+    with pytest.raises(ValueError):
+        FuncRef(module + ".load")
+
+
+def test_lazy_node(module):
+    g = Graph(module + ":load", node(module + ":total", "sum"))
+    g.pipe(g.load, g.sum)
+    assert module not in sys.modules
+
+    # Without a manifest, the argument specs are taken from the imported functions
+    with g(n=4) as ctx:
+        assert module in sys.modules
+        assert ctx.sum.val == 6
+        ctx.sum.set(scale=2)
+        assert ctx.sum.val == 12
+
+
+def test_manifest(module, tmpdir):
+    filename = str(tmpdir.join("manifest.json"))
+    lazyimport.use_manifest(filename)
+
+    g = Graph(module + ":load", module + ":total")
+    g.pipe(g.load, g.total)
+
+    # Specs get recorded on first use
+    with g(n=4) as ctx:
+        assert ctx.total.val == 6
+
+    with open(filename) as source:
+        assert json.load(source)[module + ":total"] == [["rows", "scale"], None, None]
+
+    # Contexts are built from the manifest without importing the functions
+    del sys.modules[module]
+    lazyimport.use_manifest(filename)
+    g = Graph(module + ":load", module + ":total")
+    g.pipe(g.load, g.total)
+
+    with g(n=3, scale=2) as ctx:
+        assert module not in sys.modules
+        assert not ctx.total.func.imported
+        assert ctx.total.val == 6
+        assert module in sys.modules
+
+
+def test_stale_manifest(module, tmpdir):
+    manifest = ArgSpecManifest(str(tmpdir.join("manifest.json")))
+    manifest.record(module + ":total", (["rows"], None, None))
+    ref = FuncRef(module + ":total", manifest)
+
+    assert ref.argspec() == (["rows"], None, None)
+
+    with pytest.warns(UserWarning):
+        ref.resolve()
+
+    assert ArgSpecManifest(manifest.filename).get(module + ":total") == (["rows", "scale"], None, None)
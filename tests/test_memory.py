@@ -0,0 +1,52 @@
+import time
+
+from pytest import importorskip, raises
+from pypeline.graph import node, pipe
+from pypeline.memory import MemoryProfiler, result_size
+
+
+def _graph(size):
+    def spike(n):
+        data = bytearray(size)
+        time.sleep(0.05)
+        return list(range(n))
+
+    return pipe(spike, node(lambda values: sum(values), "total"))
+
+
+def test_memory_profile():
+    ctx = _graph(64 * 2 ** 20)(n=1000)
+    profiler = ctx.profile_memory(mode="rss")
+
+    assert ctx.total.val == sum(range(1000))
+
+    spike, total = profiler.report()
+    assert spike.path == ("spike",) and spike.calls == 1
+    assert spike.peak >= 32 * 2 ** 20
+    assert spike.retained >= result_size(list(range(1000)))
+    assert 0 < total.retained < spike.retained
+    assert profiler.report("retained", limit=1) == [spike]
+
+    # Invalidated results no longer count towards the context residency
+    assert profiler.residency == profiler.peak_residency == spike.retained + total.retained
+    ctx.spike.set(10)
+    assert profiler.residency == 0
+    assert [size for _, size in profiler.timeline] == [spike.retained, profiler.peak_residency, total.retained, 0]
+
+    assert "spike" in profiler.format_report()
+    profiler.close()
+    assert ctx.spike._hooks == []
+
+
+def test_result_size():
+    numpy = importorskip("numpy")
+
+    values = numpy.zeros(1000)
+    assert result_size(values) >= 8000
+    assert result_size([values, values]) < 2 * 8000
+    assert result_size(values[:10]) < 1000
+
+
+def test_memory_modes():
+    with raises(ValueError):
+        MemoryProfiler(_graph(0)(n=1), mode="heap")
@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+
+from functools import partial
+from pytest import raises
+from pypeline.context import params
+from pypeline.graph import Graph, node
+from pypeline.parallel import CostModel, ParallelEvaluator
+
+
+def load(n):
+    return list(range(n))
+
+
+def short(values):
+    return len(values)
+
+
+def long1(values):
+    return [v * 2 for v in values]
+
+
+def long2(values):
+    return sum(values)
+
+
+def total(counted, summed):
+    return counted + summed
+
+
+def pid(values):
+    return os.getpid()
+
+
+def broken(values):
+    raise KeyError("boom")
+
+
+def _graph():
+    g = Graph(load, short, long1, long2, total)
+    g.fan(g.load, [g.short, g.long1])
+    g.pipe(g.long1, g.long2)
+    g.join([g.short, g.long2], g.total)
+    return g
+
+
+def test_critical_path_first():
+    ctx = _graph()(load=params(10))
+    costs = ctx.record_costs()
+
+    for path, duration in [("load", 0.01), ("short", 0.2), ("long1", 0.1), ("long2", 0.3), ("total", 0.01)]:
+        costs.record((path,), duration)
+
+    evaluator = ParallelEvaluator(ctx, costs, threads=1)
+    assert evaluator.evaluate(ctx.total) == 10 + 90
+
+    # The long branch takes longer overall, even though its first node is quicker
+    assert [path for path, _ in evaluator.trace] == [("load",), ("long1",), ("long2",), ("short",), ("total",)]
+    assert set(mode for _, mode in evaluator.trace) == set(["thread"])
+    assert costs.costs[("load",)].runs == 2
+
+
+def test_structural_fallback():
+    ctx = _graph()(load=params(10))
+    evaluator = ParallelEvaluator(ctx, threads=1)
+
+    # Without history, the longer chain of nodes goes first
+    assert evaluator.evaluate(ctx.total) == 100
+    assert [path for path, _ in evaluator.trace][1:3] == [("long1",), ("short",)]
+
+    # Nodes known to be cheap run inline
+    ctx.load.set(5)
+    assert evaluator.evaluate(ctx.total) == 5 + 20
+    assert set(mode for _, mode in evaluator.trace) == set(["inline"])
+
+
+def test_process_mode():
+    g = Graph(load, pid)
+    g.pipe(g.load, g.pid)
+    ctx = g(load=params(3))
+    costs = ctx.record_costs()
+    costs.record(("pid",), 1.0)
+
+    with ParallelEvaluator(ctx, costs, processes=1) as evaluator:
+        assert evaluator.evaluate(ctx.pid) != os.getpid()
+        assert dict(evaluator.trace)[("pid",)] == "process"
+        assert costs.costs[("pid",)].runs == 2
+
+
+def test_failure():
+    g = Graph(load, broken, short)
+    g.fan(g.load, [g.broken, g.short])
+    ctx = g(load=params(3))
+
+    with raises(KeyError):
+        ParallelEvaluator(ctx).evaluate(ctx.broken)
+
+    assert ctx.broken._dirty and not ctx.load._dirty
+
+
+def test_persist_costs(tmpdir):
+    filename = str(tmpdir.join("costs.json"))
+
+    ctx = _graph()(load=params(10))
+    costs = ctx.record_costs(filename)
+    ctx.total.val
+    costs.save()
+
+    loaded = CostModel(filename=filename)
+    assert sorted(loaded.costs) == sorted(costs.costs)
+    assert loaded.estimate(("long1",)) == costs.estimate(("long1",))
+    assert loaded.estimate(("missing",), 1.0) == 1.0
+
+    with raises(ValueError):
+        CostModel().save()
+
+
+def test_resource_capacities():
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def query(values, table):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return table * len(values)
+
+    def merge(a, b, c, d):
+        return a + b + c + d
+
+    g = Graph(load, merge)
+    for name, table in zip("abcd", range(1, 5)):
+        g.pipe(g.load, node(partial(query, table=table), name, resources={"db": 1}), getattr(g.merge, name))
+    ctx = g(load=params(2))
+
+    evaluator = ctx.parallel_evaluator(resources={"db": 2}, threads=4)
+    assert evaluator.evaluate(ctx.merge) == 20
+    assert active[1] == 2
+    count, total, longest = evaluator.wait_summary()["db"]
+    assert count == 2 and 0 < longest <= total
+
+    ctx.load.set(3)
+    with raises(ValueError):
+        ctx.parallel_evaluator(resources={"db": 0}).evaluate(ctx.merge)
@@ -0,0 +1,126 @@
+import threading
+
+from pytest import importorskip, raises
+from pypeline.graph import Graph, node, pipe
+from pypeline.partition import concat_arrays, concat_frames, concat_lists, split_array, split_frame, split_list
+
+
+def test_split_list():
+    assert split_list(3)(list(range(7))) == [[0, 1, 2], [3, 4], [5, 6]]
+    assert split_list(3)([1]) == [[1]]
+    assert concat_lists([[0, 1], [2]]) == [0, 1, 2]
+
+
+def test_partitioned_node():
+    threads = set()
+
+    def square(values, offset=0):
+        threads.add(threading.current_thread().name)
+        return [v * v + offset for v in values]
+
+    g = pipe(node(lambda n: list(range(n)), "source"),
+             node(square, "square", partition=split_list(4), combine=concat_lists))
+
+    ctx = g(n=10, offset=1)
+
+    assert ctx.square.val == [v * v + 1 for v in range(10)]
+    assert ctx.square(offset=0) == [v * v for v in range(10)]
+    assert threading.current_thread().name not in threads
+
+    ctx.source.set(3)
+    assert ctx.square.val == [1, 2, 5]
+
+
+def test_partitioned_pipeline():
+    combined = []
+
+    def _combine(chunks):
+        combined.append(len(chunks))
+        return concat_lists(chunks)
+
+    g = pipe(node(lambda n: list(range(n)), "source"),
+             node(lambda values: [v + 1 for v in values], "inc", partition=split_list(2), combine=_combine),
+             node(lambda values: [v * 2 for v in values], "double", partition=split_list(2), combine=_combine),
+             node(lambda values: sum(values), "total"))
+
+    ctx = g(n=6)
+
+    assert ctx.total.val == 42
+    # Only the last partitioned node got combined, the intermediate one keeps its chunks
+    assert combined == [2]
+    assert ctx.inc._parts == [[1, 2, 3], [4, 5, 6]]
+    assert ctx.double._parts is None
+
+    # Invalidation propagates through nodes holding chunks only
+    ctx.source.set(2)
+    assert ctx.inc._parts is None
+    assert ctx.double._dirty and ctx.total._dirty
+    assert ctx.total.val == 6
+
+    assert ctx.inc.val == [1, 2]
+    assert ctx.inc._parts is None
+    assert combined == [2, 2, 2]
+
+
+def test_partitioned_shared_source():
+    g = Graph(node(lambda n: list(range(n)), "source"),
+              node(lambda values: [v + 1 for v in values], "inc", partition=split_list(2), combine=concat_lists),
+              node(lambda values: [v * 2 for v in values], "double", partition=split_list(2), combine=concat_lists),
+              node(lambda values: len(values), "count"))
+    g.pipe(g.source, g.inc, g.double)
+    g.pipe(g.inc, g.count)
+
+    ctx = g(n=4)
+
+    # Sources with several consumers aren't fused
+    assert ctx.double.val == [2, 4, 6, 8]
+    assert ctx.inc._parts is None
+    assert not ctx.inc._dirty
+
+
+def test_partitioned_node_in_fork():
+    from pypeline.distributed import Scheduler
+
+    g = pipe(node(lambda n: list(range(n)), "source"),
+             node(lambda values: [v + 1 for v in values], "inc", partition=split_list(2), combine=concat_lists))
+
+    # The default pool is created before the workers are forked
+    ctx = g(n=4)
+    assert ctx.inc.val == [1, 2, 3, 4]
+    ctx.source.set(3)
+
+    with Scheduler(ctx, workers=1) as scheduler:
+        assert scheduler.evaluate(ctx.inc) == [1, 2, 3]
+
+
+def test_partitioned_node_without_input():
+    ctx = Graph(node(lambda: [1, 2], "source", partition=split_list(2)))()
+
+    with raises(ValueError):
+        ctx.source.val
+
+
+def test_partition_options():
+    with raises(ValueError):
+        node(sum, combine=concat_lists)
+
+
+def test_split_array():
+    numpy = importorskip("numpy")
+
+    g = pipe(node(lambda n: numpy.arange(n), "source"),
+             node(lambda values: values * 2, "double", partition=split_array(3), combine=concat_arrays))
+
+    assert numpy.array_equal(g(n=10).double.val, numpy.arange(10) * 2)
+
+
+def test_split_frame():
+    pandas = importorskip("pandas")
+
+    g = pipe(node(lambda n: pandas.DataFrame({"x": range(n)}), "source"),
+             node(lambda frame: frame.assign(y=frame.x * 2), "double", partition=split_frame(3),
+                  combine=concat_frames))
+
+    frame = g(n=10).double.val
+    assert list(frame.y) == [v * 2 for v in range(10)]
+    assert list(frame.index) == list(range(10))
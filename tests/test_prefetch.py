@@ -0,0 +1,108 @@
+import threading
+
+from pytest import raises
+from pypeline.graph import node, pipe
+from pypeline.prefetch import InFlightResult
+
+
+def _gated(calls, gate, entered=None):
+    def source(x):
+        if entered is not None:
+            entered.set()
+        gate.wait()
+        calls.append(("source", x))
+        return x
+
+    def double(value):
+        calls.append(("double", value))
+        return value * 2
+
+    return pipe(node(source, "source"), node(double, "double"))
+
+
+def test_prefetch():
+    threads = []
+
+    def add(value, y):
+        threads.append(threading.current_thread().name)
+        return value + y
+
+    ctx = pipe(node(lambda x: x, "source"), add)(x=1, y=2)
+
+    jobs = ctx.prefetch(ctx.add)
+    jobs[0].join()
+
+    assert threads and threads[0] != threading.current_thread().name
+    assert isinstance(ctx.add._cache, InFlightResult)
+    assert ctx.add.val == 3
+    assert ctx.add._cache == 3
+
+    # Clean nodes have nothing to prefetch
+    assert ctx.prefetch(ctx.add) == []
+
+
+def test_prefetch_blocks_on_reads():
+    calls = []
+    gate = threading.Event()
+    ctx = _gated(calls, gate)(x=2)
+
+    ctx.prefetch(ctx.double)
+    assert not ctx.double._dirty and calls == []
+
+    threading.Timer(0.05, gate.set).start()
+    assert ctx.double.val == 4
+    assert calls == [("source", 2), ("double", 2)]
+
+
+def test_prefetch_cancel():
+    calls = []
+    gate = threading.Event()
+    entered = threading.Event()
+    ctx = _gated(calls, gate, entered)(x=2)
+
+    job = ctx.prefetch(ctx.double)[0]
+    entered.wait()
+    ctx.source.set(3)
+    assert ctx.double._dirty
+
+    # The stale results are discarded, the pending node is never computed
+    gate.set()
+    job.join()
+    assert calls == [("source", 2)]
+
+    assert ctx.double.val == 6
+    assert calls == [("source", 2), ("source", 3), ("double", 3)]
+
+
+def test_prefetch_error():
+    def fail(value):
+        raise ValueError(value)
+
+    ctx = pipe(node(lambda x: x, "source"), fail)(x=1)
+
+    ctx.prefetch(ctx.fail)[0].join()
+
+    with raises(ValueError):
+        ctx.fail.val
+
+    # Failed nodes are dirty again
+    assert ctx.fail._dirty
+    assert ctx.prefetch(ctx.fail)
+
+
+def test_prefetch_overlap():
+    calls = []
+    gate = threading.Event()
+
+    g = _gated(calls, gate)
+    g.pipe(g.source, node(lambda value: value + 1, "inc"))
+
+    ctx = g(x=1)
+    jobs = ctx.prefetch(ctx.double, ctx.inc)
+    gate.set()
+
+    for job in jobs:
+        job.join()
+
+    assert (ctx.double.val, ctx.inc.val) == (2, 2)
+    assert calls.count(("source", 1)) == 1
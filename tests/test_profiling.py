@@ -0,0 +1,58 @@
+import os
+import pstats
+
+from pytest import raises
+from pypeline.graph import Graph
+
+
+def helper(values):
+    return sorted(values)
+
+
+def load(n):
+    return list(range(n))
+
+
+def process(values):
+    return helper(values)
+
+
+def _graph():
+    g = Graph(load, process, etl=Graph(load, process))
+    g.pipe(g.load, g.process)
+    g.pipe(g.etl.load, g.etl.process)
+    return g
+
+
+def _functions(stats):
+    return set(name for _, _, name in stats.stats)
+
+
+def test_profile_nodes(tmpdir):
+    ctx = _graph()(n=10)
+    profiler = ctx.profile_nodes(["etl.*", ("process",)])
+
+    assert ctx.load._hooks == []
+    with raises(ValueError):
+        profiler.stats()
+
+    ctx.process.val
+    ctx.etl.process.val
+    ctx.process.set()
+    ctx.process.val
+
+    assert profiler.paths == [("etl", "load"), ("etl", "process"), ("process",)]
+    assert "helper" in _functions(profiler.stats(("process",)))
+    assert "load" not in _functions(profiler.stats(("process",)))
+
+    # Statistics accumulate over repeated evaluations
+    calls = dict((name, stat[1]) for (_, _, name), stat in profiler.stats(("process",)).stats.items())
+    assert calls["helper"] == 2
+
+    files = profiler.dump(str(tmpdir.join("profiles")))
+    assert sorted(files, key=str) == sorted([("etl", "load"), ("etl", "process"), ("process",), "merged"], key=str)
+    assert os.path.basename(files[("etl", "process")]) == "etl.process.pstats"
+    assert set(["helper", "load"]) <= _functions(pstats.Stats(files["merged"]))
+
+    profiler.close()
+    assert ctx.process._hooks == []
@@ -0,0 +1,89 @@
+from pytest import raises
+from pypeline.graph import Graph, node
+from pypeline.reachability import ReachabilityIndex
+
+
+def load(x):
+    return x
+
+
+def clean(values):
+    return values
+
+
+def left(values):
+    return values
+
+
+def right(values):
+    return values
+
+
+def merge(a, b):
+    return a + b
+
+
+def other(y):
+    return y
+
+
+def _graph():
+    g = Graph(load, clean, left, right, merge, other)
+    g.pipe(g.load, g.clean)
+    g.fan(g.clean, [g.left, g.right])
+    g.pipe(g.left, g.merge.a)
+    g.pipe(g.right, g.merge.b)
+    return g
+
+
+def test_context_queries():
+    ctx = _graph()(x=1, y=2)
+
+    assert [state.path for state in ctx.descendants(ctx.clean)] == [("left",), ("merge",), ("right",)]
+    assert [state.path for state in ctx.ancestors(ctx.merge)] == [("clean",), ("left",), ("load",), ("right",)]
+    assert ctx.reaches(ctx.load, ctx.merge)
+    assert not ctx.reaches(ctx.left, ctx.right)
+    assert not ctx.reaches(ctx.other, ctx.merge)
+    assert ctx.reachability().mode == "bitset"
+
+
+def test_interval_mode_matches_bitsets():
+    edges = [(i, j) for i in range(40) for j in range(i + 1, 40) if (i * 7 + j * 3) % 11 == 0]
+    bitsets = ReachabilityIndex(range(40), edges)
+    intervals = ReachabilityIndex(range(40), edges, bitset_limit=10)
+
+    assert intervals.mode == "interval"
+    for i in range(40):
+        assert intervals.descendants(i) == bitsets.descendants(i)
+        assert intervals.ancestors(i) == bitsets.ancestors(i)
+        for j in range(40):
+            assert intervals.reaches(i, j) == bitsets.reaches(i, j)
+
+    # Incremental updates
+    for index in (bitsets, intervals):
+        index.add_edge(39, 40)
+        index.add_edge(-1, 0)
+        assert index.descendants(-1) == bitsets.descendants(0) | set([0])
+        assert index.ancestors(40) == bitsets.ancestors(39) | set([39])
+        assert index.reaches(-1, 40) == (40 in bitsets.descendants(0))
+
+    with raises(ValueError):
+        ReachabilityIndex(edges=[(1, 2), (2, 1)])
+
+
+def test_graph_index_follows_pipe():
+    g = _graph()
+    index = g.reachability()
+    assert index.reaches(("load",), ("merge",))
+    assert not index.reaches(("other",), ("merge",))
+
+    g.pipe(g.other, g.merge.a)
+    assert index.reaches(("other",), ("merge",))
+
+    g.sub = Graph(node(lambda values: (values, values), "split", outputs=["a", "b"]), right)
+    g.pipe(g.merge, g.sub.split)
+    g.pipe(g.sub.split.b, g.sub.right)
+    index = g.reachability()
+    assert index.reaches(("load",), ("sub", "split", "b"))
+    assert index.reaches(("sub", "split"), ("sub", "right"))
+    assert not index.reaches(("sub", "right"), ("merge",))
@@ -0,0 +1,60 @@
+import time
+
+from pypeline.graph import node, pipe
+
+
+def _graph(calls):
+    def source(x):
+        calls.append(x)
+        return x
+
+    def fail(value):
+        if value < 0:
+            raise ValueError(value)
+        return value
+
+    return pipe(source, node(lambda source: source * 2, "double"), fail)
+
+
+def test_subscribe():
+    calls = []
+    values = []
+    ctx = _graph(calls)(x=1)
+
+    subscription = ctx.subscribe(ctx.double, values.append, debounce=0.05)
+    reactor = ctx._reactor
+    assert reactor.wait(5)
+    assert values == [2]
+
+    # Bursts of changes are coalesced into one recomputation
+    for x in range(2, 10):
+        ctx.source.set(x)
+    assert ctx.source._dirty
+    assert reactor.wait(5)
+    assert values == [2, 18]
+    assert calls == [1, 9]
+
+    subscription.cancel()
+    ctx.source.set(3)
+    time.sleep(0.1)
+    assert reactor.wait(5)
+    assert values == [2, 18]
+    assert ctx.double._hooks == []
+
+    ctx.close()
+    assert reactor.closed
+
+
+def test_subscribe_errors():
+    errors = []
+    ctx = _graph([])(x=1)
+
+    ctx.subscribe(ctx.fail, lambda value: 1 / 0, errors.append, debounce=0)
+    assert ctx._reactor.wait(5)
+    ctx.source.set(-1)
+    time.sleep(0.05)
+    assert ctx._reactor.wait(5)
+
+    assert [type(error) for error in errors] == [ValueError]
+    assert [type(error) for _, error in ctx._reactor.errors] == [ZeroDivisionError]
+    ctx.close()
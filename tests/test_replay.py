@@ -0,0 +1,67 @@
+import time
+
+from pypeline.graph import Graph, node
+from pypeline.replay import Replay, load_trace, main
+
+
+def load(n):
+    time.sleep(0.02)
+    return list(range(n))
+
+
+def split(values):
+    return values[:2], values[2:]
+
+
+def fit(rows, scale=1):
+    return sum(rows) * scale
+
+
+def report(model, rows):
+    return "%s/%d" % (model, len(rows))
+
+
+def _graph():
+    g = Graph(load, node(split, "split", outputs=["train", "test"]), fit)
+    g.sub = Graph(report)
+    g.pipe(g.load, g.split)
+    g.pipe(g.split.train, g.fit, g.sub.report.model)
+    g.pipe(g.split.test, g.sub.report.rows)
+    return g
+
+
+def test_record_and_replay(tmpdir, capsys):
+    filename = str(tmpdir.join("trace.json"))
+
+    with _graph()(n=10) as ctx:
+        ctx.record(filename)
+        assert ctx.sub.report.val == "1/8"
+        ctx.fit.set(scale=2)
+        assert ctx.sub.report.val == "2/8"
+        ctx.load.set(n=5)
+        ctx.sub.report.val
+
+    trace = load_trace(filename)
+    assert sorted(tuple(entry["path"]) for entry in trace["nodes"] if entry.get("output")) == \
+        [("split", "test"), ("split", "train")]
+    assert [(event["type"], event["path"]) for event in trace["events"] if event["type"] != "call"] == \
+        [("read", ["sub", "report"]), ("set", ["fit"]), ("read", ["sub", "report"]), ("set", ["load"]),
+         ("read", ["sub", "report"])]
+
+    replay = Replay(filename)
+    costs = replay.costs()
+    assert costs[("load",)][0] >= 0.02
+    assert costs[("fit",)][1] > 0
+
+    ctx = replay.context()
+    assert [state.path for state in ctx.sub.report.upstream[0]._state.upstream] == [("split.train",)]
+    stats = replay.run(ctx)
+    assert stats["reads"] == 3
+    # The first read evaluates everything, the others what the recorded changes invalidated
+    assert stats["calls"] == 6 + 2 + 6
+    assert stats["duration"] >= 0.04
+
+    assert Replay(trace, scale=0).run()["duration"] < stats["duration"]
+
+    main([filename, "--scale", "0"])
+    assert "reads 3 calls 14" in capsys.readouterr()[0]
@@ -0,0 +1,103 @@
+import threading
+
+from pytest import importorskip, raises
+from pypeline.graph import node, pipe
+from pypeline.serving import BatchServer
+
+
+def _graph(calls, threads=None):
+    def score(values, weight=1):
+        calls.append(len(values))
+        return [v * weight for v in values]
+
+    def prepare(x):
+        if threads is not None:
+            threads.add(threading.current_thread().name)
+        return x + 1
+
+    return pipe(node(prepare, "prepare"),
+                node(score, "score", batchable=True),
+                node(lambda value: -value, "negate"))
+
+
+def _run_concurrently(server, count, **kwargs):
+    results = [None] * count
+
+    def _request(index):
+        try:
+            results[index] = server.evaluate("negate", x=index, **kwargs)
+        except Exception as exc:
+            results[index] = exc
+
+    threads = [threading.Thread(target=_request, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
+
+
+def test_batching():
+    calls = []
+    threads = set()
+
+    with BatchServer(_graph(calls, threads), max_batch_size=8, max_wait=1.0) as server:
+        assert _run_concurrently(server, 8) == [-(index + 1) for index in range(8)]
+
+    # Only the batchable node runs on the server thread
+    assert calls == [8]
+    assert len(threads) == 8
+    assert server._worker.name not in threads
+    assert server.stats.batches == 1
+    assert server.stats.fill_ratio == 1.0
+    assert server.stats.node_calls == {("score",): (1, 8)}
+
+
+def test_batch_wait():
+    calls = []
+
+    with BatchServer(_graph(calls), max_batch_size=8, max_wait=0.0) as server:
+        assert server.evaluate(("negate",), x=1, weight=3) == -6
+        assert server.evaluate(u"negate", x=1) == -2
+
+    assert calls == [1, 1]
+    assert server.stats.fill_ratio == 1.0 / 8
+
+
+def test_closed_server():
+    server = BatchServer(_graph([]))
+    server.close()
+    server.close()
+
+    with raises(RuntimeError):
+        server.evaluate("negate", x=1)
+
+
+def test_batch_error():
+    calls = []
+
+    with BatchServer(_graph(calls), max_batch_size=4, max_wait=1.0) as server:
+        results = _run_concurrently(server, 4, weight="x")
+
+    assert all(isinstance(result, TypeError) for result in results)
+
+    with BatchServer(_graph(calls)) as server:
+        with raises(KeyError):
+            server.evaluate("missing", x=1)
+
+
+def test_batch_array_kwargs():
+    numpy = importorskip("numpy")
+    calls = []
+
+    with BatchServer(_graph(calls), max_batch_size=4, max_wait=1.0) as server:
+        results = _run_concurrently(server, 4, weight=numpy.ones(2))
+
+    assert [list(result) for result in results] == [[-(index + 1)] * 2 for index in range(4)]
+    assert calls == [4]
+
+
+def test_batchable_partition():
+    with raises(ValueError):
+        node(lambda values: values, batchable=True, partition=len)
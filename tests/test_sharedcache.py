@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import subprocess
+
+from pypeline.graph import Graph
+from pypeline.sharedcache import SharedCache, SharedCacheStore
+
+
+def _log(directory, name):
+    with open(os.path.join(directory, "calls.log"), "a") as stream:
+        stream.write(name + "\n")
+
+
+def _calls(directory):
+    with open(os.path.join(directory, "calls.log")) as stream:
+        return stream.read().split()
+
+
+def reference(log_dir, size):
+    _log(log_dir, "reference")
+    time.sleep(0.2)
+    return list(range(size))
+
+
+def total(values):
+    return sum(values)
+
+
+def _graph():
+    g = Graph(reference, total)
+    g.pipe(g.reference, g.total)
+    return g
+
+
+_WORKER = """
+import sys
+sys.path.insert(0, %r)
+from tests.test_sharedcache import SharedCache, _graph
+
+ctx = _graph()(log_dir=sys.argv[2], size=100)
+cache = SharedCache(ctx, sys.argv[1])
+print(ctx.total.val)
+cache.close()
+"""
+
+
+def test_shared_cache_single_flight(tmpdir):
+    directory = str(tmpdir.join("cache"))
+    log_dir = str(tmpdir)
+    # Separate interpreters, like the workers of a pool
+    script = _WORKER % os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [subprocess.Popen([sys.executable, "-c", script, directory, log_dir], stdout=subprocess.PIPE)
+               for _ in range(4)]
+    values = [int(worker.communicate()[0]) for worker in workers]
+
+    assert values == [4950] * 4
+    assert [worker.returncode for worker in workers] == [0] * 4
+    assert _calls(log_dir) == ["reference"]
+
+    # Different parameters are cached separately, equal ones are restored without evaluation
+    with _graph()(log_dir=log_dir, size=10) as ctx:
+        ctx.share_results(directory)
+        assert ctx.total.val == 45
+
+    ctx = _graph()(log_dir=log_dir, size=100)
+    cache = SharedCache(ctx, directory)
+    assert ctx.total.val == 4950
+    assert ctx.reference._dirty is False
+    cache.close()
+
+    assert _calls(log_dir) == ["reference", "reference"]
+
+
+def test_shared_cache_eviction(tmpdir):
+    store = SharedCacheStore(str(tmpdir), limit=3500)
+
+    for index in range(3):
+        store.save(("node",), str(index), b"x" * 1000)
+        os.utime(store._filename(("node",), str(index)), (index, index))
+
+    # Reading an entry makes it the most recently used one
+    assert store.load(("node",), "0") == b"x" * 1000
+    store.save(("node",), "3", b"x" * 1000)
+
+    assert store.size() <= 3500
+    assert [store.contains(("node",), str(index)) for index in range(4)] == [True, False, True, True]
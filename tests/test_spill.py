@@ -0,0 +1,75 @@
+import os
+
+from pytest import importorskip
+from pypeline.graph import Graph, node, pipe
+from pypeline.spill import SpilledResult
+
+
+def text(n):
+    return "x" * n
+
+
+def test_spill_arrays():
+    numpy = importorskip("numpy")
+
+    def source(n):
+        return numpy.arange(n, dtype=float)
+
+    def double(values):
+        return values * 2
+
+    ctx = pipe(source, double)(n=1000)
+    manager = ctx.spill(12000, threshold=1000)
+
+    result = ctx.double.val
+    assert (result == numpy.arange(1000) * 2).all()
+
+    # The older result went to disk, the newer one stays in memory
+    spilled = ctx.source._cache
+    assert isinstance(spilled, SpilledResult) and spilled.kind == "npy"
+    assert ctx.double._cache is result
+    assert manager.resident == 8000
+
+    mapped = ctx.source.val
+    assert isinstance(mapped, numpy.memmap) and not mapped.flags.writeable
+    assert (mapped == numpy.arange(1000)).all()
+
+    # Invalidation removes the spill file, mapped views stay valid
+    ctx.source.set(10)
+    assert not os.path.exists(spilled.filename)
+    assert mapped[-1] == 999
+    assert manager.resident == 0
+    assert (ctx.double.val == numpy.arange(10) * 2).all()
+
+    manager.close()
+    assert not os.path.exists(manager.directory)
+
+
+def test_spill_objects():
+    ctx = pipe(text, node(lambda text: {"text": text}, "wrapped"))(n=2000)
+    manager = ctx.spill(0, threshold=1000)
+
+    assert ctx.wrapped.val == {"text": "x" * 2000}
+    assert ctx.text._cache.kind == "bytes" and ctx.wrapped._cache.kind == "pickle"
+    assert ctx.text.val == "x" * 2000
+
+    # Unpicklable results stay in memory
+    ctx.wrapped.set()
+    ctx.wrapped.func = lambda text: (lambda: text)
+    assert ctx.wrapped.val() == "x" * 2000
+    assert not isinstance(ctx.wrapped._cache, SpilledResult)
+
+    manager.close()
+
+
+def test_context_close():
+    ctx = Graph(text)(n=2000)
+    manager = ctx.spill(0, threshold=1000)
+
+    with ctx:
+        assert ctx.text.val == "x" * 2000
+        filename = ctx.text._cache.filename
+        assert os.path.exists(filename)
+
+    assert ctx.text._dirty and ctx.text._hooks == []
+    assert not os.path.exists(manager.directory)